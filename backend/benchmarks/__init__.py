@@ -0,0 +1,11 @@
+"""
+Offline load benchmarks.
+
+Stand-in SendGrid, Kickbox and WATI servers (stubs.py), a synthetic data
+generator (datagen.py) and load scenarios with a comparable JSON report
+(scenarios.py). Run them with the management commands:
+
+    python manage.py generate_benchmark_data --whatsapp 1000000 --email 100000
+    python manage.py benchmark --output report.json --compare baseline.json
+    python manage.py run_provider_stubs   # stubs only, for a deployed stack
+"""
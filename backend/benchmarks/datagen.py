@@ -0,0 +1,128 @@
+"""
+Synthetic campaign data for benchmarks.
+
+Rows are generated lazily and written with bulk_create in batches, so
+millions of campaigns can be created without holding them in memory. All
+benchmark rows use templates named 'bench_*' and can be removed with
+clear().
+"""
+from datetime import timedelta
+import random
+
+from django.utils import timezone
+
+from emails.codecs import encode_emails
+from emails.models import EmailCampaign
+from whatsapp.models import WhatsAppCampaign
+
+TEMPLATE_PREFIX = 'bench_'
+WHATSAPP_STATUSES = [('success', 0.6), ('failed', 0.05), ('scheduled', 0.3), ('cancelled', 0.05)]
+EMAIL_STATUSES = [('success', 0.8), ('partial', 0.15), ('failed', 0.05)]
+
+
+def _pick(weighted, rng):
+    roll = rng.random()
+    for value, weight in weighted:
+        roll -= weight
+        if roll < 0:
+            return value
+    return weighted[-1][0]
+
+
+def bench_number(i):
+    """
+    Canonical E.164 number for the i-th synthetic recipient
+    """
+    return f"+919{i % 1_000_000_000:09d}"
+
+
+def bench_email(i):
+    return f"user{i}@bench.example"
+
+
+def _chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def whatsapp_rows(count, templates=10, days=30, seed=0):
+    rng = random.Random(seed)
+    now = timezone.now()
+    for i in range(count):
+        status = _pick(WHATSAPP_STATUSES, rng)
+        offset = rng.uniform(0, days) if status == 'scheduled' else -rng.uniform(0, days)
+        scheduled_time = now + timedelta(days=offset)
+        number = bench_number(rng.randrange(count * 2))
+        yield WhatsAppCampaign(
+            template_name=f"{TEMPLATE_PREFIX}{i % templates}",
+            template_id=f"tpl-{i % templates}",
+            mobile_number=number,
+            # bulk_create bypasses save(); numbers are already canonical
+            phone_e164=number,
+            scheduled_time=scheduled_time,
+            status=status,
+            sent_at=scheduled_time if status in ('success', 'failed') else None,
+            created_at=scheduled_time - timedelta(hours=1),
+        )
+
+
+def email_rows(count, recipients_per_campaign=20, templates=10, days=30, seed=0):
+    rng = random.Random(seed)
+    now = timezone.now()
+    next_email = 0
+    for i in range(count):
+        recipients = [bench_email(next_email + j) for j in range(recipients_per_campaign)]
+        next_email += recipients_per_campaign
+        status = _pick(EMAIL_STATUSES, rng)
+        failed = 0 if status == 'success' else (recipients_per_campaign if status == 'failed' else rng.randrange(1, recipients_per_campaign))
+        yield EmailCampaign(
+            domain_name='bench.example',
+            template_name=f"{TEMPLATE_PREFIX}{i % templates}",
+            template_id=f"d-bench{i % templates}",
+            recipients=','.join(recipients),
+            status=status,
+            total_emails=recipients_per_campaign,
+            successful_emails=recipients_per_campaign - failed,
+            failed_emails=failed,
+            deliverable_blob=encode_emails(recipients[failed:]) or None,
+            undeliverable_blob=encode_emails(recipients[:failed]) or None,
+            deliverable_count=recipients_per_campaign - failed,
+            undeliverable_count=failed,
+            created_at=now - timedelta(days=rng.uniform(0, days)),
+        )
+
+
+def generate(whatsapp=0, email=0, recipients_per_email=20, batch_size=5000, seed=0, progress=None):
+    """
+    Insert synthetic WhatsApp and email campaigns.
+
+    Returns:
+        dict: Number of rows created per table
+    """
+    created = {'whatsapp': 0, 'email': 0}
+    for batch in _chunks(whatsapp_rows(whatsapp, seed=seed), batch_size):
+        WhatsAppCampaign.objects.bulk_create(batch, batch_size=batch_size)
+        created['whatsapp'] += len(batch)
+        if progress:
+            progress('whatsapp', created['whatsapp'], whatsapp)
+    for batch in _chunks(email_rows(email, recipients_per_email, seed=seed), batch_size):
+        EmailCampaign.objects.bulk_create(batch, batch_size=batch_size)
+        created['email'] += len(batch)
+        if progress:
+            progress('email', created['email'], email)
+    return created
+
+
+def clear():
+    """
+    Delete all benchmark rows
+    """
+    whatsapp, _ = WhatsAppCampaign.objects.filter(template_name__startswith=TEMPLATE_PREFIX).delete()
+    email, _ = EmailCampaign.objects.filter(template_name__startswith=TEMPLATE_PREFIX).delete()
+    return {'whatsapp': whatsapp, 'email': email}
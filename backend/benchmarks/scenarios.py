@@ -0,0 +1,227 @@
+"""
+Load scenarios and the benchmark report.
+
+Each scenario issues `requests` calls at a fixed `concurrency` either
+in-process through Django's test client (default) or over HTTP against a
+running server (base_url). The report records throughput and latency
+percentiles per scenario; compare() flags scenarios whose throughput
+dropped or whose p99 rose by more than a tolerance against a baseline.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+
+from django.db import connection
+from django.utils import timezone
+
+from .datagen import bench_email, bench_number
+
+
+class InProcessClient:
+    """
+    Calls the app through Django's test client (no HTTP server)
+    """
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, payload):
+        return self.client.post(path, json.dumps(payload), content_type='application/json').status_code
+
+
+class HttpClient:
+    """
+    Calls a running server over HTTP with a keep-alive session
+    """
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path):
+        return self.session.get(self.base_url + path, timeout=60).status_code
+
+    def post(self, path, payload):
+        return self.session.post(self.base_url + path, json=payload, timeout=60).status_code
+
+
+def send_email(client, i, options):
+    per = options['email_recipients']
+    recipients = ','.join(bench_email(i * per + j) for j in range(per))
+    return client.post('/api/emails/campaigns/send_email/', {
+        'domain_name': 'bench.example',
+        'template_name': 'bench_template',
+        'template_id': 'd-bench',
+        'recipients': recipients,
+    })
+
+
+def whatsapp_schedule(client, i, options):
+    per = options['broadcast_recipients']
+    return client.post('/api/whatsapp/campaigns/broadcast/', {
+        'template_name': 'bench_template',
+        'template_id': 'tpl-0',
+        'scheduled_time': (timezone.now() + timedelta(days=1)).isoformat(),
+        'recipients': [{'mobile_number': bench_number(i * per + j)} for j in range(per)],
+    })
+
+
+def webhook(client, i, options):
+    rng = random.Random(i)
+    number = bench_number(rng.randrange(1_000_000))[1:]
+    if rng.random() < options['webhook_status_ratio']:
+        event = {
+            'eventType': rng.choice(['sentMessageDELIVERED_v2', 'sentMessageREAD_v2']),
+            'whatsappMessageId': uuid.uuid4().hex,
+            'waId': number,
+            'timestamp': str(int(time.time())),
+        }
+    else:
+        event = {'eventType': 'message', 'waId': number, 'text': 'stop'}
+    return client.post('/api/whatsapp/webhook/receive-message/', event)
+
+
+def logs(client, i, options):
+    path = '/api/whatsapp/campaigns/logs/' if i % 2 == 0 else '/api/emails/campaigns/logs/'
+    return client.get(path)
+
+
+# name -> (request function, items per request option or None)
+SCENARIOS = {
+    'send_email': (send_email, 'email_recipients'),
+    'whatsapp_schedule': (whatsapp_schedule, 'broadcast_recipients'),
+    'webhook': (webhook, None),
+    'logs': (logs, None),
+}
+
+DEFAULT_OPTIONS = {
+    'email_recipients': 50,
+    'broadcast_recipients': 1000,
+    'webhook_status_ratio': 0.7,
+}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(name, requests, concurrency, base_url=None, options=None):
+    """
+    Run one scenario.
+
+    Returns:
+        dict: requests, errors, throughput and latency percentiles (ms)
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    func, items_option = SCENARIOS[name]
+    local = threading.local()
+    latencies = [None] * requests
+    statuses = [None] * requests
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = HttpClient(base_url) if base_url else InProcessClient()
+        started = time.perf_counter()
+        try:
+            statuses[i] = func(client, i, options)
+        except Exception:
+            statuses[i] = 'error'
+        latencies[i] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    errors = sum(1 for status in statuses if status == 'error' or status >= 400)
+    items = requests * (options[items_option] if items_option else 1)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(requests / wall, 2),
+        'items_per_second': round(items / wall, 2),
+        'latency_ms': {
+            'p50': round(_percentile(ordered, 50), 2),
+            'p95': round(_percentile(ordered, 95), 2),
+            'p99': round(_percentile(ordered, 99), 2),
+            'max': round(ordered[-1], 2) if ordered else 0.0,
+        },
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'host': platform.node(),
+    }
+
+
+def build_report(results, config, stubs=None):
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'config': config,
+        'scenarios': results,
+        'stub_requests': stubs or {},
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Compare a report with a baseline report.
+
+    Returns:
+        tuple: (rows, regressions) where rows are per-scenario dicts with
+        the baseline and current throughput/p99 and their relative change
+    """
+    rows = []
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        rps_before = previous['requests_per_second']
+        rps_after = current['requests_per_second']
+        p99_before = previous['latency_ms']['p99']
+        p99_after = current['latency_ms']['p99']
+        rps_change = (rps_after - rps_before) / rps_before if rps_before else 0.0
+        p99_change = (p99_after - p99_before) / p99_before if p99_before else 0.0
+        row = {
+            'scenario': name,
+            'rps_before': rps_before,
+            'rps_after': rps_after,
+            'rps_change': round(rps_change, 4),
+            'p99_before': p99_before,
+            'p99_after': p99_after,
+            'p99_change': round(p99_change, 4),
+        }
+        rows.append(row)
+        if rps_change < -tolerance or p99_change > tolerance:
+            regressions.append(row)
+    return rows, regressions
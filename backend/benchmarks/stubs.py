@@ -0,0 +1,187 @@
+"""
+Local stand-ins for the SendGrid, Kickbox and WATI APIs.
+
+Each provider gets its own threaded HTTP server with configurable latency
+(mean and jitter), error rate (500s) and throttle rate (429 with a
+Retry-After header), so the send paths, the adaptive limiter and retries
+run exactly as they do against the real APIs.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import random
+import threading
+import time
+import uuid
+
+PROVIDERS = ('sendgrid', 'kickbox', 'wati')
+
+
+class Behavior:
+    """
+    How a stub provider responds
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, undeliverable_rate=0.05, invalid_number_rate=0.01):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.undeliverable_rate = undeliverable_rate
+        self.invalid_number_rate = invalid_number_rate
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        url = urlparse(self.path)
+        server.count(f"{method} {url.path}")
+
+        behavior = server.behavior
+        delay = random.gauss(behavior.latency_ms, behavior.jitter_ms) if behavior.jitter_ms else behavior.latency_ms
+        time.sleep(max(delay, 0) / 1000)
+
+        roll = random.random()
+        if roll < behavior.throttle_rate:
+            return self._send(429, {'message': 'Too Many Requests'}, {'Retry-After': str(behavior.retry_after)})
+        if roll < behavior.throttle_rate + behavior.error_rate:
+            return self._send(500, {'message': 'Internal Server Error'})
+
+        handler = ROUTES.get((server.provider, method, url.path))
+        if handler is None:
+            return self._send(404, {'message': f'No stub for {method} {url.path}'})
+        status, payload = handler(behavior, parse_qs(url.query), body)
+        self._send(status, payload)
+
+    def _send(self, status, payload, headers=None):
+        data = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _sendgrid_send(behavior, query, body):
+    return 202, None
+
+
+def _kickbox_verify(behavior, query, body):
+    email = (query.get('email') or [''])[0]
+    result = 'undeliverable' if random.random() < behavior.undeliverable_rate else 'deliverable'
+    return 200, {'result': result, 'email': email, 'success': True}
+
+
+def _wati_templates(behavior, query, body):
+    names = ['bench_template', 'payment_reminder', 'payment_reminder_second', 'payment_reminder_third']
+    return 200, {'messageTemplates': [
+        {'id': f'tpl-{i}', 'elementName': name, 'status': 'APPROVED'} for i, name in enumerate(names)
+    ]}
+
+
+def _wati_contacts(behavior, query, body):
+    return 200, {'contact_list': [
+        {'wAId': f'9198{i:08d}', 'fullName': f'Contact {i}'} for i in range(100)
+    ]}
+
+
+def _wati_send(behavior, query, body):
+    return 200, {'result': True, 'model': {'ids': [uuid.uuid4().hex]}}
+
+
+def _wati_send_bulk(behavior, query, body):
+    receivers = json.loads(body or b'{}').get('receivers') or []
+    invalid = [
+        r['whatsappNumber'] for r in receivers
+        if random.random() < behavior.invalid_number_rate
+    ]
+    return 200, {'result': True, 'errors': {'invalidWhatsappNumbers': invalid}}
+
+
+ROUTES = {
+    ('sendgrid', 'POST', '/v3/mail/send'): _sendgrid_send,
+    ('kickbox', 'GET', '/v2/verify'): _kickbox_verify,
+    ('wati', 'GET', '/api/v1/getMessageTemplates'): _wati_templates,
+    ('wati', 'GET', '/api/v1/getContacts'): _wati_contacts,
+    ('wati', 'POST', '/api/v2/sendTemplateMessage'): _wati_send,
+    ('wati', 'POST', '/api/v1/sendTemplateMessages'): _wati_send_bulk,
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, provider, behavior, host='127.0.0.1', port=0):
+        super().__init__((host, port), StubHandler)
+        self.provider = provider
+        self.behavior = behavior
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stubs(behaviors, host='127.0.0.1', ports=None):
+    """
+    Start one stub server per provider in background threads.
+
+    Args:
+        behaviors: dict provider -> Behavior
+        ports: optional dict provider -> port (default: any free port)
+
+    Returns:
+        dict: provider -> StubServer
+    """
+    servers = {}
+    for provider in PROVIDERS:
+        server = StubServer(provider, behaviors.get(provider) or Behavior(), host, (ports or {}).get(provider, 0))
+        threading.Thread(target=server.serve_forever, name=f'stub-{provider}', daemon=True).start()
+        servers[provider] = server
+    return servers
+
+
+def stub_settings(servers):
+    """
+    Settings that point the services at the stub servers
+    """
+    return {
+        'SENDGRID_API_KEY': 'SG.benchmark',
+        'SENDGRID_API_HOST': servers['sendgrid'].base_url,
+        'KICKBOX_API_KEY': 'benchmark',
+        'KICKBOX_API_URL': f"{servers['kickbox'].base_url}/v2/verify",
+        'WATI_API_BASE_URL': servers['wati'].base_url,
+        'WATI_API_TOKEN': 'benchmark',
+    }
+
+
+def stop_stubs(servers):
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
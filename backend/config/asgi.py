@@ -1,5 +1,8 @@
 """
 ASGI config for Email Dashboard project.
+
+Serves the async endpoints, including the live campaign event streams
+(Server-Sent Events, see core.events), which need an ASGI server.
 """
 
 import os
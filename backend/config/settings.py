@@ -3,9 +3,12 @@ Django settings for Email Dashboard project.
 """
 
 from pathlib import Path
+import os
 import ssl
+import sys
 from decouple import config, Csv
 import dj_database_url
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,14 +38,16 @@ INSTALLED_APPS = [
     'corsheaders',
     
     # Local apps
+    'core',
     'emails',
     'whatsapp',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,11 +79,45 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 DATABASE_URL = config('DATABASE_URL', default='')
+# PostgreSQL connection pool (psycopg_pool), one per process and shared by its threads,
+# instead of one persistent connection per thread. Sizes are per process and set
+# separately for web processes and Celery workers ('worker' role, detected from the
+# command line or set with DB_POOL_ROLE). Connections are health-checked when handed
+# out, replaced after DB_POOL_MAX_LIFETIME seconds and closed after DB_POOL_MAX_IDLE
+# idle seconds above the minimum size; a request waits DB_POOL_TIMEOUT seconds at most.
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+_is_celery_worker = os.path.basename(sys.argv[0]).startswith('celery') and 'worker' in sys.argv[1:]
+DB_POOL_ROLE = config('DB_POOL_ROLE', default='worker' if _is_celery_worker else 'web')
+DB_POOL_SIZES = {
+    'web': (
+        config('DB_POOL_WEB_MIN_SIZE', default=2, cast=int),
+        config('DB_POOL_WEB_MAX_SIZE', default=8, cast=int),
+    ),
+    # Prefork children run one task at a time; with the threads pool raise the maximum
+    # to the worker concurrency
+    'worker': (
+        config('DB_POOL_WORKER_MIN_SIZE', default=0, cast=int),
+        config('DB_POOL_WORKER_MAX_SIZE', default=1, cast=int),
+    ),
+}
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+DB_POOL_MAX_LIFETIME = config('DB_POOL_MAX_LIFETIME', default=1800, cast=float)
+DB_POOL_MAX_IDLE = config('DB_POOL_MAX_IDLE', default=300, cast=float)
 if DATABASE_URL:
     # Production: Use PostgreSQL from DATABASE_URL
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=0 if DB_POOL else 600, conn_health_checks=True)
     }
+    if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+        min_size, max_size = DB_POOL_SIZES[DB_POOL_ROLE]
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'name': f'default-{DB_POOL_ROLE}',
+            'min_size': min_size,
+            'max_size': max_size,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+            'max_idle': DB_POOL_MAX_IDLE,
+        }
 else:
     # Development: Use SQLite
     DATABASES = {
@@ -169,14 +208,130 @@ CORS_ALLOW_PRIVATE_NETWORK = True
 
 # SendGrid
 SENDGRID_API_KEY = config('SENDGRID_API_KEY', default='')
+# API host, overridable to point at the benchmark stub servers
+SENDGRID_API_HOST = config('SENDGRID_API_HOST', default='https://api.sendgrid.com')
+
+# Email transports. SENDGRID_API_KEY is the primary; SENDGRID_EXTRA_API_KEYS adds more keys or
+# subuser keys ("key" or "key:weight"), each with its own adaptive limit. Messages are spread
+# by weight over healthy transports; an SMTP relay with weight 0 only takes failover traffic.
+SENDGRID_WEIGHT = config('SENDGRID_WEIGHT', default=1, cast=int)
+SENDGRID_EXTRA_API_KEYS = config('SENDGRID_EXTRA_API_KEYS', default='', cast=Csv())
+EMAIL_SMTP_HOST = config('EMAIL_SMTP_HOST', default='')
+EMAIL_SMTP_PORT = config('EMAIL_SMTP_PORT', default=587, cast=int)
+EMAIL_SMTP_USER = config('EMAIL_SMTP_USER', default='')
+EMAIL_SMTP_PASSWORD = config('EMAIL_SMTP_PASSWORD', default='')
+EMAIL_SMTP_USE_TLS = config('EMAIL_SMTP_USE_TLS', default=True, cast=bool)
+EMAIL_SMTP_WEIGHT = config('EMAIL_SMTP_WEIGHT', default=0, cast=int)
+# SendGrid template HTML fetched for SMTP sends is cached this long (seconds)
+EMAIL_TEMPLATE_CACHE_TTL = config('EMAIL_TEMPLATE_CACHE_TTL', default=3600, cast=int)
+# A transport is skipped for EMAIL_TRANSPORT_COOLDOWN seconds after this many failures
+# (errors, or 429/5xx after retries) within the cooldown, or at once on 401/403
+EMAIL_TRANSPORT_FAILURE_THRESHOLD = config('EMAIL_TRANSPORT_FAILURE_THRESHOLD', default=5, cast=int)
+EMAIL_TRANSPORT_COOLDOWN = config('EMAIL_TRANSPORT_COOLDOWN', default=60, cast=int)
 
 # Kickbox (email verification)
 KICKBOX_API_KEY = config('KICKBOX_API_KEY', default='')
+KICKBOX_API_URL = config('KICKBOX_API_URL', default='https://api.kickbox.com/v2/verify')
+# Verification results are cached per address so previews and sends reuse them
+KICKBOX_CACHE_TTL = config('KICKBOX_CACHE_TTL', default=86400, cast=int)
+
+# Saved audiences: largest list accepted, and how long their stored Kickbox results are reused
+EMAIL_AUDIENCE_MAX_RECIPIENTS = config('EMAIL_AUDIENCE_MAX_RECIPIENTS', default=500000, cast=int)
+EMAIL_AUDIENCE_VERIFICATION_TTL = config('EMAIL_AUDIENCE_VERIFICATION_TTL', default=604800, cast=int)
+
+# Campaign error summaries: sample recipients kept per error class, and classes kept
+# before further ones are counted as 'other'
+EMAIL_ERROR_SAMPLES = config('EMAIL_ERROR_SAMPLES', default=10, cast=int)
+EMAIL_ERROR_MAX_CLASSES = config('EMAIL_ERROR_MAX_CLASSES', default=20, cast=int)
+
+# Batch preview: addresses verified in parallel per request, and the request size cap
+EMAIL_PREVIEW_CONCURRENCY = config('EMAIL_PREVIEW_CONCURRENCY', default=16, cast=int)
+EMAIL_PREVIEW_MAX_RECIPIENTS = config('EMAIL_PREVIEW_MAX_RECIPIENTS', default=1000, cast=int)
 
 # WATI (WhatsApp Business API)
 WATI_API_BASE_URL = config('WATI_API_BASE_URL', default='')
 WATI_API_TOKEN = config('WATI_API_TOKEN', default='')
 WATI_CHANNEL_NUMBER = config('WATI_CHANNEL_NUMBER', default='919335141341')
+WATI_TEMPLATE_CACHE_TTL = config('WATI_TEMPLATE_CACHE_TTL', default=300, cast=int)
+
+# Phone normalization: national numbers of this length get the default country code
+WHATSAPP_DEFAULT_COUNTRY_CODE = config('WHATSAPP_DEFAULT_COUNTRY_CODE', default='91')
+WHATSAPP_NATIONAL_NUMBER_LENGTH = config('WHATSAPP_NATIONAL_NUMBER_LENGTH', default=10, cast=int)
+
+# WhatsApp broadcasts: receivers per sendTemplateMessages call / per Celery task
+WATI_BULK_SEND_ENABLED = config('WATI_BULK_SEND_ENABLED', default=True, cast=bool)
+WATI_BROADCAST_BATCH_SIZE = config('WATI_BROADCAST_BATCH_SIZE', default=100, cast=int)
+WHATSAPP_BROADCAST_MAX_RECIPIENTS = config('WHATSAPP_BROADCAST_MAX_RECIPIENTS', default=50000, cast=int)
+
+# Adaptive (AIMD) concurrency limits for provider calls, shared across processes via Redis.
+# The limit grows while calls are healthy and halves on 429/5xx; Retry-After is honored.
+PROVIDER_MAX_ATTEMPTS = config('PROVIDER_MAX_ATTEMPTS', default=3, cast=int)
+# Longest a call waits for a free slot (seconds): short in web processes, where waiting
+# holds a request thread, longer in Celery workers. Retries without Retry-After back off
+# exponentially from PROVIDER_RETRY_BACKOFF up to PROVIDER_RETRY_BACKOFF_MAX seconds.
+PROVIDER_ACQUIRE_TIMEOUT = config('PROVIDER_ACQUIRE_TIMEOUT', default=120 if _is_celery_worker else 5, cast=float)
+PROVIDER_RETRY_BACKOFF = config('PROVIDER_RETRY_BACKOFF', default=0.5, cast=float)
+PROVIDER_RETRY_BACKOFF_MAX = config('PROVIDER_RETRY_BACKOFF_MAX', default=8, cast=float)
+PROVIDER_LIMITS = {
+    'wati': {
+        'initial_limit': config('WATI_CONCURRENCY_INITIAL', default=8, cast=int),
+        'max_limit': config('WATI_CONCURRENCY_MAX', default=64, cast=int),
+        'target_latency': config('WATI_TARGET_LATENCY', default=2.0, cast=float),
+    },
+    'sendgrid': {
+        'initial_limit': config('SENDGRID_CONCURRENCY_INITIAL', default=16, cast=int),
+        'max_limit': config('SENDGRID_CONCURRENCY_MAX', default=128, cast=int),
+        'target_latency': config('SENDGRID_TARGET_LATENCY', default=1.0, cast=float),
+    },
+    'smtp': {
+        'initial_limit': config('SMTP_CONCURRENCY_INITIAL', default=4, cast=int),
+        'max_limit': config('SMTP_CONCURRENCY_MAX', default=16, cast=int),
+        'target_latency': config('SMTP_TARGET_LATENCY', default=2.0, cast=float),
+    },
+    'kickbox': {
+        'initial_limit': config('KICKBOX_CONCURRENCY_INITIAL', default=8, cast=int),
+        'max_limit': config('KICKBOX_CONCURRENCY_MAX', default=32, cast=int),
+        'target_latency': config('KICKBOX_TARGET_LATENCY', default=2.0, cast=float),
+    },
+}
+
+# Shared async HTTP client used by the async (ASGI) provider endpoints, one pool per process
+ASYNC_HTTP_MAX_CONNECTIONS = config('ASYNC_HTTP_MAX_CONNECTIONS', default=200, cast=int)
+ASYNC_HTTP_MAX_KEEPALIVE = config('ASYNC_HTTP_MAX_KEEPALIVE', default=50, cast=int)
+
+# Request profiling (opt-in): sampled requests get a Server-Timing header, and those
+# slower than PROFILING_SLOW_MS are logged with their slowest queries
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.01, cast=float)
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=1000, cast=int)
+PROFILING_TOP_QUERIES = config('PROFILING_TOP_QUERIES', default=5, cast=int)
+
+# Cold start budget checked by `manage.py profile_startup --check` (wsgi and celery targets)
+STARTUP_BUDGET_MS = config('STARTUP_BUDGET_MS', default=1500, cast=float)
+STARTUP_BUDGET_IMPORTS = config('STARTUP_BUDGET_IMPORTS', default=1250, cast=int)
+
+# Prometheus: port on which each Celery worker serves /metrics (0 disables). Set
+# PROMETHEUS_MULTIPROC_DIR in the environment when running several processes per host.
+CELERY_METRICS_PORT = config('CELERY_METRICS_PORT', default=0, cast=int)
+# /metrics answers scrapes from these addresses, or that send `Authorization: Bearer
+# <METRICS_TOKEN>` (needed behind a proxy, where every request comes from the proxy)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Seconds the scheduled backlog counts are shared between scrapes (0 queries on every scrape)
+METRICS_BACKLOG_CACHE_TTL = config('METRICS_BACKLOG_CACHE_TTL', default=30, cast=int)
+
+# WATI webhooks: 'inline' applies events in the request, 'stream' appends them to a
+# Redis stream drained by `manage.py consume_wati_webhooks`
+WATI_WEBHOOK_MODE = config('WATI_WEBHOOK_MODE', default='inline')
+WATI_WEBHOOK_STREAM = config('WATI_WEBHOOK_STREAM', default='wati:webhooks')
+WATI_WEBHOOK_STREAM_MAXLEN = config('WATI_WEBHOOK_STREAM_MAXLEN', default=1000000, cast=int)
+WATI_WEBHOOK_CONSUMER_GROUP = config('WATI_WEBHOOK_CONSUMER_GROUP', default='wati-webhook-consumers')
+WATI_WEBHOOK_BATCH_SIZE = config('WATI_WEBHOOK_BATCH_SIZE', default=500, cast=int)
+WATI_WEBHOOK_CLAIM_IDLE_MS = config('WATI_WEBHOOK_CLAIM_IDLE_MS', default=60000, cast=int)
+# Stream entries that are not a JSON object, or that still fail to apply after this many
+# deliveries, are moved to the dead-letter stream instead of blocking the consumers
+WATI_WEBHOOK_MAX_DELIVERIES = config('WATI_WEBHOOK_MAX_DELIVERIES', default=5, cast=int)
+WATI_WEBHOOK_DEAD_LETTER_STREAM = config('WATI_WEBHOOK_DEAD_LETTER_STREAM', default='wati:webhooks:dead')
 
 
 # Celery Configuration
@@ -188,6 +343,120 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Cache: Redis at CACHE_URL (REDIS_URL by default), shared by every web and worker
+# process. Set CACHE_URL to an empty value to use a per-process cache without Redis.
+CACHE_URL = config('CACHE_URL', default=REDIS_URL)
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'dashboard',
+        }
+    }
+    if CACHE_URL.startswith('rediss://'):
+        CACHES['default']['OPTIONS'] = {'ssl_cert_reqs': ssl.CERT_NONE}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Dashboard read endpoints (campaign logs, WATI templates and contacts) are cached this
+# long (seconds); 0 disables. Off without a shared cache, which could not be invalidated
+# from the workers. A recomputation holds a lock this long at most while other requests
+# for the same response wait for it.
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=60 if CACHE_URL else 0, cast=int)
+RESPONSE_CACHE_LOCK_TIMEOUT = config('RESPONSE_CACHE_LOCK_TIMEOUT', default=10, cast=int)
+
+# Live campaign events (Server-Sent Events over Redis pub/sub, served by config.asgi):
+# keepalive comment interval (seconds), events buffered per viewer before it is told to
+# resync, and the reconnect delay suggested to browsers (ms)
+EVENTS_KEEPALIVE = config('EVENTS_KEEPALIVE', default=15, cast=int)
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=1000, cast=int)
+EVENTS_RETRY_MS = config('EVENTS_RETRY_MS', default=3000, cast=int)
+# Seconds between progress events of an email campaign sent immediately (in the request)
+EVENTS_PROGRESS_INTERVAL = config('EVENTS_PROGRESS_INTERVAL', default=1, cast=float)
+
+# Admin changelists of the campaign tables (core.admin): without filters, tables with at
+# least ADMIN_ESTIMATED_COUNT_MIN rows show PostgreSQL's row estimate instead of counting;
+# filtered and searched lists count at most ADMIN_COUNT_LIMIT rows (0 counts them all)
+ADMIN_ESTIMATED_COUNT_MIN = config('ADMIN_ESTIMATED_COUNT_MIN', default=100000, cast=int)
+ADMIN_COUNT_LIMIT = config('ADMIN_COUNT_LIMIT', default=10000, cast=int)
+
+# Queue lanes: 'realtime' for single WhatsApp sends, 'scheduled' for the scheduler and
+# broadcast batches, 'bulk' for email campaigns. Run a worker per lane, e.g.
+#   celery -A config worker -Q realtime,default -c 8
+#   celery -A config worker -Q scheduled -c 4
+#   celery -A config worker -Q bulk -c 4 -O fair
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('realtime'),
+    Queue('scheduled'),
+    Queue('bulk'),
+    Queue('default'),
+)
+CELERY_TASK_ROUTES = {
+    'whatsapp.tasks.send_scheduled_whatsapp_task': {'queue': 'realtime', 'priority': 0},
+    'whatsapp.tasks.dispatch_due_whatsapp_campaigns_task': {'queue': 'scheduled', 'priority': 0},
+    'whatsapp.tasks.send_whatsapp_broadcast_batch_task': {'queue': 'scheduled'},
+    'emails.tasks.dispatch_due_email_campaigns_task': {'queue': 'scheduled', 'priority': 0},
+    'emails.tasks.*': {'queue': 'bulk'},
+}
+# Redis broker priorities: 0 is served first, 9 last
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+# Long tasks: a worker process reserves one message at a time, so a long
+# bulk chunk never holds other messages hostage in its prefetch buffer
+CELERY_WORKER_PREFETCH_MULTIPLIER = config('CELERY_WORKER_PREFETCH_MULTIPLIER', default=1, cast=int)
+
+# Bulk email is sent in chunks of EMAIL_CHUNK_SIZE recipients. A sender's chunks drop one
+# priority step for every CELERY_FAIRNESS_CHUNKS_PER_STEP already queued (see core.fairness)
+EMAIL_CHUNK_SIZE = config('EMAIL_CHUNK_SIZE', default=500, cast=int)
+CELERY_FAIRNESS_CHUNKS_PER_STEP = config('CELERY_FAIRNESS_CHUNKS_PER_STEP', default=4, cast=int)
+CELERY_FAIRNESS_TTL = config('CELERY_FAIRNESS_TTL', default=86400, cast=int)
+
+# WhatsApp scheduler: a beat task claims due rows every WHATSAPP_SCHEDULER_INTERVAL
+# seconds instead of parking multi-day countdown tasks in the broker
+WHATSAPP_SCHEDULER_INTERVAL = config('WHATSAPP_SCHEDULER_INTERVAL', default=15, cast=int)
+WHATSAPP_SCHEDULER_BATCH_SIZE = config('WHATSAPP_SCHEDULER_BATCH_SIZE', default=500, cast=int)
+WHATSAPP_SCHEDULER_MAX_BATCHES = config('WHATSAPP_SCHEDULER_MAX_BATCHES', default=20, cast=int)
+WHATSAPP_SCHEDULER_CLAIM_TIMEOUT = config('WHATSAPP_SCHEDULER_CLAIM_TIMEOUT', default=900, cast=int)
+# Messages still 'processing' this many seconds after a worker claimed them (it died
+# mid-send) are marked failed by the scheduler; WATI may have accepted them, so they are
+# reported rather than sent again
+WHATSAPP_SEND_TIMEOUT = config('WHATSAPP_SEND_TIMEOUT', default=900, cast=int)
+# Status webhooks without a known WATI message id are matched by number to a message
+# sent within this many seconds; older messages are not searched
+WHATSAPP_STATUS_MATCH_WINDOW = config('WHATSAPP_STATUS_MATCH_WINDOW', default=7 * 24 * 3600, cast=int)
+
+# Email scheduler: every EMAIL_SCHEDULER_INTERVAL seconds, up to EMAIL_SCHEDULER_BATCH_SIZE due
+# campaigns release their next batch (send_rate / 60 * interval recipients when throttled)
+EMAIL_SCHEDULER_INTERVAL = config('EMAIL_SCHEDULER_INTERVAL', default=15, cast=int)
+EMAIL_SCHEDULER_BATCH_SIZE = config('EMAIL_SCHEDULER_BATCH_SIZE', default=100, cast=int)
+# Released chunks no worker has claimed after EMAIL_CHUNK_RELEASE_TIMEOUT seconds (lost before
+# reaching the broker) are queued again; chunks claimed EMAIL_CHUNK_SEND_TIMEOUT seconds ago and
+# not finished (the worker died) are recorded as failed rather than sent again
+EMAIL_CHUNK_RELEASE_TIMEOUT = config('EMAIL_CHUNK_RELEASE_TIMEOUT', default=900, cast=int)
+EMAIL_CHUNK_SEND_TIMEOUT = config('EMAIL_CHUNK_SEND_TIMEOUT', default=3600, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-whatsapp-campaigns': {
+        'task': 'whatsapp.tasks.dispatch_due_whatsapp_campaigns_task',
+        'schedule': WHATSAPP_SCHEDULER_INTERVAL,
+        'options': {'expires': WHATSAPP_SCHEDULER_INTERVAL},
+    },
+    'dispatch-due-email-campaigns': {
+        'task': 'emails.tasks.dispatch_due_email_campaigns_task',
+        'schedule': EMAIL_SCHEDULER_INTERVAL,
+        'options': {'expires': EMAIL_SCHEDULER_INTERVAL},
+    },
+}
+
 if REDIS_URL.startswith('rediss://'):
     CELERY_BROKER_USE_SSL = {
         'ssl_cert_reqs': ssl.CERT_NONE
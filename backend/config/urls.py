@@ -4,6 +4,7 @@ URL configuration for Email Dashboard project.
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from core.metrics import metrics_view
 
 def health_check(request):
     """Health check endpoint for Render"""
@@ -19,6 +20,7 @@ urlpatterns = [
     path('api/whatsapp/', include('whatsapp.urls')),
     path('api/', api_status, name='api_status'),
     path('healthz/', health_check, name='health_check'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 
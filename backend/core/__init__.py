@@ -0,0 +1 @@
+# Core app: infrastructure shared by the emails and whatsapp apps
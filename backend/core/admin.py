@@ -0,0 +1,79 @@
+"""
+Admin changelists for tables with millions of rows.
+
+Django's changelist runs two exact COUNT(*) queries per page, one for the
+paginator and one for the "N total" link, and both read the whole table
+(or the whole filtered range) on PostgreSQL. LargeTableAdmin drops the
+second one and paginates with EstimatedCountPaginator: the unfiltered
+changelist takes the planner's row estimate for the table, and a filtered
+or searched one counts at most ADMIN_COUNT_LIMIT rows, so its last pages
+are not reachable by number. Columns the list does not show are deferred.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """
+    PostgreSQL's estimate of the rows in `model`'s table (as of the last
+    VACUUM / ANALYZE), or None on other databases and tables not analyzed yet
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting with estimated_row_count() when the queryset has no
+    filters and the table has at least ADMIN_ESTIMATED_COUNT_MIN rows, and
+    counting at most ADMIN_COUNT_LIMIT rows (0 for no limit) otherwise
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+                return estimate
+        if not settings.ADMIN_COUNT_LIMIT:
+            return super().count
+        # COUNT(*) over a LIMIT subquery stops reading at the limit
+        return queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+
+
+class LargeTableChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.list_defer:
+            queryset = queryset.defer(*self.model_admin.list_defer)
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for large tables: estimated counts, no "N total" count, and
+    `list_defer` columns (e.g. large text and blobs) left out of the
+    changelist query. Subclasses should keep list_filter, search_fields and
+    sortable_by to indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_defer = ()
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        from django.conf import settings
+        from . import dbpool
+        from .metrics import connect_celery_signals
+        connect_celery_signals()
+        dbpool.connect_signals()
+        if settings.PROFILING_ENABLED:
+            from . import profiling
+            profiling.install()
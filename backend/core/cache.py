@@ -0,0 +1,146 @@
+"""
+Cached responses for the dashboard's read endpoints.
+
+A response is cached in the default cache (Redis, see CACHES) under a key
+made of the view, its query parameters and the current generation of each
+model it reads. Saving, updating or deleting rows of such a model bumps
+its generation after the transaction commits, which makes every response
+that read it unreachable at once without finding and deleting keys; the
+orphaned entries expire on their own.
+
+On a miss, one request recomputes the response while concurrent requests
+for the same key wait for its result instead of all recomputing (cache
+stampede). Cache errors fall back to computing the response.
+"""
+from functools import wraps
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# How often requests waiting for another request's recomputation poll
+_WAIT_INTERVAL = 0.05
+
+
+def _generation_key(model):
+    return f"response_generation:{model._meta.label_lower}"
+
+
+def _bump(model):
+    key = _generation_key(model)
+    try:
+        cache.add(key, 0, None)
+        cache.incr(key)
+    except Exception as e:
+        logger.warning("Response cache invalidation of %s failed: %s", model._meta.label, e)
+
+
+def invalidate(model):
+    """
+    Drop the cached responses that read `model`, once the current
+    transaction (if any) commits
+    """
+    transaction.on_commit(lambda: _bump(model))
+
+
+def invalidate_on_change(sender, **kwargs):
+    """
+    post_save / post_delete receiver
+    """
+    invalidate(sender)
+
+
+class InvalidatingQuerySet(models.QuerySet):
+    """
+    QuerySet whose set-based writes, which send no post_save signal, also
+    invalidate the cached responses reading its model
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            invalidate(self.model)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            invalidate(self.model)
+        return created
+
+
+def _response_key(view, request, models_read):
+    generations = cache.get_many([_generation_key(model) for model in models_read])
+    generation = '.'.join(str(generations.get(_generation_key(model), 0)) for model in models_read)
+    params = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f"response:{type(view).__name__}.{view.action}:{generation}:{digest}"
+
+
+def cached_response(*models_read, timeout_setting='RESPONSE_CACHE_TTL'):
+    """
+    Cache the 200 responses of a GET view action for the number of seconds
+    in `timeout_setting` (0 disables), keyed by its query parameters and
+    invalidated when any of `models_read` changes. Responses that depend
+    only on a provider (no models) just expire.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            timeout = getattr(settings, timeout_setting)
+            if not timeout or request.method != 'GET':
+                return func(view, request, *args, **kwargs)
+
+            try:
+                key = _response_key(view, request, models_read)
+                cached = cache.get(key)
+                if cached is None:
+                    locked = cache.add(f"{key}:lock", 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+                    if not locked:
+                        cached = _wait_for(key)
+            except Exception as e:
+                logger.warning("Response cache unavailable: %s", e)
+                return func(view, request, *args, **kwargs)
+
+            if cached is not None:
+                response = Response(cached)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            try:
+                response = func(view, request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response.data, timeout)
+            finally:
+                if locked:
+                    try:
+                        cache.delete(f"{key}:lock")
+                    except Exception as e:
+                        logger.warning("Response cache unavailable: %s", e)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _wait_for(key):
+    """
+    Poll for a response another request is computing; None if it does not
+    appear within RESPONSE_CACHE_LOCK_TIMEOUT (the caller then computes it)
+    """
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(_WAIT_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        if cache.get(f"{key}:lock") is None:
+            # The other request failed or did not cache its response
+            return None
+    return None
@@ -0,0 +1,86 @@
+"""
+Database connection pool housekeeping (see DB_POOL in settings).
+
+Pool statistics are folded into the Prometheus metrics after every web
+request and Celery task: waits, queued and timed-out requests, connections
+lost, and the current pool size. psycopg_pool keeps them per process, so
+they are popped (read and reset) by the process that owns the pool and
+written as ordinary counters and gauges, which multiprocess mode then
+aggregates across processes.
+
+Prefork worker children drop any pool inherited from the parent process,
+whose background threads did not survive the fork, and open their own.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import DB_POOL_CONNECTIONS, DB_POOL_CONNECTIONS_LOST, DB_POOL_REQUESTS, DB_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+def _pooled_aliases():
+    return [alias for alias in connections if connections.settings[alias].get('OPTIONS', {}).get('pool')]
+
+
+def _open_pools():
+    # Pools this process has created (on its first query), without creating any
+    for alias in _pooled_aliases():
+        connection = connections[alias]
+        if alias in connection._connection_pools:
+            yield connection
+
+
+def record_pool_stats(**kwargs):
+    """
+    request_finished / task_postrun receiver
+    """
+    role = settings.DB_POOL_ROLE
+    for connection in _open_pools():
+        try:
+            stats = connection.pool.pop_stats()
+        except Exception as e:
+            logger.warning("Could not read database pool stats: %s", e)
+            continue
+        # Timed-out requests were queued first
+        queued = stats.get('requests_queued', 0)
+        errors = stats.get('requests_errors', 0)
+        immediate = stats.get('requests_num', 0) - queued
+        if immediate > 0:
+            DB_POOL_REQUESTS.labels(role=role, outcome='immediate').inc(immediate)
+        if queued - errors > 0:
+            DB_POOL_REQUESTS.labels(role=role, outcome='queued').inc(queued - errors)
+        if errors:
+            DB_POOL_REQUESTS.labels(role=role, outcome='error').inc(errors)
+        if stats.get('requests_wait_ms'):
+            DB_POOL_WAIT.labels(role=role).inc(stats['requests_wait_ms'] / 1000)
+        lost = stats.get('connections_lost', 0) + stats.get('returns_bad', 0)
+        if lost:
+            DB_POOL_CONNECTIONS_LOST.labels(role=role).inc(lost)
+        DB_POOL_CONNECTIONS.labels(role=role, state='open').set(stats.get('pool_size', 0))
+        DB_POOL_CONNECTIONS.labels(role=role, state='idle').set(stats.get('pool_available', 0))
+        DB_POOL_CONNECTIONS.labels(role=role, state='waiting').set(stats.get('requests_waiting', 0))
+
+
+def _drop_inherited_pools(**kwargs):
+    # Closing would send a Terminate message on sockets the parent shares;
+    # forget the pools instead so the first query opens a fresh one
+    for connection in _open_pools():
+        connection._connection_pools.pop(connection.alias, None)
+
+
+def connect_signals():
+    """
+    Hook into web requests and Celery tasks when a database is pooled
+    """
+    if not _pooled_aliases():
+        return
+
+    from celery import signals
+    from django.core.signals import request_finished
+
+    request_finished.connect(record_pool_stats, weak=False)
+    signals.task_postrun.connect(record_pool_stats, weak=False)
+    signals.worker_process_init.connect(_drop_inherited_pools, weak=False)
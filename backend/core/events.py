@@ -0,0 +1,183 @@
+"""
+Live campaign events: published by the web app and workers on Redis
+pub/sub, streamed to the dashboard as Server-Sent Events.
+
+Writers call publish() with a small JSON event (campaign progress, status
+changes); it goes out once the current transaction commits. Each ASGI
+worker process holds one Redis subscription per event loop and fans
+events out to its connected viewers through bounded in-memory queues, so
+a viewer costs a queue rather than a Redis connection or repeated
+database queries. A viewer that falls behind, or misses events while the
+subscription reconnects, is sent a 'resync' event and should refetch the
+logs. Streaming needs the ASGI server (config.asgi); under WSGI a stream
+would hold a worker thread for as long as the page stays open.
+"""
+import asyncio
+import json
+import logging
+import ssl
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'events:'
+
+# Delay before resubscribing after the Redis connection drops (seconds)
+_RECONNECT_DELAY = 1
+
+
+def _publish(stream, event):
+    from .redis import get_redis
+
+    try:
+        get_redis().publish(f"{CHANNEL_PREFIX}{stream}", json.dumps(event, cls=DjangoJSONEncoder))
+    except Exception as e:
+        logger.warning("Publishing %s event failed: %s", stream, e)
+
+
+def publish(stream, event):
+    """
+    Publish an event (a dict with a 'type') to the viewers of `stream`
+    ('emails', 'whatsapp') after the current transaction commits
+    """
+    transaction.on_commit(lambda: _publish(stream, event))
+
+
+def _async_redis():
+    import redis.asyncio
+
+    options = {}
+    if settings.REDIS_URL.startswith('rediss://'):
+        options['ssl_cert_reqs'] = ssl.CERT_NONE
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL, **options)
+
+
+class _Hub:
+    """
+    One Redis subscription shared by the viewers on an event loop
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.task = None
+
+    def subscribe(self, streams):
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.subscribers[queue] = set(streams)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.pop(queue, None)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _deliver(self, stream, event):
+        for queue, streams in list(self.subscribers.items()):
+            if stream not in streams:
+                continue
+            if queue.full():
+                # Slow viewer: drop its backlog and have it refetch instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((stream, {'type': 'resync'}))
+            else:
+                queue.put_nowait((stream, event))
+
+    def _resync_all(self):
+        for streams in list(self.subscribers.values()):
+            for stream in streams:
+                self._deliver(stream, {'type': 'resync'})
+
+    async def _listen(self):
+        connected_before = False
+        while True:
+            client = _async_redis()
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                if connected_before:
+                    # Events published while disconnected are lost
+                    self._resync_all()
+                connected_before = True
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    stream = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                    try:
+                        event = json.loads(message['data'])
+                    except ValueError:
+                        continue
+                    self._deliver(stream, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event subscription lost, reconnecting: %s", e)
+                await asyncio.sleep(_RECONNECT_DELAY)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def _get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = _Hub()
+    return hub
+
+
+def _format(stream, event):
+    data = json.dumps({'stream': stream, **event}, cls=DjangoJSONEncoder)
+    return f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+
+
+async def event_stream(streams, snapshot=None):
+    """
+    SSE lines for the events of `streams`: first the events returned by
+    the (sync) `snapshot` callable, e.g. the current state of running
+    campaigns, then live events, with a comment line every
+    EVENTS_KEEPALIVE seconds to keep proxies from closing the connection
+    """
+    hub = _get_hub()
+    # Subscribe before taking the snapshot so nothing falls in between
+    queue = hub.subscribe(streams)
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        if snapshot is not None:
+            for stream, event in await sync_to_async(snapshot)():
+                yield _format(stream, event)
+        while True:
+            try:
+                stream, event = await asyncio.wait_for(queue.get(), settings.EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _format(stream, event)
+    finally:
+        hub.unsubscribe(queue)
+
+
+def sse_response(streams, snapshot=None):
+    """
+    Streaming text/event-stream response for an async view
+    """
+    response = StreamingHttpResponse(event_stream(streams, snapshot), content_type='text/event-stream')
+    # Ask proxies (nginx) not to buffer, so events reach the browser as they happen
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,36 @@
+"""
+Shared async HTTP client for provider calls made from async views.
+
+One httpx.AsyncClient (and so one connection pool) is kept per event loop:
+under uvicorn that is one per worker process, shared by every request it
+is serving. Loops that go away (e.g. runserver running an async view in a
+throwaway loop) drop their client with them.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+from .lazy import lazy_import
+
+httpx = lazy_import('httpx')
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Return the pooled AsyncClient for the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ASYNC_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,29 @@
+"""
+Lazy imports for provider SDKs and HTTP clients.
+
+`requests = lazy_import('requests')` binds a module whose code only runs on
+first attribute access, so web and worker processes that never call a
+provider do not pay for importing its client at boot.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return module `name`, deferring its execution until first use.
+
+    Only for top-level modules: finding a submodule's spec imports its
+    parent packages eagerly.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
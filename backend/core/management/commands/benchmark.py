@@ -0,0 +1,109 @@
+import json
+import logging
+
+from celery import current_app
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from benchmarks import scenarios
+from benchmarks.stubs import start_stubs, stop_stubs, stub_settings
+
+from .run_provider_stubs import add_behavior_arguments, behaviors_from_options
+
+
+class Command(BaseCommand):
+    help = 'Run load scenarios against stub providers and write a comparable JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default=','.join(scenarios.SCENARIOS),
+            help=f"Comma-separated scenarios ({', '.join(scenarios.SCENARIOS)})"
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--email-recipients', type=int, default=50, help='Recipients per send_email request')
+        parser.add_argument('--broadcast-recipients', type=int, default=1000, help='Recipients per broadcast request')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Benchmark a running server over HTTP instead of in-process (start run_provider_stubs for it)'
+        )
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+        parser.add_argument('--compare', default=None, help='Baseline report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative regression (0.1 = 10%%)')
+        add_behavior_arguments(parser)
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in scenarios.SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(unknown)}")
+
+        # The limiter logs a warning per call when Redis is not running
+        logging.getLogger('core.ratelimit').setLevel(logging.ERROR)
+
+        scenario_options = {
+            'email_recipients': options['email_recipients'],
+            'broadcast_recipients': options['broadcast_recipients'],
+        }
+        behaviors = behaviors_from_options(options)
+        servers = None if options['base_url'] else start_stubs(behaviors)
+        overrides = {}
+        eager = current_app.conf.task_always_eager
+        if servers:
+            overrides = stub_settings(servers)
+            overrides['ALLOWED_HOSTS'] = list(settings.ALLOWED_HOSTS) + ['testserver']
+            # Queued sends (send_email) run in the request, so the scenario
+            # measures sending to the stubs rather than publishing to a broker
+            current_app.conf.task_always_eager = True
+
+        results = {}
+        try:
+            with override_settings(**overrides):
+                for name in names:
+                    self.stdout.write(f"Running {name} ({options['requests']} requests, concurrency {options['concurrency']})")
+                    result = scenarios.run_scenario(
+                        name, options['requests'], options['concurrency'],
+                        base_url=options['base_url'], options=scenario_options
+                    )
+                    results[name] = result
+                    latency = result['latency_ms']
+                    self.stdout.write(
+                        f"  {result['requests_per_second']} req/s, {result['items_per_second']} items/s, "
+                        f"p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms, "
+                        f"{result['errors']} error(s)"
+                    )
+        finally:
+            current_app.conf.task_always_eager = eager
+            stub_requests = {provider: server.requests for provider, server in (servers or {}).items()}
+            if servers:
+                stop_stubs(servers)
+
+        report = scenarios.build_report(results, {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'base_url': options['base_url'],
+            'scenario_options': scenario_options,
+            'stubs': {provider: behavior.as_dict() for provider, behavior in behaviors.items()},
+        }, stub_requests)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            rows, regressions = scenarios.compare(report, baseline, options['tolerance'])
+            for row in rows:
+                self.stdout.write(
+                    f"{row['scenario']:<20} req/s {row['rps_before']} -> {row['rps_after']} "
+                    f"({row['rps_change']:+.1%}), p99 {row['p99_before']} -> {row['p99_after']}ms "
+                    f"({row['p99_change']:+.1%})"
+                )
+            if regressions:
+                raise CommandError(
+                    f"Regression beyond {options['tolerance']:.0%} in: "
+                    + ', '.join(row['scenario'] for row in regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
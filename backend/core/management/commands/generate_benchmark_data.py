@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from benchmarks import datagen
+
+
+class Command(BaseCommand):
+    help = 'Create synthetic WhatsApp and email campaigns (templates named bench_*) for load benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--whatsapp', type=int, default=100000, help='WhatsApp campaigns to create')
+        parser.add_argument('--email', type=int, default=10000, help='Email campaigns to create')
+        parser.add_argument('--recipients-per-email', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='Delete existing benchmark rows first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = datagen.clear()
+            self.stdout.write(f"Deleted {deleted['whatsapp']} WhatsApp and {deleted['email']} email benchmark rows")
+
+        def progress(table, done, total):
+            if done == total or done % (options['batch_size'] * 20) == 0:
+                self.stdout.write(f"{table}: {done}/{total}")
+
+        created = datagen.generate(
+            whatsapp=options['whatsapp'],
+            email=options['email'],
+            recipients_per_email=options['recipients_per_email'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['whatsapp']} WhatsApp and {created['email']} email campaigns"
+        ))
@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What each target imports: the web app up to a resolved URLconf (ready for
+# its first request), and the Celery app with all task modules loaded
+TARGETS = {
+    'wsgi': (
+        "import config.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    'celery': (
+        "from config.celery import app\n"
+        "app.loader.import_default_modules()\n"
+    ),
+}
+
+# Modules that should only be imported on first provider call (requests is
+# not listed: rest_framework.compat imports it in every process)
+LAZY_MODULES = ('sendgrid', 'python_http_client', 'httpx')
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+# Modules bound by core.lazy stay _LazyModule instances until first used
+eager = [name for name in {lazy!r} if name in sys.modules and type(sys.modules[name]).__name__ != '_LazyModule']
+print(json.dumps({{'ms': elapsed * 1000, 'modules': len(sys.modules), 'eager_provider_modules': eager}}))
+"""
+
+
+def profile_target(name, runs=3):
+    """
+    Import a target in fresh interpreters with -X importtime.
+
+    Returns:
+        dict: fastest wall time (ms), module count, provider SDKs imported
+        eagerly and the slowest imports (cumulative microseconds)
+    """
+    code = _CHILD.format(code=TARGETS[name], lazy=LAZY_MODULES)
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Importing {name} failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports = []
+        for line in proc.stderr.splitlines():
+            # "import time:  <self us> | <cumulative us> | <module>"
+            if not line.startswith('import time:'):
+                continue
+            parts = line[len('import time:'):].split('|')
+            try:
+                imports.append((int(parts[1]), int(parts[0]), parts[2].strip()))
+            except (IndexError, ValueError):
+                continue  # header line
+        result['imports'] = len(imports)
+        result['slowest'] = sorted(imports, reverse=True)[:15]
+        if best is None or result['ms'] < best['ms']:
+            best = result
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Measure cold import time and module count of the web (config.wsgi) and Celery apps, optionally against a budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', default='wsgi,celery', help='Comma-separated: wsgi, celery')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per target; the fastest run counts')
+        parser.add_argument('--check', action='store_true', help='Fail if a target exceeds its budget')
+        parser.add_argument('--max-ms', type=float, default=settings.STARTUP_BUDGET_MS)
+        parser.add_argument('--max-imports', type=int, default=settings.STARTUP_BUDGET_IMPORTS)
+        parser.add_argument('--json', action='store_true', help='Print the profile as JSON')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['targets'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in TARGETS]
+        if unknown:
+            raise CommandError(f"Unknown target(s): {', '.join(unknown)}")
+
+        profiles = {name: profile_target(name, options['runs']) for name in names}
+        if options['json']:
+            self.stdout.write(json.dumps(profiles, indent=2))
+        else:
+            for name, profile in profiles.items():
+                self.stdout.write(
+                    f"{name}: {profile['ms']:.0f}ms, {profile['imports']} imports, {profile['modules']} modules"
+                )
+                for cumulative, own, module in profile['slowest']:
+                    self.stdout.write(f"  {cumulative / 1000:8.1f}ms cumulative {own / 1000:7.1f}ms self  {module}")
+                if profile['eager_provider_modules']:
+                    self.stdout.write(f"  provider SDKs imported at startup: {', '.join(profile['eager_provider_modules'])}")
+
+        if options['check']:
+            failures = []
+            for name, profile in profiles.items():
+                if profile['ms'] > options['max_ms']:
+                    failures.append(f"{name} took {profile['ms']:.0f}ms (budget {options['max_ms']:.0f}ms)")
+                if profile['imports'] > options['max_imports']:
+                    failures.append(f"{name} imported {profile['imports']} modules (budget {options['max_imports']})")
+                if profile['eager_provider_modules']:
+                    failures.append(f"{name} imported {', '.join(profile['eager_provider_modules'])} at startup")
+            if failures:
+                raise CommandError('Startup budget exceeded: ' + '; '.join(failures))
+            self.stdout.write(self.style.SUCCESS('Startup within budget'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from benchmarks.stubs import Behavior, PROVIDERS, start_stubs, stop_stubs
+
+
+def add_behavior_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Mean stub response latency')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='Standard deviation of stub latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that are 500s')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of stub responses that are 429s')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    for provider in PROVIDERS:
+        parser.add_argument(
+            f'--{provider}-latency-ms', type=float, default=None,
+            help=f'Override the mean latency for {provider}'
+        )
+
+
+def behaviors_from_options(options):
+    behaviors = {}
+    for provider in PROVIDERS:
+        latency = options.get(f'{provider}_latency_ms')
+        behaviors[provider] = Behavior(
+            latency_ms=options['latency_ms'] if latency is None else latency,
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            retry_after=options['retry_after'],
+        )
+    return behaviors
+
+
+class Command(BaseCommand):
+    help = 'Run stand-in SendGrid, Kickbox and WATI servers for load tests against a deployed stack'
+
+    def add_arguments(self, parser):
+        add_behavior_arguments(parser)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--sendgrid-port', type=int, default=8101)
+        parser.add_argument('--kickbox-port', type=int, default=8102)
+        parser.add_argument('--wati-port', type=int, default=8103)
+
+    def handle(self, *args, **options):
+        servers = start_stubs(
+            behaviors_from_options(options),
+            host=options['host'],
+            ports={provider: options[f'{provider}_port'] for provider in PROVIDERS},
+        )
+        self.stdout.write("Point the app at the stubs with:")
+        self.stdout.write(f"  SENDGRID_API_HOST={servers['sendgrid'].base_url}")
+        self.stdout.write(f"  KICKBOX_API_URL={servers['kickbox'].base_url}/v2/verify")
+        self.stdout.write(f"  WATI_API_BASE_URL={servers['wati'].base_url}")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for provider, server in servers.items():
+                self.stdout.write(f"{provider}: {server.requests}")
+            stop_stubs(servers)
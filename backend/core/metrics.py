@@ -0,0 +1,331 @@
+"""
+Prometheus metrics for the send pipeline.
+
+Counters and histograms are updated by the web processes and Celery
+workers that do the work. With several processes per host (gunicorn
+workers, Celery prefork children) set PROMETHEUS_MULTIPROC_DIR to an empty
+directory before start; each process then writes its samples there and
+`/metrics` (or a worker's CELERY_METRICS_PORT) aggregates them.
+
+The backlog (scheduled WhatsApp messages by due hour, unfinished email
+campaigns and their chunks by status) is not counted in-process: it is
+read from the database when /metrics is scraped, at most once per
+METRICS_BACKLOG_CACHE_TTL seconds.
+
+/metrics answers only requests from METRICS_ALLOWED_IPS or carrying
+`Authorization: Bearer <METRICS_TOKEN>`.
+"""
+from datetime import datetime, timedelta
+import hmac
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+    multiprocess, start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+MESSAGES = Counter(
+    'dashboard_messages_total',
+    'Messages handed to a provider, by channel, template and outcome (sent or failed)',
+    ['channel', 'template', 'outcome'],
+)
+PROVIDER_LATENCY = Histogram(
+    'dashboard_provider_request_seconds',
+    'Latency of outbound provider calls',
+    ['provider'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+PROVIDER_RESPONSES = Counter(
+    'dashboard_provider_responses_total',
+    'Outbound provider calls by HTTP status code ("error" for connection failures)',
+    ['provider', 'status_code'],
+)
+TASK_QUEUE_WAIT = Histogram(
+    'dashboard_task_queue_wait_seconds',
+    'Time from a Celery task becoming due (publish time or ETA) to a worker starting it',
+    ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 900),
+)
+WEBHOOK_PROCESSING = Histogram(
+    'dashboard_webhook_processing_seconds',
+    'WATI webhook handling time: per HTTP request, or per consumer batch in stream mode',
+    ['stage'],
+)
+DB_POOL_REQUESTS = Counter(
+    'dashboard_db_pool_requests_total',
+    'Database connection requests to the pool by process role and outcome: immediate, '
+    'queued (served after waiting for a free connection) or error (timed out)',
+    ['role', 'outcome'],
+)
+DB_POOL_WAIT = Counter(
+    'dashboard_db_pool_wait_seconds_total',
+    'Time spent waiting for a pooled database connection',
+    ['role'],
+)
+DB_POOL_CONNECTIONS_LOST = Counter(
+    'dashboard_db_pool_connections_lost_total',
+    'Pooled connections found broken by the health check or returned in a bad state',
+    ['role'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'dashboard_db_pool_connections',
+    'Connections held by the database pools of live processes: open, idle (available) and '
+    'requests waiting for one',
+    ['role', 'state'],
+    multiprocess_mode='livesum',
+)
+
+# Backlog buckets: overdue, each of the next BACKLOG_HOURS hours, and later
+BACKLOG_HOURS = 24
+BACKLOG_CACHE_KEY = 'metrics:backlog'
+# Email campaigns and chunks that still have recipients to send
+EMAIL_BACKLOG_CAMPAIGN_STATUSES = ('pending', 'scheduled', 'processing')
+EMAIL_BACKLOG_CHUNK_STATUSES = ('scheduled', 'released', 'sending')
+
+
+def observe_provider_call(provider, seconds, status_code):
+    PROVIDER_LATENCY.labels(provider=provider).observe(seconds)
+    PROVIDER_RESPONSES.labels(provider=provider, status_code=str(status_code)).inc()
+    profiling.record('http', seconds)
+
+
+def count_messages(channel, template, outcome, count=1):
+    if count:
+        MESSAGES.labels(channel=channel, template=template or '', outcome=outcome).inc(count)
+
+
+class ScheduledBacklogCollector:
+    """
+    Exports the send backlog, queried from the database at scrape time:
+    unsent scheduled WhatsApp messages by due hour, and unfinished email
+    campaigns and their chunks by status
+    """
+
+    def collect(self):
+        counts = self.cached_counts()
+        if counts is None:
+            return
+        gauge = GaugeMetricFamily(
+            'dashboard_scheduled_backlog',
+            'Unsent scheduled messages by due hour relative to now ("overdue", "0".."23", "later")',
+            labels=['channel', 'due_hour'],
+        )
+        for due_hour, total in counts['whatsapp'].items():
+            gauge.add_metric(['whatsapp', due_hour], total)
+        yield gauge
+
+        campaigns = GaugeMetricFamily(
+            'dashboard_email_backlog_campaigns',
+            'Email campaigns not finished yet by status (pending, scheduled, processing)',
+            labels=['status'],
+        )
+        for status, total in counts['email_campaigns'].items():
+            campaigns.add_metric([status], total)
+        yield campaigns
+
+        chunks = GaugeMetricFamily(
+            'dashboard_email_backlog_chunks',
+            'Chunks of unfinished email campaigns not sent yet by status: scheduled (waiting for '
+            'the scheduler), released (queued for a worker) or sending',
+            labels=['status'],
+        )
+        recipients = GaugeMetricFamily(
+            'dashboard_email_backlog_recipients',
+            'Recipients in the chunks of dashboard_email_backlog_chunks, by chunk status',
+            labels=['status'],
+        )
+        for status, (total, size) in counts['email_chunks'].items():
+            chunks.add_metric([status], total)
+            recipients.add_metric([status], size)
+        yield chunks
+        yield recipients
+
+    def cached_counts(self):
+        """
+        Backlog counts, shared by every scrape (and process) for
+        METRICS_BACKLOG_CACHE_TTL seconds; None if the database is unavailable
+        """
+        timeout = settings.METRICS_BACKLOG_CACHE_TTL
+        if timeout:
+            try:
+                counts = cache.get(BACKLOG_CACHE_KEY)
+                if counts is not None:
+                    return counts
+            except Exception as e:
+                logger.warning("Metrics cache unavailable: %s", e)
+                timeout = 0
+        counts = self.counts()
+        if counts is not None and timeout:
+            try:
+                cache.set(BACKLOG_CACHE_KEY, counts, timeout)
+            except Exception as e:
+                logger.warning("Metrics cache unavailable: %s", e)
+        return counts
+
+    def counts(self):
+        try:
+            return {
+                'whatsapp': self.whatsapp_counts(),
+                **self.email_counts(),
+            }
+        except Exception as e:
+            logger.warning("Could not read scheduled backlog: %s", e)
+            return None
+
+    def whatsapp_counts(self):
+        from whatsapp.models import WhatsAppCampaign, WhatsAppCampaignQuerySet
+
+        now = timezone.now()
+        current_hour = now.replace(minute=0, second=0, microsecond=0)
+        horizon = current_hour + timedelta(hours=BACKLOG_HOURS)
+        pending = WhatsAppCampaign.objects.filter(status__in=WhatsAppCampaignQuerySet.SENDABLE_STATUSES)
+        counts = {'overdue': 0, 'later': 0}
+        counts.update({str(h): 0 for h in range(BACKLOG_HOURS)})
+        counts['overdue'] = pending.filter(scheduled_time__lt=now).count()
+        counts['later'] = pending.filter(scheduled_time__gte=horizon).count()
+        rows = (
+            pending.filter(scheduled_time__gte=now, scheduled_time__lt=horizon)
+            .annotate(hour=TruncHour('scheduled_time'))
+            .values('hour')
+            .annotate(total=Count('id'))
+        )
+        for row in rows:
+            offset = int((row['hour'] - current_hour).total_seconds() // 3600)
+            counts[str(min(max(offset, 0), BACKLOG_HOURS - 1))] += row['total']
+        return counts
+
+    def email_counts(self):
+        from emails.models import EmailCampaign, EmailChunk
+
+        campaigns = dict.fromkeys(EMAIL_BACKLOG_CAMPAIGN_STATUSES, 0)
+        rows = (
+            EmailCampaign.objects.filter(status__in=EMAIL_BACKLOG_CAMPAIGN_STATUSES)
+            .values('status')
+            .annotate(total=Count('id'))
+        )
+        for row in rows:
+            campaigns[row['status']] = row['total']
+
+        # Chunks of cancelled or failed campaigns are not sent, so they are
+        # not backlog until the campaign is requeued
+        chunks = dict.fromkeys(EMAIL_BACKLOG_CHUNK_STATUSES, (0, 0))
+        rows = (
+            EmailChunk.objects.filter(
+                status__in=EMAIL_BACKLOG_CHUNK_STATUSES,
+                campaign__status__in=EMAIL_BACKLOG_CAMPAIGN_STATUSES
+            )
+            .values('status')
+            .annotate(total=Count('id'), recipients=Sum('size'))
+        )
+        for row in rows:
+            chunks[row['status']] = (row['total'], row['recipients'] or 0)
+        return {'email_campaigns': campaigns, 'email_chunks': chunks}
+
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir'))
+
+
+def build_registry(include_backlog=True):
+    """
+    Registry to expose: the per-process default registry, or the aggregate
+    of every process's files in multiprocess mode
+    """
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultRegistryCollector())
+    if include_backlog:
+        registry.register(ScheduledBacklogCollector())
+    return registry
+
+
+class _DefaultRegistryCollector:
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def _scrape_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        auth = request.META.get('HTTP_AUTHORIZATION', '')
+        if auth.startswith('Bearer ') and hmac.compare_digest(auth[7:].encode(), token.encode()):
+            return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """
+    GET /metrics in the Prometheus text format
+    """
+    if not _scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(build_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead(pid):
+    """
+    Drop a dead worker process's live gauges (called from gunicorn and
+    Celery child-exit hooks)
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+# Celery signal handlers -----------------------------------------------------
+
+def _before_task_publish(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+def _task_prerun(task=None, **kwargs):
+    request = getattr(task, 'request', None)
+    published_at = getattr(request, 'published_at', None)
+    if published_at is None:
+        return
+    # Countdown/ETA tasks are due at their ETA, not when they were published
+    due = float(published_at)
+    eta = getattr(request, 'eta', None)
+    if eta:
+        try:
+            eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+            due = max(due, eta.timestamp())
+        except (AttributeError, TypeError, ValueError):
+            pass
+    TASK_QUEUE_WAIT.labels(task=task.name).observe(max(time.time() - due, 0))
+
+
+def _worker_init(**kwargs):
+    port = settings.CELERY_METRICS_PORT
+    if port:
+        start_http_server(port, registry=build_registry(include_backlog=False))
+        logger.info("Serving Celery worker metrics on port %s", port)
+
+
+def _worker_process_shutdown(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+def connect_celery_signals():
+    from celery import signals
+
+    signals.before_task_publish.connect(_before_task_publish, weak=False)
+    signals.task_prerun.connect(_task_prerun, weak=False)
+    signals.worker_init.connect(_worker_init, weak=False)
+    signals.worker_process_shutdown.connect(_worker_process_shutdown, weak=False)
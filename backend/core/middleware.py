@@ -0,0 +1,109 @@
+"""
+Middleware shared by the project.
+"""
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings as django_settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import profiling
+
+logger = logging.getLogger('core.profiling')
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise that can also run in an async middleware chain.
+
+    WhiteNoise 6 is sync-only, so under ASGI Django would run every request
+    (not just static files) through a thread to call it. Here only static
+    file lookups and responses go through a thread; other requests are
+    passed straight to the async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=None):
+        if settings is None:
+            super().__init__(get_response)
+        else:
+            super().__init__(get_response, settings)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling (PROFILING_ENABLED).
+
+    A PROFILING_SAMPLE_RATE fraction of requests (and, with DEBUG, any
+    request sent with an X-Profile header) is profiled: the response gets
+    a Server-Timing header with total, DB, outbound HTTP and serializer
+    time, and requests slower than PROFILING_SLOW_MS are logged with their
+    slowest queries. Unsampled requests pass straight through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not django_settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _sampled(self, request):
+        if django_settings.DEBUG and 'X-Profile' in request.headers:
+            return True
+        return random.random() < django_settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled(request):
+            return self.get_response(request)
+        profile, token = profiling.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiling.stop(token)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self._sampled(request):
+            return await self.get_response(request)
+        profile, token = profiling.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiling.stop(token)
+        return self._finish(request, response, profile)
+
+    def _finish(self, request, response, profile):
+        response['Server-Timing'] = profile.server_timing()
+        elapsed_ms = profile.elapsed() * 1000
+        if elapsed_ms >= django_settings.PROFILING_SLOW_MS:
+            logger.warning(
+                "Slow request %s %s %.0fms (status %s): %s",
+                request.method, request.path, elapsed_ms, response.status_code, profile.summary()
+            )
+        return response
@@ -0,0 +1,102 @@
+"""
+Migration operations for indexes on large tables.
+
+On PostgreSQL both build their index with CREATE INDEX CONCURRENTLY, which
+does not block writes to the table while it runs (so the migration must
+set atomic = False); on other databases AddIndexOnline is a plain AddIndex
+and AddTrigramIndex does nothing.
+"""
+import logging
+
+from django.db import DatabaseError, NotSupportedError
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.operations.base import Operation
+
+logger = logging.getLogger(__name__)
+
+
+def _check_not_in_transaction(schema_editor):
+    if schema_editor.connection.in_atomic_block:
+        raise NotSupportedError(
+            "Building indexes concurrently requires a non-atomic migration (atomic = False)."
+        )
+
+
+class AddIndexOnline(AddIndex):
+    """
+    AddIndex that builds the index concurrently on PostgreSQL
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        _check_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        _check_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddTrigramIndex(Operation):
+    """
+    GIN trigram index (pg_trgm) on UPPER(field), the expression Django's
+    icontains lookups compare on PostgreSQL, so substring searches (admin
+    search_fields) use an index. The index is not part of the model state.
+    Skipped with a warning when the pg_trgm extension cannot be created
+    (it needs a privileged role); searches then scan the table.
+    """
+    reversible = True
+
+    def __init__(self, model_name, field_name, name):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.name = name
+
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            [],
+            {'model_name': self.model_name, 'field_name': self.field_name, 'name': self.name},
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        _check_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        try:
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as e:
+            logger.warning("Skipping trigram index %s: %s", self.name, e)
+            return
+        quote = schema_editor.quote_name
+        column = model._meta.get_field(self.field_name).column
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(self.name)} "
+            f"ON {quote(model._meta.db_table)} USING gin ((UPPER({quote(column)}::text)) gin_trgm_ops)"
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        _check_not_in_transaction(schema_editor)
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(self.name)}")
+
+    def describe(self):
+        return f"Create trigram index {self.name} on {self.model_name}.{self.field_name}"
+
+    @property
+    def migration_name_fragment(self):
+        return f"{self.model_name.lower()}_{self.name.lower()}"
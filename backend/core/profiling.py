@@ -0,0 +1,146 @@
+"""
+Per-request profiling: wall time split into database, outbound HTTP and
+serializer time.
+
+A RequestProfile is bound to a context variable for the requests picked
+by ProfilingMiddleware (a PROFILING_SAMPLE_RATE sample). Instrumentation
+points check the variable and do nothing for every other request, so
+the overhead outside the sample is one context variable lookup per query
+or provider call.
+"""
+from contextlib import contextmanager
+import contextvars
+import heapq
+import time
+
+from django.conf import settings
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.totals = {'db': 0.0, 'http': 0.0, 'serializer': 0.0}
+        self.counts = {'db': 0, 'http': 0, 'serializer': 0}
+        self.depth = {'serializer': 0}
+        # Min-heap of (duration, sql) holding the slowest queries
+        self.slow_queries = []
+
+    def add(self, kind, seconds):
+        self.totals[kind] += seconds
+        self.counts[kind] += 1
+
+    def add_query(self, sql, seconds):
+        self.add('db', seconds)
+        entry = (seconds, sql[:300])
+        if len(self.slow_queries) < settings.PROFILING_TOP_QUERIES:
+            heapq.heappush(self.slow_queries, entry)
+        elif entry > self.slow_queries[0]:
+            heapq.heapreplace(self.slow_queries, entry)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def server_timing(self):
+        """
+        Value of the Server-Timing header (durations in milliseconds)
+        """
+        return ', '.join([
+            f"total;dur={self.elapsed() * 1000:.1f}",
+            f'db;dur={self.totals["db"] * 1000:.1f};desc="{self.counts["db"]} queries"',
+            f'http;dur={self.totals["http"] * 1000:.1f};desc="{self.counts["http"]} calls"',
+            f"serializer;dur={self.totals['serializer'] * 1000:.1f}",
+        ])
+
+    def summary(self):
+        text = (
+            f"db {self.counts['db']} queries {self.totals['db'] * 1000:.0f}ms, "
+            f"http {self.counts['http']} calls {self.totals['http'] * 1000:.0f}ms, "
+            f"serializer {self.totals['serializer'] * 1000:.0f}ms"
+        )
+        if self.slow_queries:
+            text += '; slowest queries: ' + '; '.join(
+                f"{seconds * 1000:.1f}ms {sql}" for seconds, sql in sorted(self.slow_queries, reverse=True)
+            )
+        return text
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record(kind, seconds):
+    """
+    Add an outbound call (kind='http') or other span to the current profile
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.add(kind, seconds)
+
+
+@contextmanager
+def span(kind):
+    """
+    Time a block for the current profile; nested spans of the same kind
+    (e.g. a serializer inside a serializer) are counted once
+    """
+    profile = _current.get()
+    if profile is None or profile.depth[kind]:
+        yield
+        return
+    profile.depth[kind] += 1
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        profile.depth[kind] -= 1
+        profile.add(kind, time.monotonic() - started)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.monotonic() - started)
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    # Installed on every new connection (every thread, including the one
+    # async views use for the ORM), not only around sampled requests
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _timed_data(prop):
+    def fget(self):
+        with span('serializer'):
+            return prop.fget(self)
+    return property(fget, doc=prop.__doc__)
+
+
+def install():
+    """
+    Hook query timing and DRF serializer timing; called at startup when
+    PROFILING_ENABLED is set
+    """
+    from django.db.backends.signals import connection_created
+    from rest_framework import serializers
+
+    connection_created.connect(_install_query_wrapper, weak=False)
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        if 'data' in cls.__dict__:
+            setattr(cls, 'data', _timed_data(cls.__dict__['data']))
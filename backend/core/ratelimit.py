@@ -0,0 +1,313 @@
+"""
+Adaptive (AIMD) concurrency limiting for outbound provider calls.
+
+Each provider (WATI, SendGrid, Kickbox) has a concurrency limit shared by
+every web and worker process through Redis. Healthy, fast responses grow
+the limit additively (about +1 per limit's worth of calls); 429, 5xx and
+connection errors shrink it multiplicatively, and a Retry-After header
+blocks new calls until it passes. Throttled calls are retried with
+backoff; 5xx responses only for idempotent calls. Each in-flight call holds a leased slot,
+so a crashed worker cannot leak capacity.
+
+If Redis is unreachable the limiter fails open and calls go straight
+through, matching the behaviour before it existed.
+"""
+from email.utils import parsedate_to_datetime
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import observe_provider_call
+
+logger = logging.getLogger(__name__)
+
+# KEYS: limit, inflight, blocked_until
+# ARGV: now_ms, lease_ms, token, initial_limit
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local blocked = tonumber(redis.call('get', KEYS[3]) or '0')
+if blocked > now then
+    return {0, blocked - now}
+end
+redis.call('zremrangebyscore', KEYS[2], '-inf', now)
+local limit = tonumber(redis.call('get', KEYS[1]) or ARGV[4])
+if redis.call('zcard', KEYS[2]) < math.floor(limit) then
+    redis.call('zadd', KEYS[2], now + tonumber(ARGV[2]), ARGV[3])
+    redis.call('pexpire', KEYS[2], ARGV[2])
+    return {1, 0}
+end
+return {0, 0}
+"""
+
+# KEYS: limit, inflight, blocked_until, last_decrease
+# ARGV: now_ms, token, outcome, initial, min, max, increase, decrease_factor,
+#       decrease_cooldown_ms, retry_after_ms
+_RELEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('zrem', KEYS[2], ARGV[2])
+local limit = tonumber(redis.call('get', KEYS[1]) or ARGV[4])
+local outcome = ARGV[3]
+if outcome == 'ok' then
+    limit = math.min(tonumber(ARGV[6]), limit + tonumber(ARGV[7]) / limit)
+elseif outcome == 'throttled' then
+    -- Decrease at most once per cooldown so a burst of errors from one
+    -- window does not collapse the limit to the minimum
+    local last = tonumber(redis.call('get', KEYS[4]) or '0')
+    if now - last >= tonumber(ARGV[9]) then
+        limit = math.max(tonumber(ARGV[5]), limit * tonumber(ARGV[8]))
+        redis.call('set', KEYS[4], now)
+    end
+    local retry_after = tonumber(ARGV[10])
+    if retry_after > 0 then
+        local until_ms = now + retry_after
+        if until_ms > tonumber(redis.call('get', KEYS[3]) or '0') then
+            redis.call('set', KEYS[3], until_ms, 'PX', retry_after)
+        end
+    end
+end
+redis.call('set', KEYS[1], tostring(limit))
+return tostring(limit)
+"""
+
+
+class LimiterTimeout(Exception):
+    """Raised when no provider slot became free within the acquire timeout"""
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP date) into seconds.
+
+    Returns:
+        float: Seconds to wait, 0 if absent or unparseable
+    """
+    if not value:
+        return 0
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - timezone.now()).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_throttled(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def is_retryable(status_code, idempotent):
+    # A 429 was not processed; a 5xx may have been, so only idempotent
+    # calls repeat it
+    return status_code == 429 or (idempotent and status_code >= 500)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for one provider, with state in Redis
+    """
+
+    def __init__(self, name, initial_limit=8, min_limit=1, max_limit=64, increase=1.0,
+                 decrease_factor=0.5, target_latency=2.0, lease_seconds=60,
+                 acquire_timeout=120, decrease_cooldown=1.0):
+        self.name = name
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.lease_ms = int(lease_seconds * 1000)
+        self.acquire_timeout = acquire_timeout
+        self.decrease_cooldown_ms = int(decrease_cooldown * 1000)
+        prefix = f"limiter:{name}"
+        self.keys = [f"{prefix}:limit", f"{prefix}:inflight", f"{prefix}:blocked_until", f"{prefix}:last_decrease"]
+
+    def _redis(self):
+        from core.redis import get_redis
+        return get_redis()
+
+    def _try_acquire(self, token):
+        """
+        Try once to take a slot.
+
+        Returns:
+            tuple: (granted, wait_ms); granted is None when Redis is unavailable
+        """
+        try:
+            granted, wait_ms = self._redis().eval(
+                _ACQUIRE_SCRIPT, 3, *self.keys[:3],
+                int(time.time() * 1000), self.lease_ms, token, self.initial_limit
+            )
+        except Exception as e:
+            logger.warning("Limiter %s unavailable, calling provider unthrottled: %s", self.name, e)
+            return None, 0
+        return bool(granted), wait_ms
+
+    def _retry_delay(self, attempt, retry_after):
+        """
+        Seconds to wait before retrying a throttled call: the Retry-After
+        the provider sent, otherwise exponential backoff with jitter
+        """
+        if retry_after:
+            return retry_after
+        backoff = min(settings.PROVIDER_RETRY_BACKOFF_MAX, settings.PROVIDER_RETRY_BACKOFF * 2 ** (attempt - 1))
+        return backoff / 2 + random.random() * backoff / 2
+
+    def _poll_delay(self, wait_ms):
+        # Wait out Retry-After if one is active, otherwise poll with jitter
+        return max(wait_ms / 1000, 0.05 + random.random() * 0.1)
+
+    def acquire(self):
+        """
+        Block until a slot is free and return its token (None when failing open).
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            granted, wait_ms = self._try_acquire(token)
+            if granted is None:
+                return None
+            if granted:
+                return token
+            if time.monotonic() >= deadline:
+                raise LimiterTimeout(f"No {self.name} slot free after {self.acquire_timeout}s")
+            time.sleep(self._poll_delay(wait_ms))
+
+    async def aacquire(self):
+        """
+        Async acquire: waits on the event loop instead of blocking a thread.
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.acquire_timeout
+        try_acquire = sync_to_async(self._try_acquire, thread_sensitive=False)
+        while True:
+            granted, wait_ms = await try_acquire(token)
+            if granted is None:
+                return None
+            if granted:
+                return token
+            if time.monotonic() >= deadline:
+                raise LimiterTimeout(f"No {self.name} slot free after {self.acquire_timeout}s")
+            await asyncio.sleep(self._poll_delay(wait_ms))
+
+    def release(self, token, outcome, retry_after=0):
+        """
+        Free a slot and feed the call outcome ('ok', 'slow' or 'throttled')
+        back into the limit.
+        """
+        if token is None:
+            return
+        try:
+            self._redis().eval(
+                _RELEASE_SCRIPT, 4, *self.keys,
+                int(time.time() * 1000), token, outcome, self.initial_limit, self.min_limit,
+                self.max_limit, self.increase, self.decrease_factor, self.decrease_cooldown_ms,
+                int(retry_after * 1000)
+            )
+        except Exception as e:
+            logger.warning("Limiter %s could not record outcome: %s", self.name, e)
+
+    async def arelease(self, token, outcome, retry_after=0):
+        if token is None:
+            return
+        await sync_to_async(self.release, thread_sensitive=False)(token, outcome, retry_after)
+
+    def call(self, func, max_attempts=3, idempotent=True):
+        """
+        Run func() inside a slot, retrying throttled responses.
+
+        func must return an object with `status_code` and `headers` (a
+        requests response or a SendGrid HTTPError). 429 responses are
+        retried, and 5xx responses too when the call is idempotent, after
+        the Retry-After delay or an exponential backoff; a retry that would
+        wait longer than the acquire timeout is not made. Connection errors
+        shrink the limit and propagate. When no retry is left the last
+        throttled response is returned for the caller to handle.
+        """
+        for attempt in range(1, max_attempts + 1):
+            token = self.acquire()
+            started = time.monotonic()
+            try:
+                response = func()
+            except Exception:
+                observe_provider_call(self.name, time.monotonic() - started, 'error')
+                self.release(token, 'throttled')
+                raise
+            latency = time.monotonic() - started
+            observe_provider_call(self.name, latency, response.status_code)
+
+            if is_throttled(response.status_code):
+                retry_after = parse_retry_after((response.headers or {}).get('Retry-After'))
+                self.release(token, 'throttled', retry_after)
+                delay = self._retry_delay(attempt, retry_after)
+                if (attempt < max_attempts and is_retryable(response.status_code, idempotent)
+                        and delay <= self.acquire_timeout):
+                    logger.info(
+                        "%s returned %s, retrying in %.1fs (attempt %d/%d)",
+                        self.name, response.status_code, delay, attempt, max_attempts
+                    )
+                    time.sleep(delay)
+                    continue
+                return response
+
+            self.release(token, 'ok' if latency <= self.target_latency else 'slow')
+            return response
+
+    async def acall(self, func, max_attempts=3, idempotent=True):
+        """
+        Async version of call(): func() returns an awaitable response (e.g.
+        an httpx.AsyncClient request).
+        """
+        for attempt in range(1, max_attempts + 1):
+            token = await self.aacquire()
+            started = time.monotonic()
+            try:
+                response = await func()
+            except Exception:
+                observe_provider_call(self.name, time.monotonic() - started, 'error')
+                await self.arelease(token, 'throttled')
+                raise
+            latency = time.monotonic() - started
+            observe_provider_call(self.name, latency, response.status_code)
+
+            if is_throttled(response.status_code):
+                retry_after = parse_retry_after((response.headers or {}).get('Retry-After'))
+                await self.arelease(token, 'throttled', retry_after)
+                delay = self._retry_delay(attempt, retry_after)
+                if (attempt < max_attempts and is_retryable(response.status_code, idempotent)
+                        and delay <= self.acquire_timeout):
+                    logger.info(
+                        "%s returned %s, retrying in %.1fs (attempt %d/%d)",
+                        self.name, response.status_code, delay, attempt, max_attempts
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                return response
+
+            await self.arelease(token, 'ok' if latency <= self.target_latency else 'slow')
+            return response
+
+
+_limiters = {}
+
+
+def get_limiter(name, profile=None):
+    """
+    Return the shared limiter for a provider configured in PROVIDER_LIMITS.
+
+    `profile` names the PROVIDER_LIMITS entry when it differs from the
+    limiter's name, e.g. one limiter per SendGrid API key, each using the
+    'sendgrid' limits.
+    """
+    if name not in _limiters:
+        options = {'acquire_timeout': settings.PROVIDER_ACQUIRE_TIMEOUT, **settings.PROVIDER_LIMITS.get(profile or name, {})}
+        _limiters[name] = AdaptiveLimiter(name, **options)
+    return _limiters[name]
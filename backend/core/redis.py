@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from django.conf import settings
+import functools
+import logging
+import os
+import socket
+import ssl
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def get_redis():
+    """
+    Return a process-wide Redis client for REDIS_URL (connection pooled)
+    """
+    options = {}
+    if settings.REDIS_URL.startswith('rediss://'):
+        options['ssl_cert_reqs'] = ssl.CERT_NONE
+    return redis.Redis.from_url(settings.REDIS_URL, **options)
+
+
+def node_id():
+    """
+    Identifier of this process, e.g. as a Redis stream consumer name
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextmanager
+def run_exclusively(name, ttl_seconds):
+    """
+    Context manager that takes the lock `name` for one run of a periodic
+    job, so runs started on several workers or nodes at once do not
+    compete. The lock is released when the block ends, and expires after
+    ttl_seconds if the process dies holding it.
+
+    Yields True if this process took the lock and False if another run
+    holds it. If Redis is unreachable it yields True: callers must stay
+    correct without the lock.
+    """
+    try:
+        lock = get_redis().lock(f"lock:{name}", timeout=ttl_seconds, blocking=False)
+        acquired = lock.acquire()
+    except Exception as e:
+        logger.warning("Lock %s unavailable, running anyway: %s", name, e)
+        lock, acquired = None, True
+    try:
+        yield acquired
+    finally:
+        if lock is not None and acquired:
+            try:
+                lock.release()
+            except Exception as e:
+                # Expired (the run outlived ttl_seconds) or Redis went away
+                logger.warning("Could not release lock %s: %s", name, e)
@@ -1,28 +1,130 @@
-from django.contrib import admin
-from .models import EmailCampaign
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from core.admin import LargeTableAdmin
+from core.events import publish
+from .models import EmailAudience, EmailCampaign, EmailChunk
 
 
 @admin.register(EmailCampaign)
-class EmailCampaignAdmin(admin.ModelAdmin):
-    list_display = ['id', 'template_name', 'domain_name', 'status', 'total_emails', 'successful_emails', 'failed_emails', 'created_at']
+class EmailCampaignAdmin(LargeTableAdmin):
+    list_display = ['id', 'template_name', 'domain_name', 'audience', 'status', 'total_emails', 'successful_emails', 'failed_emails', 'created_at']
+    list_select_related = ['audience']
+    # Filters, search and sorting only use indexed columns (see Meta.indexes);
+    # the recipient lists are far too large to search
     list_filter = ['status', 'created_at']
-    search_fields = ['template_name', 'domain_name', 'recipients']
-    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['template_name', 'domain_name']
+    sortable_by = ['id', 'created_at']
+    list_defer = [
+        'recipients', 'error_message', 'error_summary', 'deliverable_blob', 'undeliverable_blob',
+        'audience__emails_blob', 'audience__undeliverable_blob', 'audience__unknown_blob',
+    ]
+    raw_id_fields = ['audience']
+    readonly_fields = ['error_summary', 'released_emails', 'next_release_at', 'created_at', 'updated_at']
+    actions = ['cancel_campaigns', 'requeue_campaigns', 'resend_campaigns']
     
     fieldsets = (
         ('Campaign Details', {
             'fields': ('domain_name', 'template_name', 'template_id')
         }),
         ('Recipients', {
-            'fields': ('recipients', 'total_emails')
+            'fields': ('audience', 'recipients', 'total_emails')
         }),
         ('Status', {
-            'fields': ('status', 'successful_emails', 'failed_emails', 'error_message')
+            'fields': ('status', 'successful_emails', 'failed_emails', 'error_message', 'error_summary')
+        }),
+        ('Delivery', {
+            'fields': ('scheduled_time', 'send_rate', 'send_window_start', 'send_window_end', 'released_emails', 'next_release_at')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
         }),
     )
 
+    # The actions below are one UPDATE each over the selection (or every
+    # matching row with "select all"), limited to the campaigns they apply to
+
+    def _report(self, request, updated, done, skipped):
+        if updated:
+            # Open dashboards refetch the logs
+            publish('emails', {'type': 'resync'})
+            self.message_user(request, f"{updated} campaign(s) {done}.", messages.SUCCESS)
+        else:
+            self.message_user(request, f"No campaigns {done}: {skipped}.", messages.WARNING)
+
+    @admin.action(description="Cancel selected campaigns (queued, scheduled or sending in chunks)")
+    def cancel_campaigns(self, request, queryset):
+        # Queued campaigns are not started, the scheduler stops releasing
+        # batches and workers hand queued chunks back unsent
+        updated = queryset.filter(
+            Q(status__in=['pending', 'scheduled']) | (Q(status='processing') & (Q(pending_chunks__gt=0) | Q(next_release_at__isnull=False)))
+        ).update(
+            status='cancelled',
+            next_release_at=None,
+            error_message='Cancelled from the admin',
+            updated_at=timezone.now()
+        )
+        self._report(request, updated, 'cancelled', 'only queued or scheduled campaigns and campaigns sending in chunks can be cancelled')
+
+    @admin.action(description="Requeue selected cancelled campaigns")
+    def requeue_campaigns(self, request, queryset):
+        # Campaigns cancelled before their first batch wait for their scheduled
+        # time again; the others resume with the recipients not released yet
+        # and the chunks workers handed back while they were cancelled
+        from .scheduler import dispatch, requeue_chunks
+
+        now = timezone.now()
+        ids = list(queryset.filter(
+            Q(released_emails=0) | Q(released_emails__lt=F('total_emails')) | Q(pending_chunks__gt=0),
+            status='cancelled'
+        ).values_list('id', flat=True))
+        updated = EmailCampaign.objects.filter(id__in=ids, status='cancelled').update(
+            status=Case(When(released_emails=0, then=Value('scheduled')), default=Value('processing')),
+            next_release_at=Case(
+                When(released_emails=0, scheduled_time__gt=now, then=F('scheduled_time')),
+                When(released_emails__gt=0, released_emails__gte=F('total_emails'), then=Value(None)),
+                default=Value(now)
+            ),
+            error_message=None,
+            updated_at=now
+        )
+        if updated:
+            transaction.on_commit(lambda: dispatch(requeue_chunks(ids)))
+        self._report(request, updated, 'requeued', 'only cancelled campaigns with recipients left can be requeued')
+
+    @admin.action(description="Resend selected failed campaigns")
+    def resend_campaigns(self, request, queryset):
+        # Only campaigns nobody received; the scheduler sends them again from
+        # the start, releasing their chunks again
+        now = timezone.now()
+        ids = list(queryset.filter(status='failed', successful_emails=0).values_list('id', flat=True))
+        with transaction.atomic():
+            EmailChunk.objects.filter(campaign_id__in=ids).update(status='scheduled', released_at=None, claimed_at=None)
+            updated = EmailCampaign.objects.filter(id__in=ids, status='failed').update(
+                status='scheduled',
+                next_release_at=now,
+                released_emails=0,
+                pending_chunks=0,
+                failed_emails=0,
+                error_message=None,
+                error_summary=None,
+                deliverable_blob=None,
+                undeliverable_blob=None,
+                deliverable_count=0,
+                undeliverable_count=0,
+                updated_at=now
+            )
+        self._report(request, updated, 'queued for resending', 'only failed campaigns can be resent')
+
 
+@admin.register(EmailAudience)
+class EmailAudienceAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'size', 'undeliverable_count', 'unknown_count', 'verified_at', 'created_at']
+    search_fields = ['name', 'content_hash']
+    # The compressed lists are not editable or shown; see emails.codecs
+    exclude = ['emails_blob', 'undeliverable_blob', 'unknown_blob']
+    readonly_fields = ['content_hash', 'size', 'undeliverable_count', 'unknown_count', 'verified_at', 'created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('emails_blob', 'undeliverable_blob', 'unknown_blob')
@@ -0,0 +1,72 @@
+"""
+Async variants of the Kickbox-bound email endpoints, and the live
+campaign progress stream.
+
+Plain Django async views (DRF 3.14 views are sync only) with the same
+request and response bodies as the matching viewset actions.
+"""
+import json
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+
+from core.events import sse_response
+from .models import PROGRESS_FIELDS, EmailCampaign, progress_event
+from .serializers import PreviewEmailSerializer
+from .services import EmailService
+
+
+@csrf_exempt
+@require_POST
+async def preview(request):
+    """
+    Preview what would be sent to a specific recipient without sending.
+
+    POST /api/emails/async/preview/
+    Body: same as POST /api/emails/campaigns/preview/
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except (TypeError, ValueError):
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = PreviewEmailSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    verification = await EmailService().averify_emails_with_kickbox([serializer.validated_data['recipient']])
+    status_label = (
+        'deliverable' if verification['deliverable'] else
+        'undeliverable' if verification['undeliverable'] else
+        'unknown'
+    )
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'recipient': serializer.validated_data['recipient'],
+            'deliverability': status_label,
+            'template': {
+                'id': serializer.validated_data['template_id'],
+                'name': serializer.validated_data['template_name']
+            },
+            'from_email': f"noreply@{serializer.validated_data['domain_name']}"
+        }
+    })
+
+
+def _running_campaigns():
+    campaigns = EmailCampaign.objects.filter(status__in=['scheduled', 'processing']).values(*PROGRESS_FIELDS)
+    return [('emails', progress_event(values)) for values in campaigns]
+
+
+@require_GET
+async def events(request):
+    """
+    Server-Sent Events stream of email campaign progress: a 'progress'
+    event (campaign_id, status, total, successful, failed, released) for
+    every running campaign on connect, then one per change
+
+    GET /api/emails/async/events/
+    """
+    return sse_response(['emails'], snapshot=_running_campaigns)
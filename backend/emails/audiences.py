@@ -0,0 +1,66 @@
+"""
+Saved audiences: content-addressed recipient lists shared by campaigns.
+"""
+import functools
+
+from django.db import IntegrityError, transaction
+
+from .codecs import content_hash, decode_emails, encode_emails, normalize_emails
+from .models import EmailAudience
+
+
+def save_audience(name, emails):
+    """
+    Store a recipient list once.
+
+    The list is normalized and deduplicated; if an audience with the same
+    addresses exists it is returned instead of storing a second copy.
+
+    Returns:
+        tuple: (EmailAudience, created)
+    """
+    emails = normalize_emails(emails)
+    digest = content_hash(emails)
+    existing = EmailAudience.objects.defer('emails_blob', 'undeliverable_blob', 'unknown_blob').filter(content_hash=digest).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            audience = EmailAudience.objects.create(
+                name=name,
+                content_hash=digest,
+                emails_blob=encode_emails(emails),
+                size=len(emails)
+            )
+    except IntegrityError:
+        # Same list uploaded concurrently
+        return EmailAudience.objects.get(content_hash=digest), False
+    return audience, True
+
+
+@functools.lru_cache(maxsize=32)
+def _verification_sets(audience_id, verified_at):
+    # Keyed by verified_at so a re-verification is picked up; each chunk of
+    # a campaign reuses the decoded sets instead of decompressing again
+    audience = EmailAudience.objects.only('undeliverable_blob', 'unknown_blob').get(id=audience_id)
+    return frozenset(decode_emails(audience.undeliverable_blob)), frozenset(decode_emails(audience.unknown_blob))
+
+
+def split_by_audience(audience, recipients):
+    """
+    Split recipients of a verified audience using its stored Kickbox
+    results instead of calling Kickbox.
+
+    Returns:
+        dict: { 'deliverable': [...], 'undeliverable': [...], 'unknown': [...], 'errors': [] }
+    """
+    undeliverable, unknown = _verification_sets(audience.id, audience.verified_at)
+    verification = {'deliverable': [], 'undeliverable': [], 'unknown': [], 'errors': []}
+    for email in recipients:
+        if email in undeliverable:
+            verification['undeliverable'].append(email)
+        elif email in unknown:
+            verification['unknown'].append(email)
+        else:
+            verification['deliverable'].append(email)
+    return verification
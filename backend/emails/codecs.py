@@ -0,0 +1,97 @@
+"""
+Compact storage for email address lists.
+
+A list is stored as one or more frames. Each frame holds a sorted run of
+addresses, front-coded (every address stored as the length of the prefix
+it shares with the previous one plus the rest) and zlib-compressed, behind
+a 4-byte big-endian length. Appending addresses (one campaign chunk at a
+time) adds a frame without decoding or recompressing the earlier ones;
+decoding merges the frames back into one sorted list.
+
+Sorting makes equal lists byte-identical, so an audience's SHA-256
+identifies it, and puts addresses sharing prefixes and domains next to
+each other, which is what front coding and zlib exploit.
+"""
+import hashlib
+import heapq
+import struct
+import zlib
+
+_FRAME_HEADER = struct.Struct('>I')
+
+
+def normalize_emails(emails):
+    """
+    Trimmed, lower-cased, unique addresses in sorted order
+    """
+    return sorted({email.strip().lower() for email in emails if email and email.strip()})
+
+
+def content_hash(emails):
+    """
+    SHA-256 hex digest of a normalized list
+    """
+    return hashlib.sha256('\n'.join(emails).encode()).hexdigest()
+
+
+def _front_code(emails):
+    lines = []
+    previous = ''
+    for email in emails:
+        shared = 0
+        limit = min(len(previous), len(email))
+        while shared < limit and previous[shared] == email[shared]:
+            shared += 1
+        lines.append(f"{shared}\t{email[shared:]}")
+        previous = email
+    return '\n'.join(lines)
+
+
+def _front_decode(text):
+    emails = []
+    previous = ''
+    for line in text.split('\n'):
+        shared, _, rest = line.partition('\t')
+        previous = previous[:int(shared)] + rest
+        emails.append(previous)
+    return emails
+
+
+def encode_emails(emails):
+    """
+    Encode addresses as a single frame for a BinaryField (sorted first, so
+    callers may pass them in any order)
+    """
+    emails = sorted(emails)
+    if not emails:
+        return b''
+    payload = zlib.compress(_front_code(emails).encode(), 6)
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def append_emails(blob, emails):
+    """
+    Blob with `emails` added as a new frame
+    """
+    blob = bytes(blob) if blob else b''
+    return blob + encode_emails(emails) if emails else blob
+
+
+def decode_emails(blob):
+    """
+    All addresses in a blob, sorted. Accepts the memoryview some database
+    backends return for binary columns.
+    """
+    if not blob:
+        return []
+    blob = bytes(blob)
+    frames = []
+    offset = 0
+    while offset < len(blob):
+        (length,) = _FRAME_HEADER.unpack_from(blob, offset)
+        offset += _FRAME_HEADER.size
+        frames.append(_front_decode(zlib.decompress(blob[offset:offset + length]).decode()))
+        offset += length
+    if len(frames) == 1:
+        return frames[0]
+    return list(heapq.merge(*frames))
@@ -0,0 +1,111 @@
+"""
+Bounded summaries of per-recipient send and verification errors.
+
+Errors are grouped into classes (the provider status, the exception type
+or the Kickbox error), each with a count, its first message and a uniform
+random sample of up to EMAIL_ERROR_SAMPLES recipients. At most
+EMAIL_ERROR_MAX_CLASSES classes are kept; further ones are counted under
+'other'. A summary's size therefore depends on the settings, not on the
+number of failures, both while sending and once stored on the campaign.
+"""
+import random
+
+from django.conf import settings
+
+OTHER = 'other'
+
+
+def _merge_samples(a, count_a, b, count_b, size):
+    """
+    Uniform sample of `size` recipients from the union of two uniform
+    samples of count_a and count_b failures: each slot is drawn from
+    either side in proportion to the failures it has left
+    """
+    if len(a) + len(b) <= size:
+        return a + b
+    a, b = random.sample(a, len(a)), random.sample(b, len(b))
+    merged = []
+    while len(merged) < size:
+        if random.randrange(count_a + count_b) < count_a:
+            merged.append(a.pop())
+            count_a -= 1
+        else:
+            merged.append(b.pop())
+            count_b -= 1
+    return merged
+
+
+class ErrorSummary:
+    """
+    Error counts by class with a reservoir of sample recipients per class
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.total = data.get('total', 0)
+        self.classes = {key: dict(entry) for key, entry in (data.get('classes') or {}).items()}
+
+    def __bool__(self):
+        return self.total > 0
+
+    def _entry(self, key, message):
+        if key not in self.classes and len(self.classes) >= settings.EMAIL_ERROR_MAX_CLASSES:
+            key = OTHER
+        if key not in self.classes:
+            self.classes[key] = {'count': 0, 'message': message[:200], 'samples': []}
+        return self.classes[key]
+
+    def add(self, key, recipient, message=''):
+        """
+        Count one failed recipient
+        """
+        self.total += 1
+        entry = self._entry(key, message or key)
+        entry['count'] += 1
+        samples = entry['samples']
+        if len(samples) < settings.EMAIL_ERROR_SAMPLES:
+            samples.append(recipient)
+        else:
+            # Reservoir sampling: keep each of the count recipients seen so
+            # far with equal probability
+            i = random.randrange(entry['count'])
+            if i < len(samples):
+                samples[i] = recipient
+
+    def add_status(self, recipient, status_code):
+        self.add(f"HTTP {status_code}", recipient, f"Status {status_code}")
+
+    def add_exception(self, recipient, exc):
+        self.add(type(exc).__name__, recipient, str(exc))
+
+    def add_verification_error(self, recipient, error):
+        # Kickbox errors are "HTTP <status>" or an exception message
+        key = f"Kickbox {error}" if error.startswith('HTTP ') else 'Kickbox error'
+        self.add(key, recipient, f"Kickbox: {error}")
+
+    def merge(self, other):
+        """
+        Fold another summary (e.g. a chunk's) into this one
+        """
+        self.total += other.total
+        for key, theirs in other.classes.items():
+            entry = self._entry(key, theirs['message'])
+            entry['samples'] = _merge_samples(
+                entry['samples'], entry['count'], theirs['samples'], theirs['count'], settings.EMAIL_ERROR_SAMPLES
+            )
+            entry['count'] += theirs['count']
+        return self
+
+    def to_dict(self):
+        """
+        JSON-serializable form stored in EmailCampaign.error_summary
+        """
+        return {'total': self.total, 'classes': self.classes}
+
+    def describe(self):
+        """
+        One-line text for error_message, largest classes first
+        """
+        ranked = sorted(self.classes.items(), key=lambda item: item[1]['count'], reverse=True)
+        parts = ', '.join(f"{entry['message']} ({entry['count']})" for _, entry in ranked)
+        return f"{self.total} error(s): {parts}"
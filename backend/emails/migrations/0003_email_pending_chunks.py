@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0002_emailcampaign_deliverable_emails_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='pending_chunks',
+            field=models.IntegerField(default=0, help_text='Recipient chunks still queued when sent by Celery in chunks'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:13
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_released(apps, schema_editor):
+    # Campaigns from before scheduling had every recipient released at once
+    EmailCampaign = apps.get_model('emails', 'EmailCampaign')
+    EmailCampaign.objects.update(released_emails=F('total_emails'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0003_email_pending_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='next_release_at',
+            field=models.DateTimeField(blank=True, help_text='When the scheduler releases the next batch', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='released_emails',
+            field=models.IntegerField(default=0, help_text='Recipients handed to workers so far'),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='scheduled_time',
+            field=models.DateTimeField(blank=True, help_text='When sending starts', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='send_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Target messages per minute; empty sends as fast as workers allow', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='send_window_end',
+            field=models.TimeField(blank=True, help_text='Daily send window end (TIME_ZONE); may be earlier than the start to span midnight', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='send_window_start',
+            field=models.TimeField(blank=True, help_text='Daily send window start (TIME_ZONE)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='emailcampaign',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('scheduled', 'Scheduled'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('partial', 'Partial Success')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='emailcampaign',
+            index=models.Index(fields=['status', 'next_release_at'], name='email_status_release_idx'),
+        ),
+        migrations.RunPython(mark_existing_released, migrations.RunPython.noop),
+    ]
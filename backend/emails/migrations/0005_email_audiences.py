@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0004_email_scheduling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the normalized address list', max_length=64, unique=True)),
+                ('emails_blob', models.BinaryField(help_text='Sorted addresses, compressed (see emails.codecs)')),
+                ('size', models.IntegerField(default=0)),
+                ('undeliverable_blob', models.BinaryField(blank=True, null=True)),
+                ('unknown_blob', models.BinaryField(blank=True, null=True)),
+                ('undeliverable_count', models.IntegerField(default=0)),
+                ('unknown_count', models.IntegerField(default=0)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Email Audience',
+                'verbose_name_plural': 'Email Audiences',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='emailcampaign',
+            name='recipients',
+            field=models.TextField(blank=True, help_text='Comma-separated email addresses (empty when sent to an audience)'),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='audience',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='campaigns', to='emails.emailaudience'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0005_email_audiences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='deliverable_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='undeliverable_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='deliverable_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='undeliverable_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
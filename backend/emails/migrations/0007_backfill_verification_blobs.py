@@ -0,0 +1,126 @@
+# Compress EmailCampaign deliverable/undeliverable lists in chunks
+
+import heapq
+import struct
+import zlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+
+def encode_emails(emails):
+    # Frozen copy of emails.codecs.encode_emails as of this migration: one
+    # front-coded, zlib-compressed frame behind a 4-byte big-endian length
+    emails = sorted(emails)
+    if not emails:
+        return b''
+    lines = []
+    previous = ''
+    for email in emails:
+        shared = 0
+        limit = min(len(previous), len(email))
+        while shared < limit and previous[shared] == email[shared]:
+            shared += 1
+        lines.append(f"{shared}\t{email[shared:]}")
+        previous = email
+    payload = zlib.compress('\n'.join(lines).encode(), 6)
+    return struct.pack('>I', len(payload)) + payload
+
+
+def decode_emails(blob):
+    # Frozen copy of emails.codecs.decode_emails as of this migration: every
+    # frame decoded and the sorted runs merged (chunked sends append frames)
+    if not blob:
+        return []
+    blob = bytes(blob)
+    frames = []
+    offset = 0
+    while offset < len(blob):
+        (length,) = struct.unpack_from('>I', blob, offset)
+        offset += 4
+        emails = []
+        previous = ''
+        for line in zlib.decompress(blob[offset:offset + length]).decode().split('\n'):
+            shared, _, rest = line.partition('\t')
+            previous = previous[:int(shared)] + rest
+            emails.append(previous)
+        frames.append(emails)
+        offset += length
+    return list(heapq.merge(*frames))
+
+
+def split(text):
+    return list(dict.fromkeys(email.strip() for email in (text or '').split(',') if email.strip()))
+
+
+def compress_verification_lists(apps, schema_editor):
+    """
+    Move the comma-separated lists into the compressed fields in batches of
+    BATCH_SIZE rows, each batch in its own transaction so a large table is
+    neither locked nor written to the WAL in one go
+    """
+    EmailCampaign = apps.get_model('emails', 'EmailCampaign')
+    db_alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        rows = list(
+            EmailCampaign.objects.using(db_alias)
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'deliverable_emails', 'undeliverable_emails')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        for row in rows:
+            deliverable = split(row.deliverable_emails)
+            undeliverable = split(row.undeliverable_emails)
+            row.deliverable_blob = encode_emails(deliverable) or None
+            row.undeliverable_blob = encode_emails(undeliverable) or None
+            row.deliverable_count = len(deliverable)
+            row.undeliverable_count = len(undeliverable)
+            row.deliverable_emails = None
+            row.undeliverable_emails = None
+        with transaction.atomic(using=db_alias):
+            EmailCampaign.objects.using(db_alias).bulk_update(rows, [
+                'deliverable_blob', 'undeliverable_blob', 'deliverable_count', 'undeliverable_count',
+                'deliverable_emails', 'undeliverable_emails',
+            ])
+        last_id = rows[-1].id
+
+
+def restore_verification_lists(apps, schema_editor):
+    """
+    Write the compressed lists back to the comma-separated fields (re-added
+    by reversing 0008), in batches of BATCH_SIZE rows
+    """
+    EmailCampaign = apps.get_model('emails', 'EmailCampaign')
+    db_alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        rows = list(
+            EmailCampaign.objects.using(db_alias)
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'deliverable_blob', 'undeliverable_blob')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        for row in rows:
+            row.deliverable_emails = ','.join(decode_emails(row.deliverable_blob))
+            row.undeliverable_emails = ','.join(decode_emails(row.undeliverable_blob))
+        with transaction.atomic(using=db_alias):
+            EmailCampaign.objects.using(db_alias).bulk_update(rows, ['deliverable_emails', 'undeliverable_emails'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('emails', '0006_email_verification_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_verification_lists, restore_verification_lists),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0007_backfill_verification_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='emailcampaign',
+            name='deliverable_emails',
+        ),
+        migrations.RemoveField(
+            model_name='emailcampaign',
+            name='undeliverable_emails',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0008_remove_verification_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='error_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
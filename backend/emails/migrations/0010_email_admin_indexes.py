@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+from core.operations import AddIndexOnline, AddTrigramIndex
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on PostgreSQL (see core.operations)
+    atomic = False
+
+    dependencies = [
+        ('emails', '0009_email_error_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailcampaign',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('scheduled', 'Scheduled'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('partial', 'Partial Success'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        AddIndexOnline(
+            model_name='emailcampaign',
+            index=models.Index(fields=['status', 'created_at'], name='email_status_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='emailcampaign',
+            index=models.Index(fields=['created_at'], name='email_created_idx'),
+        ),
+        AddTrigramIndex(
+            model_name='emailcampaign',
+            field_name='template_name',
+            name='email_template_trgm_idx',
+        ),
+        AddTrigramIndex(
+            model_name='emailcampaign',
+            field_name='domain_name',
+            name='email_domain_trgm_idx',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0010_email_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.IntegerField(help_text="Offset of the chunk in the campaign's recipient list")),
+                ('size', models.IntegerField()),
+                ('status', models.CharField(choices=[('released', 'Released'), ('sending', 'Sending'), ('done', 'Done')], default='released', max_length=20)),
+                ('released_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='emails.emailcampaign')),
+            ],
+            options={
+                'ordering': ['campaign', 'start'],
+                'indexes': [models.Index(fields=['campaign', 'status'], name='email_chunk_campaign_idx')],
+            },
+        ),
+    ]
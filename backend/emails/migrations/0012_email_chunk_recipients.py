@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0011_email_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailchunk',
+            name='recipients_blob',
+            field=models.BinaryField(blank=True, help_text='Addresses, compressed (see emails.codecs)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='emailchunk',
+            name='released_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AlterField(
+            model_name='emailchunk',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('released', 'Released'), ('sending', 'Sending'), ('done', 'Done')], default='released', max_length=20),
+        ),
+    ]
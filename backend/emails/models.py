@@ -1,5 +1,50 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from core.cache import InvalidatingQuerySet, invalidate_on_change
+from core.events import publish
+from .codecs import decode_emails, encode_emails
+
+
+class EmailAudience(models.Model):
+    """
+    A saved recipient list, stored once and shared by every campaign sent
+    to it. Identified by the SHA-256 of its normalized addresses, so
+    uploading the same list again returns the existing audience.
+    """
+    name = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the normalized address list")
+    emails_blob = models.BinaryField(help_text="Sorted addresses, compressed (see emails.codecs)")
+    size = models.IntegerField(default=0)
+    # Kickbox results for the whole list; addresses in neither list are deliverable
+    undeliverable_blob = models.BinaryField(null=True, blank=True)
+    unknown_blob = models.BinaryField(null=True, blank=True)
+    undeliverable_count = models.IntegerField(default=0)
+    unknown_count = models.IntegerField(default=0)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Email Audience'
+        verbose_name_plural = 'Email Audiences'
+
+    def __str__(self):
+        return f"{self.name} ({self.size})"
+
+    def get_emails(self):
+        return decode_emails(self.emails_blob)
+
+    def is_verified(self):
+        """Whether the stored Kickbox results are recent enough to reuse"""
+        if self.verified_at is None:
+            return False
+        return self.verified_at >= timezone.now() - timedelta(seconds=settings.EMAIL_AUDIENCE_VERIFICATION_TTL)
 
 
 class EmailCampaign(models.Model):
@@ -8,49 +53,192 @@ class EmailCampaign(models.Model):
     """
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('scheduled', 'Scheduled'),
         ('processing', 'Processing'),
         ('success', 'Success'),
         ('failed', 'Failed'),
         ('partial', 'Partial Success'),
+        ('cancelled', 'Cancelled'),
     ]
     
     domain_name = models.CharField(max_length=255)
     template_name = models.CharField(max_length=255)
     template_id = models.CharField(max_length=255)
-    recipients = models.TextField(help_text="Comma-separated email addresses")
+    recipients = models.TextField(blank=True, help_text="Comma-separated email addresses (empty when sent to an audience)")
+    audience = models.ForeignKey(EmailAudience, null=True, blank=True, on_delete=models.PROTECT, related_name='campaigns')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_emails = models.IntegerField(default=0)
     successful_emails = models.IntegerField(default=0)
     failed_emails = models.IntegerField(default=0)
     error_message = models.TextField(blank=True, null=True)
-    deliverable_emails = models.TextField(blank=True, null=True, help_text="Comma-separated deliverable email addresses")
-    undeliverable_emails = models.TextField(blank=True, null=True, help_text="Comma-separated undeliverable email addresses")
+    # Failures by class with sample recipients (see emails.errors)
+    error_summary = models.JSONField(null=True, blank=True)
+    # Verification results, compressed (see emails.codecs); read through the
+    # deliverable_emails / undeliverable_emails properties
+    deliverable_blob = models.BinaryField(null=True, blank=True)
+    undeliverable_blob = models.BinaryField(null=True, blank=True)
+    deliverable_count = models.IntegerField(default=0)
+    undeliverable_count = models.IntegerField(default=0)
+    pending_chunks = models.IntegerField(default=0, help_text="Recipient chunks still queued when sent by Celery in chunks")
+    # Delivery shape of scheduled campaigns, released in batches by emails.scheduler
+    scheduled_time = models.DateTimeField(null=True, blank=True, help_text="When sending starts")
+    send_rate = models.PositiveIntegerField(null=True, blank=True, help_text="Target messages per minute; empty sends as fast as workers allow")
+    send_window_start = models.TimeField(null=True, blank=True, help_text="Daily send window start (TIME_ZONE)")
+    send_window_end = models.TimeField(null=True, blank=True, help_text="Daily send window end (TIME_ZONE); may be earlier than the start to span midnight")
+    released_emails = models.IntegerField(default=0, help_text="Recipients handed to workers so far")
+    next_release_at = models.DateTimeField(null=True, blank=True, help_text="When the scheduler releases the next batch")
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = InvalidatingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Email Campaign'
         verbose_name_plural = 'Email Campaigns'
+        indexes = [
+            # Used by the scheduler to find due rows: status IN (...) AND next_release_at <= now
+            models.Index(fields=['status', 'next_release_at'], name='email_status_release_idx'),
+            # Used by the logs and the admin changelist: newest first, optionally by status
+            models.Index(fields=['status', 'created_at'], name='email_status_created_idx'),
+            models.Index(fields=['created_at'], name='email_created_idx'),
+            # Admin search also has trigram indexes on template_name and domain_name on
+            # PostgreSQL (migration 0010_email_admin_indexes)
+        ]
     
     def __str__(self):
         return f"{self.template_name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
     
     def get_recipients_list(self):
-        """Convert comma-separated recipients to list"""
+        """Convert comma-separated recipients (or the audience) to list"""
+        if self.audience_id:
+            return self.audience.get_emails()
         return [email.strip() for email in self.recipients.split(',') if email.strip()]
     
-    def get_deliverable_emails_list(self):
-        """Convert comma-separated deliverable emails to list"""
-        if not self.deliverable_emails:
-            return []
-        return [email.strip() for email in self.deliverable_emails.split(',') if email.strip()]
+    @cached_property
+    def deliverable_emails(self):
+        """Deliverable addresses (sorted), decoded on first access"""
+        return decode_emails(self.deliverable_blob)
+    
+    @cached_property
+    def undeliverable_emails(self):
+        """Undeliverable addresses (sorted), decoded on first access"""
+        return decode_emails(self.undeliverable_blob)
+    
+    def set_verification(self, deliverable, undeliverable):
+        """Store the verification results (not saved)"""
+        self.deliverable_blob = encode_emails(deliverable) or None
+        self.undeliverable_blob = encode_emails(undeliverable) or None
+        self.deliverable_count = len(deliverable)
+        self.undeliverable_count = len(undeliverable)
+        self._clear_decoded_lists()
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._clear_decoded_lists()
     
-    def get_undeliverable_emails_list(self):
-        """Convert comma-separated undeliverable emails to list"""
-        if not self.undeliverable_emails:
-            return []
-        return [email.strip() for email in self.undeliverable_emails.split(',') if email.strip()]
+    def _clear_decoded_lists(self):
+        self.__dict__.pop('deliverable_emails', None)
+        self.__dict__.pop('undeliverable_emails', None)
+
+
+class EmailChunk(models.Model):
+    """
+    A slice of a campaign's recipients queued as one send_email_chunk_task.
+    Scheduled campaigns are split into chunks once, when scheduled, and the
+    scheduler releases them (scheduled -> released) at the campaign's rate.
+    The task claims the chunk (released -> sending) before sending, so a
+    chunk queued twice (a retried task, a re-release) is sent once, and
+    records its outcome once (-> done).
+    """
+    STATUS_CHOICES = [
+        ('scheduled', 'Scheduled'),
+        ('released', 'Released'),
+        ('sending', 'Sending'),
+        ('done', 'Done'),
+    ]
+
+    campaign = models.ForeignKey(EmailCampaign, on_delete=models.CASCADE, related_name='chunks')
+    start = models.IntegerField(help_text="Offset of the chunk in the campaign's recipient list")
+    size = models.IntegerField()
+    # The chunk's own addresses, so sending it decodes only its slice; empty
+    # for chunks recorded before they were stored
+    recipients_blob = models.BinaryField(null=True, blank=True, help_text="Addresses, compressed (see emails.codecs)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='released')
+    released_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['campaign', 'start']
+        indexes = [
+            models.Index(fields=['campaign', 'status'], name='email_chunk_campaign_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} [{self.start}:{self.start + self.size}] {self.status}"
+
+    def get_recipients(self):
+        """The chunk's addresses"""
+        if self.recipients_blob:
+            return decode_emails(self.recipients_blob)
+        return self.campaign.get_recipients_list()[self.start:self.start + self.size]
+
+
+def split_into_chunks(campaign_id, recipients, chunk_size, offset=0, **fields):
+    """
+    Unsaved EmailChunks of chunk_size addresses covering `recipients`, the
+    campaign's list from `offset` on, each storing its own addresses
+    """
+    return [
+        EmailChunk(
+            campaign_id=campaign_id,
+            start=offset + start,
+            size=len(recipients[start:start + chunk_size]),
+            recipients_blob=encode_emails(recipients[start:start + chunk_size]),
+            **fields
+        )
+        for start in range(0, len(recipients), chunk_size)
+    ]
+
+
+PROGRESS_FIELDS = ('id', 'status', 'total_emails', 'successful_emails', 'failed_emails', 'released_emails')
+
+
+def progress_event(values):
+    """
+    'progress' event of the emails stream (core.events) from a campaign's
+    PROGRESS_FIELDS values
+    """
+    return {
+        'type': 'progress',
+        'campaign_id': values['id'],
+        'status': values['status'],
+        'total': values['total_emails'],
+        'successful': values['successful_emails'],
+        'failed': values['failed_emails'],
+        'released': values['released_emails'],
+    }
+
+
+def publish_progress(campaign_ids):
+    """
+    Publish the progress of campaigns changed with queryset updates, read
+    once the current transaction commits
+    """
+    if not campaign_ids:
+        return
+
+    def send():
+        for values in EmailCampaign.objects.filter(id__in=campaign_ids).values(*PROGRESS_FIELDS):
+            publish('emails', progress_event(values))
+    transaction.on_commit(send)
+
 
+def _publish_saved_progress(sender, instance, **kwargs):
+    publish('emails', progress_event({field: getattr(instance, field) for field in PROGRESS_FIELDS}))
 
 
+# Cached dashboard responses (core.cache) read campaigns
+post_save.connect(invalidate_on_change, sender=EmailCampaign)
+post_delete.connect(invalidate_on_change, sender=EmailCampaign)
+post_save.connect(_publish_saved_progress, sender=EmailCampaign)
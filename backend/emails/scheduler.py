@@ -0,0 +1,304 @@
+"""
+Database-backed dispatcher for scheduled and throttled email campaigns.
+
+A scheduled campaign has a start time and, optionally, a target rate
+(send_rate, messages per minute) and a daily send window. A periodic task
+claims campaigns whose next_release_at has passed with SELECT ... FOR
+UPDATE SKIP LOCKED and releases their next batch of recipients to the
+bulk workers as send_email_chunk_task chunks. With a rate, each tick
+releases EMAIL_SCHEDULER_INTERVAL seconds' worth of recipients for every
+interval due (more when a tick ran late), so a large campaign reaches
+SendGrid and the workers as a steady trickle instead of one spike.
+Without a rate the whole list is released at once.
+
+A campaign is split into chunks (EmailChunk) once, when it is scheduled,
+each storing its own addresses: a tick only moves due chunks from
+'scheduled' to 'released', and the worker that claims a chunk decodes
+just that chunk. Chunks nobody claims within EMAIL_CHUNK_RELEASE_TIMEOUT
+(the publish failed, or the process died before it) are queued again,
+and chunks a worker claimed but did not finish within
+EMAIL_CHUNK_SEND_TIMEOUT are recorded as failed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+import logging
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import fairness
+from .models import EmailCampaign, EmailChunk, publish_progress, split_into_chunks
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'email-scheduler'
+
+# Statuses of campaigns that may still have recipients to release
+RELEASABLE_STATUSES = ['scheduled', 'processing']
+
+
+def window_opens_at(campaign, now):
+    """
+    When the campaign's daily send window next opens.
+
+    Returns:
+        datetime: None if now is inside the window or there is no window
+    """
+    start, end = campaign.send_window_start, campaign.send_window_end
+    if start is None or end is None:
+        return None
+    local = timezone.localtime(now)
+    current = local.time()
+    if start <= end:
+        inside = start <= current < end
+    else:
+        # Window spans midnight, e.g. 22:00-06:00
+        inside = current >= start or current < end
+    if inside:
+        return None
+    opens = local.replace(hour=start.hour, minute=start.minute, second=start.second, microsecond=0)
+    if opens <= local:
+        opens += timedelta(days=1)
+    return opens
+
+
+def batch_size(campaign, remaining, now):
+    """
+    Recipients to release this tick: at the campaign's send_rate, one
+    scheduler interval's worth for every interval due by now (a late tick
+    catches up), or everything left when it has no rate
+    """
+    if not campaign.send_rate:
+        return remaining
+    interval = settings.EMAIL_SCHEDULER_INTERVAL
+    due = (now - campaign.next_release_at).total_seconds() // interval + 1
+    return min(remaining, max(1, math.ceil(campaign.send_rate * interval * due / 60)))
+
+
+def chunk_size(campaign):
+    """
+    Recipients per chunk: EMAIL_CHUNK_SIZE, or less when the campaign's rate
+    releases fewer per scheduler interval
+    """
+    if not campaign.send_rate:
+        return settings.EMAIL_CHUNK_SIZE
+    return min(settings.EMAIL_CHUNK_SIZE, max(1, math.ceil(campaign.send_rate * settings.EMAIL_SCHEDULER_INTERVAL / 60)))
+
+
+def schedule_chunks(campaign, start=0):
+    """
+    Split a scheduled campaign's recipients from `start` on into
+    'scheduled' chunks, so the scheduler never decodes the list again and
+    each tick only releases chunks
+
+    Returns:
+        int: Number of recipients in the campaign
+    """
+    recipients = campaign.get_recipients_list()
+    EmailChunk.objects.bulk_create(
+        split_into_chunks(campaign.id, recipients[start:], chunk_size(campaign), offset=start, status='scheduled', released_at=None),
+        batch_size=1000
+    )
+    EmailCampaign.objects.filter(id=campaign.id).update(total_emails=len(recipients))
+    campaign.total_emails = len(recipients)
+    return len(recipients)
+
+
+def claim_due_batches(limit, now=None):
+    """
+    Release the next batch of up to `limit` due campaigns.
+
+    Campaigns outside their send window are pushed to the window's next
+    opening instead. The first release of a campaign moves it from
+    'scheduled' to 'processing'. Only chunk states change: recipient lists
+    are not read, so a tick costs the same however large the campaigns.
+
+    Returns:
+        list: (campaign_id, domain_name, [(chunk_id, size), ...]) per released batch
+    """
+    now = now or timezone.now()
+    releases = []
+    released_ids = []
+    with transaction.atomic():
+        campaigns = list(
+            EmailCampaign.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=RELEASABLE_STATUSES, next_release_at__lte=now)
+            .defer('recipients', 'deliverable_blob', 'undeliverable_blob', 'error_summary', 'error_message')
+            .order_by('next_release_at')[:limit]
+        )
+        for campaign in campaigns:
+            rows = EmailCampaign.objects.filter(id=campaign.id)
+            opens = window_opens_at(campaign, now)
+            if opens is not None:
+                rows.update(next_release_at=opens)
+                continue
+
+            start = campaign.released_emails if campaign.status == 'processing' else 0
+            scheduled = EmailChunk.objects.filter(campaign_id=campaign.id, status='scheduled')
+            if not scheduled.exists() and (campaign.status == 'scheduled' or start < campaign.total_emails):
+                # Not split when scheduled: queued campaigns cancelled and
+                # requeued, resends of campaigns sent without chunks
+                schedule_chunks(campaign, start)
+            quota = batch_size(campaign, campaign.total_emails - start, now)
+            chunks = []
+            size = 0
+            for chunk_id, count in scheduled.order_by('start').values_list('id', 'size')[:quota]:
+                if chunks and size + count > quota:
+                    break
+                chunks.append((chunk_id, count))
+                size += count
+            EmailChunk.objects.filter(id__in=[chunk_id for chunk_id, _ in chunks]).update(status='released', released_at=now)
+
+            released = start + size
+            next_release_at = None
+            if released < campaign.total_emails:
+                # Keep the rate from the previous due time, so ticks that ran
+                # late or were skipped are made up by the next one
+                next_release_at = campaign.next_release_at + timedelta(seconds=size * 60 / campaign.send_rate)
+
+            fields = {
+                'status': 'processing',
+                'released_emails': released,
+                'next_release_at': next_release_at,
+                'pending_chunks': F('pending_chunks') + len(chunks),
+                'updated_at': now,
+            }
+            if campaign.status == 'scheduled':
+                fields.update(successful_emails=0, failed_emails=0, pending_chunks=len(chunks))
+            if not campaign.total_emails:
+                fields['status'] = 'success'
+            rows.update(**fields)
+            released_ids.append(campaign.id)
+            if chunks:
+                releases.append((campaign.id, campaign.domain_name, chunks))
+        publish_progress(released_ids)
+    return releases
+
+
+def release_stale_chunks(limit, now=None):
+    """
+    Queue again up to `limit` chunks still unclaimed
+    EMAIL_CHUNK_RELEASE_TIMEOUT seconds after their release. The chunk may
+    just be waiting in a long queue; whichever copy a worker claims first
+    is sent and the other is skipped.
+
+    Returns:
+        list: Releases, as returned by claim_due_batches()
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.EMAIL_CHUNK_RELEASE_TIMEOUT)
+    with transaction.atomic():
+        chunks = list(
+            EmailChunk.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='released', released_at__lt=cutoff, campaign__status='processing')
+            .order_by('released_at')
+            .values_list('id', 'campaign_id', 'campaign__domain_name', 'size')[:limit]
+        )
+        EmailChunk.objects.filter(id__in=[chunk[0] for chunk in chunks]).update(released_at=now)
+    if chunks:
+        logger.warning("Queued %d unclaimed email chunk(s) again", len(chunks))
+    return _releases(chunks)
+
+
+def requeue_chunks(campaign_ids, now=None):
+    """
+    Release again the chunks of requeued campaigns that workers handed back
+    while the campaigns were cancelled
+
+    Returns:
+        list: Releases, as returned by claim_due_batches()
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        chunks = list(
+            EmailChunk.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='released', campaign_id__in=campaign_ids)
+            .values_list('id', 'campaign_id', 'campaign__domain_name', 'size')
+        )
+        EmailChunk.objects.filter(id__in=[chunk[0] for chunk in chunks]).update(released_at=now)
+    return _releases(chunks)
+
+
+def _releases(chunks):
+    by_campaign = defaultdict(list)
+    for chunk_id, campaign_id, domain_name, size in chunks:
+        by_campaign[campaign_id, domain_name].append((chunk_id, size))
+    return [(campaign_id, domain_name, campaign_chunks) for (campaign_id, domain_name), campaign_chunks in by_campaign.items()]
+
+
+def fail_stale_chunks(now=None):
+    """
+    Record the chunks a worker claimed but did not finish within
+    EMAIL_CHUNK_SEND_TIMEOUT seconds (it died mid-send) as failed. Some of
+    their recipients may have been sent to, so they are reported rather
+    than sent again.
+
+    Returns:
+        int: Number of chunks failed
+    """
+    from .services import EmailService
+
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.EMAIL_CHUNK_SEND_TIMEOUT)
+    chunks = list(EmailChunk.objects.filter(status='sending', claimed_at__lt=cutoff))
+    if not chunks:
+        return 0
+    service = EmailService()
+    error = TimeoutError('Send did not complete (worker lost); the email may or may not have been delivered')
+    for chunk in chunks:
+        service.fail_chunk(chunk.campaign_id, chunk.get_recipients(), error, chunk.id)
+    logger.warning("Marked %d email chunk(s) stuck in sending as failed", len(chunks))
+    return len(chunks)
+
+
+def dispatch(releases):
+    """
+    Queue released chunks on the bulk lane with the sender's fairness
+    priority. Workers read each chunk's recipients from its row.
+    """
+    from .tasks import FAIRNESS_LANE, send_email_chunk_task
+
+    for campaign_id, domain_name, chunks in releases:
+        for chunk_id, _ in chunks:
+            send_email_chunk_task.apply_async(
+                args=[campaign_id, None, domain_name],
+                kwargs={'chunk_id': chunk_id},
+                priority=fairness.acquire_priority(FAIRNESS_LANE, domain_name)
+            )
+
+
+def dispatch_due_campaigns():
+    """
+    Release and queue the due batches of scheduled email campaigns, and
+    recover chunks lost on the way to the workers.
+
+    A short lock keeps overlapping ticks (several beat nodes, a slow run)
+    from competing for the same rows; it expires before the next tick, so
+    every tick runs. SKIP LOCKED keeps runs correct without it.
+
+    Returns:
+        dict: { 'skipped': bool, 'campaigns': int, 'recipients': int, 'requeued': int, 'stale': int }
+    """
+    from core.redis import run_exclusively
+
+    with run_exclusively(LOCK_NAME, max(settings.EMAIL_SCHEDULER_INTERVAL - 1, 1)) as acquired:
+        if not acquired:
+            return {'skipped': True, 'campaigns': 0, 'recipients': 0, 'requeued': 0, 'stale': 0}
+
+        stale = fail_stale_chunks()
+        requeued = release_stale_chunks(settings.EMAIL_SCHEDULER_BATCH_SIZE)
+        releases = claim_due_batches(settings.EMAIL_SCHEDULER_BATCH_SIZE)
+        dispatch(requeued + releases)
+    return {
+        'skipped': False,
+        'campaigns': len(releases),
+        'recipients': sum(size for _, _, chunks in releases for _, size in chunks),
+        'requeued': sum(len(chunks) for _, _, chunks in requeued),
+        'stale': stale,
+    }
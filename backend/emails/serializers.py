@@ -1,11 +1,17 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
 from rest_framework import serializers
-from .models import EmailCampaign
+from .models import EmailAudience, EmailCampaign
+import re
 
 
 class EmailCampaignSerializer(serializers.ModelSerializer):
     """
-    Serializer for EmailCampaign model
+    Serializer for EmailCampaign model. Lists report the verification
+    results as counts; the addresses are in EmailCampaignDetailSerializer.
     """
+
     class Meta:
         model = EmailCampaign
         fields = [
@@ -14,17 +20,44 @@ class EmailCampaignSerializer(serializers.ModelSerializer):
             'template_name',
             'template_id',
             'recipients',
+            'audience',
             'status',
             'total_emails',
             'successful_emails',
             'failed_emails',
-            'deliverable_emails',
-            'undeliverable_emails',
+            'deliverable_count',
+            'undeliverable_count',
             'error_message',
+            'error_summary',
+            'scheduled_time',
+            'send_rate',
+            'send_window_start',
+            'send_window_end',
+            'released_emails',
+            'next_release_at',
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'status', 'total_emails', 'successful_emails', 'failed_emails', 'deliverable_emails', 'undeliverable_emails', 'error_message', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'total_emails', 'successful_emails', 'failed_emails', 'deliverable_count', 'undeliverable_count', 'error_message', 'error_summary', 'released_emails', 'next_release_at', 'created_at', 'updated_at']
+
+
+
+class EmailCampaignDetailSerializer(EmailCampaignSerializer):
+    """
+    A single campaign with its verification lists, decoded from the
+    compressed blobs; comma-separated as before
+    """
+    deliverable_emails = serializers.SerializerMethodField()
+    undeliverable_emails = serializers.SerializerMethodField()
+
+    class Meta(EmailCampaignSerializer.Meta):
+        fields = EmailCampaignSerializer.Meta.fields + ['deliverable_emails', 'undeliverable_emails']
+
+    def get_deliverable_emails(self, obj):
+        return ','.join(obj.deliverable_emails)
+
+    def get_undeliverable_emails(self, obj):
+        return ','.join(obj.undeliverable_emails)
 
 
 class SendEmailSerializer(serializers.Serializer):
@@ -34,7 +67,33 @@ class SendEmailSerializer(serializers.Serializer):
     domain_name = serializers.CharField(max_length=255, required=True)
     template_name = serializers.CharField(max_length=255, required=True)
     template_id = serializers.CharField(max_length=255, required=True)
-    recipients = serializers.CharField(required=True, help_text="Comma-separated email addresses")
+    recipients = serializers.CharField(required=False, help_text="Comma-separated email addresses")
+    audience_id = serializers.IntegerField(required=False, help_text="Saved audience to send to instead of recipients")
+    # Delivery shape: any of these schedules the campaign instead of sending it now
+    scheduled_time = serializers.DateTimeField(required=False)
+    send_rate = serializers.IntegerField(required=False, min_value=1, help_text="Messages per minute")
+    send_window_start = serializers.TimeField(required=False)
+    send_window_end = serializers.TimeField(required=False)
+    
+    def validate(self, attrs):
+        """
+        Exactly one of recipients and audience_id; a send window needs
+        both a start and an end
+        """
+        if ('recipients' in attrs) == ('audience_id' in attrs):
+            raise serializers.ValidationError("Provide either recipients or audience_id")
+        if 'audience_id' in attrs:
+            audience = EmailAudience.objects.defer('emails_blob', 'undeliverable_blob', 'unknown_blob').filter(id=attrs['audience_id']).first()
+            if audience is None:
+                raise serializers.ValidationError({'audience_id': "Audience not found"})
+            attrs['audience'] = audience
+        start = attrs.get('send_window_start')
+        end = attrs.get('send_window_end')
+        if (start is None) != (end is None):
+            raise serializers.ValidationError("send_window_start and send_window_end must be given together")
+        if start is not None and start == end:
+            raise serializers.ValidationError("The send window must not be empty")
+        return attrs
     
     def validate_recipients(self, value):
         """
@@ -56,7 +115,6 @@ class SendEmailSerializer(serializers.Serializer):
         return value
 
 
-
 class PreviewEmailSerializer(serializers.Serializer):
     """
     Serializer for previewing a single recipient before sending
@@ -67,3 +125,89 @@ class PreviewEmailSerializer(serializers.Serializer):
     recipient = serializers.EmailField(required=True)
 
 
+
+
+class PreviewBatchEmailSerializer(serializers.Serializer):
+    """
+    Serializer for previewing many recipients in one request
+    """
+    domain_name = serializers.CharField(max_length=255, required=True)
+    template_name = serializers.CharField(max_length=255, required=True)
+    template_id = serializers.CharField(max_length=255, required=True)
+    recipients = serializers.ListField(child=serializers.EmailField(), allow_empty=False)
+
+    def validate_recipients(self, value):
+        """
+        Drop duplicates (keeping order) and enforce the batch size cap
+        """
+        recipients = list(dict.fromkeys(value))
+        if len(recipients) > settings.EMAIL_PREVIEW_MAX_RECIPIENTS:
+            raise serializers.ValidationError(
+                f"At most {settings.EMAIL_PREVIEW_MAX_RECIPIENTS} recipients can be previewed at once"
+            )
+        return recipients
+
+
+class EmailAudienceSerializer(serializers.ModelSerializer):
+    """
+    Serializer for EmailAudience model (without the address list)
+    """
+    class Meta:
+        model = EmailAudience
+        fields = [
+            'id',
+            'name',
+            'content_hash',
+            'size',
+            'undeliverable_count',
+            'unknown_count',
+            'verified_at',
+            'created_at'
+        ]
+        read_only_fields = fields
+
+
+# Separators accepted in uploaded lists: commas, semicolons and whitespace (one address per line)
+LIST_SEPARATOR_RE = re.compile(r'[,;\s]+')
+
+
+class CreateEmailAudienceSerializer(serializers.Serializer):
+    """
+    Serializer for uploading a saved audience, as a string or a text/CSV file
+    """
+    name = serializers.CharField(max_length=255, required=True)
+    recipients = serializers.CharField(required=False, help_text="Comma- or newline-separated email addresses")
+    file = serializers.FileField(required=False, help_text="Text or CSV file of addresses; cells without '@' (headers, names) are ignored")
+
+    def validate(self, attrs):
+        """
+        Parse and validate the addresses in one pass; field-per-item
+        validation is too slow for lists of 100k+ addresses
+        """
+        if ('recipients' in attrs) == ('file' in attrs):
+            raise serializers.ValidationError("Provide either recipients or file")
+        if 'file' in attrs:
+            text = attrs.pop('file').read().decode('utf-8-sig', errors='replace')
+            tokens = [token for token in LIST_SEPARATOR_RE.split(text) if '@' in token]
+        else:
+            tokens = [token for token in LIST_SEPARATOR_RE.split(attrs.pop('recipients')) if token]
+
+        emails = list(dict.fromkeys(token.strip('"\'').lower() for token in tokens))
+        if not emails:
+            raise serializers.ValidationError("At least one recipient email is required")
+        if len(emails) > settings.EMAIL_AUDIENCE_MAX_RECIPIENTS:
+            raise serializers.ValidationError(
+                f"An audience may contain at most {settings.EMAIL_AUDIENCE_MAX_RECIPIENTS} recipients"
+            )
+        invalid = []
+        for email in emails:
+            try:
+                validate_email(email)
+            except DjangoValidationError:
+                invalid.append(email)
+        if invalid:
+            raise serializers.ValidationError(
+                f"{len(invalid)} invalid email address(es), e.g. {', '.join(invalid[:5])}"
+            )
+        attrs['emails'] = emails
+        return attrs
@@ -1,34 +1,228 @@
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, From
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from .models import EmailCampaign
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from core.events import publish
+from core.http import get_async_client
+from core.metrics import count_messages
+from core.ratelimit import get_limiter
+from .audiences import split_by_audience
+from .codecs import append_emails, encode_emails
+from .errors import ErrorSummary
+from .models import EmailAudience, EmailCampaign, EmailChunk, progress_event, publish_progress, split_into_chunks
+from .transports import get_registry, is_success
+import asyncio
+import hashlib
+import logging
 import requests
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def kickbox_cache_key(email):
+    return f"kickbox:{hashlib.sha1(email.strip().lower().encode()).hexdigest()}"
+
+
+# The Kickbox result cache fails open: with the cache down, addresses are
+# looked up again instead of the send failing
+
+def cached_kickbox_results(emails):
+    """
+    Cached Kickbox results of the given addresses, by address
+    """
+    keys = {kickbox_cache_key(email): email for email in emails}
+    try:
+        return {keys[key]: result for key, result in cache.get_many(list(keys)).items()}
+    except Exception as e:
+        logger.warning("Kickbox cache unavailable: %s", e)
+        return {}
+
+
+async def acached_kickbox_results(emails):
+    keys = {kickbox_cache_key(email): email for email in emails}
+    try:
+        return {keys[key]: result for key, result in (await cache.aget_many(list(keys))).items()}
+    except Exception as e:
+        logger.warning("Kickbox cache unavailable: %s", e)
+        return {}
+
+
+def cache_kickbox_result(email, result):
+    try:
+        cache.set(kickbox_cache_key(email), result, settings.KICKBOX_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Kickbox cache unavailable: %s", e)
+
+
+def deliverability(result):
+    """
+    Map a Kickbox result (deliverable, undeliverable, risky, unknown) to the
+    deliverability reported by the API
+    """
+    if result in ('deliverable', 'undeliverable'):
+        return result
+    return 'unknown'
 
 
 class EmailService:
     """
-    Service class to handle SendGrid email operations
+    Service class to handle email sending (through the transports in
+    transports.py) and Kickbox verification
     """
     
     def __init__(self):
-        self.api_key = settings.SENDGRID_API_KEY
-        if not self.api_key:
-            raise ValueError("SENDGRID_API_KEY is not configured in settings")
-        self.client = SendGridAPIClient(self.api_key)
+        self.transports = get_registry()
+        if not self.transports.transports:
+            raise ValueError("No email transport configured: set SENDGRID_API_KEY (or EMAIL_SMTP_HOST) in settings")
         self.kickbox_api_key = getattr(settings, 'KICKBOX_API_KEY', '')
 
     def verify_emails_with_kickbox(self, emails):
         """
         Verify emails using Kickbox API and split into deliverable and undeliverable.
 
+        Results are cached per address for KICKBOX_CACHE_TTL seconds.
+
         Args:
             emails (list[str]): List of email addresses
 
         Returns:
-            dict: { 'deliverable': [...], 'undeliverable': [...], 'unknown': [...], 'errors': [...] }
+            dict: { 'deliverable': [...], 'undeliverable': [...], 'unknown': [...], 'errors': [(email, error), ...] }
+        """
+        verification = self._empty_verification()
+        for email, result in self.iter_verify_emails(emails, max_workers=1):
+            verification[result['deliverability']].append(email)
+            if result['error']:
+                verification['errors'].append((email, result['error']))
+        return verification
+
+    def verify_recipients(self, campaign, recipients):
+        """
+        Split a campaign's recipients like verify_emails_with_kickbox(),
+        reusing the stored results when the campaign's audience has been
+        verified recently
+        """
+        if campaign.audience_id:
+            audience = EmailAudience.objects.defer('emails_blob', 'undeliverable_blob', 'unknown_blob').get(id=campaign.audience_id)
+            if audience.is_verified():
+                return split_by_audience(audience, recipients)
+        return self.verify_emails_with_kickbox(recipients)
+
+    def verify_audience(self, audience_id):
+        """
+        Verify every address of a saved audience with Kickbox and store the
+        results on it, so campaigns sent to it skip Kickbox until
+        EMAIL_AUDIENCE_VERIFICATION_TTL passes.
+
+        Returns:
+            dict: Result with success status and the deliverability counts
+        """
+        audience = EmailAudience.objects.get(id=audience_id)
+        if not self.kickbox_api_key:
+            # Without Kickbox every address is sent to; nothing to store
+            return {'success': True, 'audience_id': audience.id, 'verified': False}
+
+        undeliverable = []
+        unknown = []
+        errors = 0
+        for email, result in self.iter_verify_emails(audience.get_emails()):
+            if result['error']:
+                errors += 1
+            elif result['deliverability'] == 'undeliverable':
+                undeliverable.append(email)
+            elif result['deliverability'] == 'unknown':
+                unknown.append(email)
+        if errors:
+            # Successful lookups are cached per address, so a retry only
+            # repeats the failed ones
+            return {'success': False, 'audience_id': audience.id, 'error': f"{errors} Kickbox lookup(s) failed"}
+
+        audience.undeliverable_blob = encode_emails(sorted(undeliverable))
+        audience.unknown_blob = encode_emails(sorted(unknown))
+        audience.undeliverable_count = len(undeliverable)
+        audience.unknown_count = len(unknown)
+        audience.verified_at = timezone.now()
+        audience.save(update_fields=['undeliverable_blob', 'unknown_blob', 'undeliverable_count', 'unknown_count', 'verified_at'])
+        return {
+            'success': True,
+            'audience_id': audience.id,
+            'verified': True,
+            'deliverable': audience.size - len(undeliverable) - len(unknown),
+            'undeliverable': len(undeliverable),
+            'unknown': len(unknown)
+        }
+
+    def verify_email(self, email):
+        """
+        Verify one address with Kickbox, using the cached result if any.
+
+        Returns:
+            dict: { 'deliverability': 'deliverable'|'undeliverable'|'unknown', 'cached': bool, 'error': str|None }
         """
         if not self.kickbox_api_key:
             # If Kickbox key not configured, treat all as deliverable
+            return {'deliverability': 'deliverable', 'cached': False, 'error': None}
+
+        result = cached_kickbox_results([email]).get(email)
+        if result is not None:
+            return {'deliverability': deliverability(result), 'cached': True, 'error': None}
+
+        try:
+            resp = get_limiter('kickbox').call(
+                lambda: requests.get(
+                    settings.KICKBOX_API_URL,
+                    params={'email': email, 'apikey': self.kickbox_api_key},
+                    timeout=10
+                ),
+                max_attempts=settings.PROVIDER_MAX_ATTEMPTS
+            )
+        except Exception as e:
+            return {'deliverability': 'unknown', 'cached': False, 'error': str(e)}
+        return self._kickbox_response(email, resp)
+
+    def iter_verify_emails(self, emails, max_workers=None):
+        """
+        Yield (email, result of verify_email) as each verification finishes.
+
+        Cached results are yielded first without calling Kickbox; the rest
+        are verified by up to max_workers threads (EMAIL_PREVIEW_CONCURRENCY
+        by default), each call going through the Kickbox limiter.
+        """
+        if max_workers is None:
+            max_workers = settings.EMAIL_PREVIEW_CONCURRENCY
+
+        pending = list(emails)
+        if self.kickbox_api_key and pending:
+            cached = cached_kickbox_results(pending)
+            for email in pending:
+                if email in cached:
+                    yield email, {'deliverability': deliverability(cached[email]), 'cached': True, 'error': None}
+            pending = [email for email in pending if email not in cached]
+
+        if max_workers <= 1 or len(pending) <= 1:
+            for email in pending:
+                yield email, self.verify_email(email)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(pending)))
+        try:
+            futures = {executor.submit(self.verify_email, email): email for email in pending}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # The client may disconnect mid-stream: drop lookups not yet started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def averify_emails_with_kickbox(self, emails):
+        """
+        Async version of verify_emails_with_kickbox(): uncached addresses are
+        checked concurrently on the shared async HTTP client, within the
+        Kickbox limiter's concurrency.
+        """
+        if not self.kickbox_api_key:
             return {
                 'deliverable': emails,
                 'undeliverable': [],
@@ -36,40 +230,57 @@ class EmailService:
                 'errors': []
             }
 
-        deliverable = []
-        undeliverable = []
-        unknown = []
-        errors = []
+        cached = await acached_kickbox_results(emails)
+        pending = [email for email in emails if email not in cached]
 
-        for email in emails:
+        client = get_async_client()
+        limiter = get_limiter('kickbox')
+
+        async def verify(email):
             try:
-                resp = requests.get(
-                    'https://api.kickbox.com/v2/verify',
-                    params={'email': email, 'apikey': self.kickbox_api_key},
-                    timeout=10
+                resp = await limiter.acall(
+                    lambda: client.get(
+                        settings.KICKBOX_API_URL,
+                        params={'email': email, 'apikey': self.kickbox_api_key},
+                        timeout=10
+                    ),
+                    max_attempts=settings.PROVIDER_MAX_ATTEMPTS
                 )
-                if resp.status_code != 200:
-                    unknown.append(email)
-                    errors.append(f"{email}: HTTP {resp.status_code}")
-                    continue
-                data = resp.json()
-                result = data.get('result')  # deliverable, undeliverable, risky, unknown
-                if result == 'deliverable':
-                    deliverable.append(email)
-                elif result == 'undeliverable':
-                    undeliverable.append(email)
-                else:
-                    unknown.append(email)
             except Exception as e:
-                unknown.append(email)
-                errors.append(f"{email}: {str(e)}")
+                return {'deliverability': 'unknown', 'cached': False, 'error': str(e)}
+            return await sync_to_async(self._kickbox_response, thread_sensitive=False)(email, resp)
+
+        results = dict(zip(pending, await asyncio.gather(*(verify(email) for email in pending))))
 
+        verification = self._empty_verification()
+        for email in emails:
+            if email in cached:
+                verification[deliverability(cached[email])].append(email)
+                continue
+            result = results[email]
+            verification[result['deliverability']].append(email)
+            if result['error']:
+                verification['errors'].append((email, result['error']))
+        return verification
+
+    def _empty_verification(self):
         return {
-            'deliverable': deliverable,
-            'undeliverable': undeliverable,
-            'unknown': unknown,
-            'errors': errors
+            'deliverable': [],
+            'undeliverable': [],
+            'unknown': [],
+            'errors': []
         }
+
+    def _kickbox_response(self, email, resp):
+        """
+        Turn a Kickbox response into a verify_email() result, caching
+        successful lookups
+        """
+        if resp.status_code != 200:
+            return {'deliverability': 'unknown', 'cached': False, 'error': f"HTTP {resp.status_code}"}
+        result = resp.json().get('result')  # deliverable, undeliverable, risky, unknown
+        cache_kickbox_result(email, result)
+        return {'deliverability': deliverability(result), 'cached': False, 'error': None}
     
     def send_template_email(self, campaign_id):
         """
@@ -92,43 +303,34 @@ class EmailService:
             
             successful = 0
             failed = 0
-            errors = []
+            errors = ErrorSummary()
 
             # Step 1: Verify recipients with Kickbox
-            verification = self.verify_emails_with_kickbox(recipients)
+            verification = self.verify_recipients(campaign, recipients)
             recipients_to_send = verification['deliverable']
             # Count undeliverable as failed immediately
             failed += len(verification['undeliverable'])
-            if verification['errors']:
-                errors.extend(verification['errors'])
+            for email, error in verification['errors']:
+                errors.add_verification_error(email, error)
             
             # Store deliverable and undeliverable email lists
-            campaign.deliverable_emails = ','.join(verification['deliverable']) if verification['deliverable'] else ''
-            campaign.undeliverable_emails = ','.join(verification['undeliverable']) if verification['undeliverable'] else ''
+            campaign.set_verification(verification['deliverable'], verification['undeliverable'])
             campaign.save()
             
-            for recipient_email in recipients_to_send:
-                try:
-                    # Create message using template
-                    message = Mail(
-                        from_email=From(f'noreply@{campaign.domain_name}', 'Email Dashboard'),
-                        to_emails=recipient_email
-                    )
-                    message.template_id = campaign.template_id
-                    
-                    # Send email
-                    response = self.client.send(message)
-                    
-                    if response.status_code in [200, 201, 202]:
-                        successful += 1
-                    else:
-                        failed += 1
-                        errors.append(f"{recipient_email}: Status {response.status_code}")
-                
-                except Exception as e:
-                    failed += 1
-                    errors.append(f"{recipient_email}: {str(e)}")
-            
+            def report(sent, send_failed):
+                publish('emails', progress_event({
+                    'id': campaign.id,
+                    'status': campaign.status,
+                    'total_emails': campaign.total_emails,
+                    'successful_emails': sent,
+                    'failed_emails': failed + send_failed,
+                    'released_emails': campaign.released_emails,
+                }))
+
+            sent, send_failed = self._deliver(campaign, recipients_to_send, errors, progress=report)
+            successful += sent
+            failed += send_failed
+
             # Update campaign status
             campaign.successful_emails = successful
             campaign.failed_emails = failed
@@ -137,10 +339,11 @@ class EmailService:
                 campaign.status = 'success'
             elif successful == 0:
                 campaign.status = 'failed'
-                campaign.error_message = '; '.join(errors)
             else:
                 campaign.status = 'partial'
-                campaign.error_message = '; '.join(errors)
+            if errors:
+                campaign.error_summary = errors.to_dict()
+                campaign.error_message = errors.describe()
             
             campaign.save()
             
@@ -151,7 +354,7 @@ class EmailService:
                 'successful': successful,
                 'failed': failed,
                 'status': campaign.status,
-                'errors': errors if errors else None
+                'errors': errors.to_dict() if errors else None
             }
         
         except EmailCampaign.DoesNotExist:
@@ -173,5 +376,203 @@ class EmailService:
                 'error': str(e)
             }
 
+    def _deliver(self, campaign, recipients, errors, progress=None):
+        """
+        Send the campaign template to each recipient, recording failures
+        in the ErrorSummary `errors`. `progress(successful, failed)` is
+        called with the counts so far every EVENTS_PROGRESS_INTERVAL seconds.
 
+        Returns:
+            tuple: (successful, failed)
+        """
+        successful = 0
+        failed = 0
+        reported_at = time.monotonic()
+        for recipient_email in recipients:
+            if progress is not None and time.monotonic() - reported_at >= settings.EVENTS_PROGRESS_INTERVAL:
+                progress(successful, failed)
+                reported_at = time.monotonic()
+            try:
+                # Send through a healthy transport, failing over to the next one
+                _, response = self.transports.send(
+                    f'noreply@{campaign.domain_name}', 'Email Dashboard',
+                    recipient_email, campaign.template_id
+                )
+
+                if is_success(response.status_code):
+                    successful += 1
+                else:
+                    failed += 1
+                    errors.add_status(recipient_email, response.status_code)
+            
+            except Exception as e:
+                failed += 1
+                errors.add_exception(recipient_email, e)
+        
+        count_messages('email', campaign.template_name, 'sent', successful)
+        count_messages('email', campaign.template_name, 'failed', failed)
+        return successful, failed
+
+    def start_chunked_send(self, campaign_id, chunk_size):
+        """
+        Start sending a pending campaign in chunks: reset its counters and
+        record its chunks, each with its own addresses, in one transaction.
+        A campaign already started (the task is retried) is left as is; its
+        chunks no worker has claimed yet are returned to be queued again.
+
+        Returns:
+            tuple: (campaign, list of EmailChunk)
+        """
+        campaign = EmailCampaign.objects.get(id=campaign_id)
+        if campaign.status == 'pending':
+            recipients = campaign.get_recipients_list()
+            chunks = split_into_chunks(campaign_id, recipients, chunk_size)
+            with transaction.atomic():
+                started = EmailCampaign.objects.filter(id=campaign_id, status='pending').update(
+                    status='processing' if recipients else 'success',
+                    total_emails=len(recipients),
+                    successful_emails=0,
+                    failed_emails=0,
+                    deliverable_blob=None,
+                    undeliverable_blob=None,
+                    deliverable_count=0,
+                    undeliverable_count=0,
+                    error_message=None,
+                    error_summary=None,
+                    pending_chunks=len(chunks),
+                    released_emails=len(recipients),
+                    next_release_at=None,
+                    updated_at=timezone.now()
+                )
+                if started:
+                    EmailChunk.objects.bulk_create(chunks, batch_size=1000)
+                    publish_progress([campaign_id])
+        chunks = EmailChunk.objects.filter(campaign_id=campaign_id, status='released').defer('recipients_blob')
+        return campaign, list(chunks)
 
+    def chunk_recipients(self, chunk_id):
+        """
+        Addresses of one chunk, decoded from the chunk alone
+        """
+        return EmailChunk.objects.get(id=chunk_id).get_recipients()
+
+    def claim_chunk(self, chunk_id):
+        """
+        Claim a released chunk for sending; False if another worker has
+        claimed it or it is done
+        """
+        return bool(EmailChunk.objects.filter(id=chunk_id, status='released').update(
+            status='sending', claimed_at=timezone.now()
+        ))
+
+    def unclaim_chunk(self, chunk_id):
+        """
+        Hand a claimed chunk back (it failed before sending) for its retry
+        """
+        EmailChunk.objects.filter(id=chunk_id, status='sending').update(
+            status='released', released_at=timezone.now(), claimed_at=None
+        )
+
+    def send_email_chunk(self, campaign_id, recipients, chunk_id=None):
+        """
+        Verify and send one chunk of a campaign. Nothing is stored: the
+        outcome is recorded with record_chunk(), so recording can be
+        retried without sending again. Chunks of a cancelled campaign are
+        handed back unsent, for requeue_campaigns to release again.
+
+        Returns:
+            dict: { 'deliverable', 'undeliverable', 'successful', 'failed', 'errors' },
+                or None if the chunk was dropped
+        """
+        campaign = EmailCampaign.objects.get(id=campaign_id)
+        if campaign.status == 'cancelled':
+            if chunk_id is None:
+                # Untracked chunk: it cannot be released again
+                EmailCampaign.objects.filter(id=campaign_id).update(pending_chunks=F('pending_chunks') - 1)
+            else:
+                self.unclaim_chunk(chunk_id)
+            return None
+        verification = self.verify_recipients(campaign, recipients)
+        errors = ErrorSummary()
+        for email, error in verification['errors']:
+            errors.add_verification_error(email, error)
+        successful, failed = self._deliver(campaign, verification['deliverable'], errors)
+        return {
+            'deliverable': verification['deliverable'],
+            'undeliverable': verification['undeliverable'],
+            'successful': successful,
+            'failed': failed + len(verification['undeliverable']),
+            'errors': errors.to_dict() if errors else None,
+        }
+
+    def fail_chunk(self, campaign_id, recipients, exc, chunk_id=None):
+        """
+        Record every recipient of a chunk that could not be sent as failed
+        (`recipients` None: read them from the chunk)
+        """
+        if recipients is None:
+            recipients = self.chunk_recipients(chunk_id)
+        errors = ErrorSummary()
+        for email in recipients:
+            errors.add_exception(email, exc)
+        outcome = {'deliverable': [], 'undeliverable': [], 'successful': 0, 'failed': len(recipients), 'errors': errors.to_dict()}
+        return self.record_chunk(campaign_id, outcome, chunk_id)
+
+    def _finish_chunk(self, chunk_id):
+        """
+        Mark a chunk done; False if it already was, i.e. its outcome is
+        already counted. Call within the transaction that counts it.
+        """
+        if chunk_id is None:
+            return True
+        return bool(EmailChunk.objects.filter(id=chunk_id).exclude(status='done').update(status='done'))
+
+    def record_chunk(self, campaign_id, outcome, chunk_id=None):
+        """
+        Fold the outcome of send_email_chunk() into the campaign with a
+        single UPDATE. Under a row lock, the chunk's address lists are
+        appended to the compressed lists as new frames, without decoding
+        the earlier chunks, and its errors merged into the error summary.
+        The chunk that brings pending_chunks to zero
+        once every recipient has been released sets the final status.
+        A chunk is counted once, however often its outcome is recorded.
+
+        Returns:
+            dict: { 'campaign_id', 'successful', 'failed', 'finished' }
+        """
+        campaigns = EmailCampaign.objects.filter(id=campaign_id)
+        with transaction.atomic():
+            lists = campaigns.select_for_update().values('deliverable_blob', 'undeliverable_blob', 'error_summary').get()
+            if not self._finish_chunk(chunk_id):
+                return {'campaign_id': campaign_id, 'successful': 0, 'failed': 0, 'finished': False}
+            if outcome['errors']:
+                summary = ErrorSummary(lists['error_summary']).merge(ErrorSummary(outcome['errors']))
+                error_fields = {'error_summary': summary.to_dict(), 'error_message': summary.describe()}
+            else:
+                error_fields = {}
+            campaigns.update(
+                successful_emails=F('successful_emails') + outcome['successful'],
+                failed_emails=F('failed_emails') + outcome['failed'],
+                deliverable_blob=append_emails(lists['deliverable_blob'], outcome['deliverable']) or None,
+                undeliverable_blob=append_emails(lists['undeliverable_blob'], outcome['undeliverable']) or None,
+                deliverable_count=F('deliverable_count') + len(outcome['deliverable']),
+                undeliverable_count=F('undeliverable_count') + len(outcome['undeliverable']),
+                pending_chunks=F('pending_chunks') - 1,
+                **error_fields
+            )
+        finished = campaigns.filter(
+            status='processing', pending_chunks__lte=0, released_emails__gte=F('total_emails')
+        ).update(
+            status=Case(
+                When(failed_emails=0, then=Value('success')),
+                When(successful_emails=0, then=Value('failed')),
+                default=Value('partial'),
+            )
+        )
+        publish_progress([campaign_id])
+        return {
+            'campaign_id': campaign_id,
+            'successful': outcome['successful'],
+            'failed': outcome['failed'],
+            'finished': bool(finished)
+        }
@@ -1,25 +1,133 @@
+import logging
+
 from celery import shared_task
+from django.conf import settings
+from core import fairness
 from .services import EmailService
 
+logger = logging.getLogger(__name__)
+
+# Fairness lane for bulk email chunks; senders are domain names
+FAIRNESS_LANE = 'email'
+
 
 @shared_task(bind=True, max_retries=3)
 def send_email_campaign_task(self, campaign_id):
     """
     Celery task to send email campaign asynchronously
     
+    The recipients are split into chunks of EMAIL_CHUNK_SIZE, each sent by
+    send_email_chunk_task on the bulk queue. Chunk priority drops as the
+    campaign's domain queues more chunks, so other domains' campaigns are
+    interleaved instead of waiting behind a large one.
+    
+    Args:
+        campaign_id: ID of the EmailCampaign instance
+    
+    Returns:
+        dict: Number of chunks queued
+    """
+    try:
+        email_service = EmailService()
+        campaign, chunks = email_service.start_chunked_send(campaign_id, settings.EMAIL_CHUNK_SIZE)
+        for chunk in chunks:
+            send_email_chunk_task.apply_async(
+                args=[campaign.id, None, campaign.domain_name],
+                kwargs={'chunk_id': chunk.id},
+                priority=fairness.acquire_priority(FAIRNESS_LANE, campaign.domain_name)
+            )
+        return {'success': True, 'campaign_id': campaign.id, 'chunks': len(chunks)}
+    except Exception as exc:
+        # Retry the task in case of failure; chunks already claimed are not
+        # queued again, and copies of the others are sent once
+        raise self.retry(exc=exc, countdown=60)
+
+
+@shared_task(bind=True, max_retries=3)
+def send_email_chunk_task(self, campaign_id, recipients, sender, chunk_id=None, outcome=None):
+    """
+    Celery task to send one chunk of an email campaign
+    
+    The chunk is claimed before sending, so a copy of the task queued
+    twice skips it. A failure before sending hands the chunk back and
+    retries; a failure to record the result retries with the `outcome`,
+    without sending again. Once retries run out, recipients not sent are
+    recorded as failed.
+    
     Args:
         campaign_id: ID of the EmailCampaign instance
+        recipients: Email addresses in this chunk, or None to read them from the chunk
+        sender: Domain the campaign sends from (fairness key)
+        chunk_id: ID of the EmailChunk (None for chunks queued before chunks were recorded)
+        outcome: Result of sending the chunk, on a retry that only records it
     
     Returns:
-        dict: Result of the email sending operation
+        dict: Result of the chunk
     """
+    email_service = None
+    claimed = False
     try:
         email_service = EmailService()
-        result = email_service.send_template_email(campaign_id)
-        return result
+        if outcome is None:
+            if chunk_id is not None:
+                claimed = email_service.claim_chunk(chunk_id)
+                if not claimed:
+                    fairness.release(FAIRNESS_LANE, sender)
+                    return {'campaign_id': campaign_id, 'chunk_id': chunk_id, 'skipped': True}
+            if recipients is None:
+                recipients = email_service.chunk_recipients(chunk_id)
+            outcome = email_service.send_email_chunk(campaign_id, recipients, chunk_id)
+            if outcome is None:
+                fairness.release(FAIRNESS_LANE, sender)
+                return {'campaign_id': campaign_id, 'chunk_id': chunk_id, 'cancelled': True}
+        result = email_service.record_chunk(campaign_id, outcome, chunk_id)
     except Exception as exc:
-        # Retry the task in case of failure
-        raise self.retry(exc=exc, countdown=60)  # Retry after 60 seconds
+        if self.request.retries < self.max_retries:
+            if claimed and outcome is None:
+                try:
+                    email_service.unclaim_chunk(chunk_id)
+                except Exception as e:
+                    # The chunk stays claimed until the scheduler reclaims it
+                    logger.warning("Could not hand back email chunk %s: %s", chunk_id, e)
+            raise self.retry(exc=exc, countdown=60, kwargs={'chunk_id': chunk_id, 'outcome': outcome})
+        try:
+            if outcome is not None:
+                email_service.record_chunk(campaign_id, outcome, chunk_id)
+            elif claimed or (chunk_id is None and email_service is not None):
+                email_service.fail_chunk(campaign_id, recipients, exc, chunk_id)
+        finally:
+            fairness.release(FAIRNESS_LANE, sender)
+        raise
+    fairness.release(FAIRNESS_LANE, sender)
+    return result
 
 
+@shared_task(bind=True, max_retries=5)
+def verify_audience_task(self, audience_id):
+    """
+    Celery task to verify a saved audience with Kickbox
+    
+    Args:
+        audience_id: ID of the EmailAudience instance
+    
+    Returns:
+        dict: Deliverability counts
+    """
+    result = EmailService().verify_audience(audience_id)
+    if not result['success']:
+        raise self.retry(exc=Exception(result['error']), countdown=60)
+    return result
+
 
+@shared_task(ignore_result=True)
+def dispatch_due_email_campaigns_task():
+    """
+    Periodic task (Celery beat) that releases the next batch of recipients
+    of scheduled and throttled email campaigns
+    
+    Returns:
+        dict: Summary of the dispatch run
+    """
+    from .scheduler import dispatch_due_campaigns
+    
+    return dispatch_due_campaigns()
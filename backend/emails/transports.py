@@ -0,0 +1,375 @@
+"""
+Email transports: the SendGrid API keys (or subuser keys) and an optional
+SMTP relay that campaigns are sent through.
+
+Each transport has its own adaptive limiter, so throughput grows with the
+number of keys. Every message goes to a transport picked at random by
+weight among the healthy ones; if that transport cannot be reached, is
+throttled past its retries (429/5xx) or rejects its credentials, the
+message is retried on the next one. Errors after the message may have
+reached the provider (e.g. a read timeout) are not failed over, since the
+recipient could get it twice. Transports with weight 0 are standbys used
+only for failover.
+
+A transport is marked down in Redis for EMAIL_TRANSPORT_COOLDOWN seconds
+after EMAIL_TRANSPORT_FAILURE_THRESHOLD failures within that window, or
+at once on a 401/403, and skipped by every process until the mark
+expires. If Redis is unavailable all transports count as healthy.
+"""
+import logging
+import random
+import smtplib
+import threading
+from urllib.error import URLError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from core.ratelimit import LimiterTimeout, get_limiter, is_throttled
+
+logger = logging.getLogger(__name__)
+
+
+class TransportUnavailable(Exception):
+    """
+    Raised by a transport that could not hand the message over (no
+    connection), so another transport can safely send it
+    """
+
+
+class TransportResponse:
+    """
+    Response of a non-HTTP transport, shaped like an HTTP response for the
+    limiter and the campaign accounting
+    """
+
+    def __init__(self, status_code, body=''):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {}
+
+
+class SendGridTransport:
+    backend = 'sendgrid'
+
+    def __init__(self, name, api_key, weight=1, host=None):
+        self.name = name
+        self.api_key = api_key
+        self.weight = weight
+        self.host = host or settings.SENDGRID_API_HOST
+        self.limiter = get_limiter(name, profile='sendgrid')
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        SendGrid client, created (and the SDK imported) on first use
+        """
+        if self._client is None:
+            from sendgrid import SendGridAPIClient
+            self._client = SendGridAPIClient(self.api_key, host=self.host)
+        return self._client
+
+    def _send(self, message):
+        """
+        Send a message, returning SendGrid's HTTPError instead of raising it
+        so the limiter can see the status code and Retry-After header.
+        urllib raises URLError only while connecting and sending the
+        request, before SendGrid can have accepted it.
+        """
+        from python_http_client.exceptions import HTTPError
+        try:
+            return self.client.send(message)
+        except HTTPError as e:
+            return e
+        except URLError as e:
+            raise TransportUnavailable(str(e.reason)) from e
+
+    def send(self, from_email, from_name, to_email, template_id):
+        from sendgrid.helpers.mail import Mail, From
+
+        message = Mail(from_email=From(from_email, from_name), to_emails=to_email)
+        message.template_id = template_id
+        return self.limiter.call(lambda: self._send(message), max_attempts=settings.PROVIDER_MAX_ATTEMPTS, idempotent=False)
+
+
+def get_template_content(template_id):
+    """
+    Subject and HTML of the active version of a SendGrid dynamic template,
+    for transports that cannot render templates themselves.
+
+    Cached for EMAIL_TEMPLATE_CACHE_TTL seconds, so an SMTP failover keeps
+    working for templates used recently while the SendGrid API is down.
+
+    Returns:
+        tuple: (subject, html)
+    """
+    import requests
+
+    key = f"email_template:{template_id}"
+    content = cache.get(key)
+    if content is not None:
+        return content
+    resp = requests.get(
+        f"{settings.SENDGRID_API_HOST}/v3/templates/{template_id}",
+        headers={'Authorization': f'Bearer {settings.SENDGRID_API_KEY}'},
+        timeout=10
+    )
+    resp.raise_for_status()
+    versions = resp.json().get('versions') or []
+    version = next((v for v in versions if v.get('active')), None)
+    if version is None:
+        raise ValueError(f"Template {template_id} has no active version")
+    content = (version.get('subject') or '', version.get('html_content') or '')
+    cache.set(key, content, settings.EMAIL_TEMPLATE_CACHE_TTL)
+    return content
+
+
+class SmtpTransport:
+    """
+    SMTP relay. SendGrid templates are rendered from their stored HTML
+    (campaigns carry no dynamic template data).
+    """
+    backend = 'smtp'
+
+    def __init__(self, name, host, port=587, username='', password='', use_tls=True, weight=0):
+        from django.core.mail import get_connection
+
+        self.name = name
+        self.weight = weight
+        self.limiter = get_limiter(name, profile='smtp')
+        self.connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host=host, port=port, username=username, password=password, use_tls=use_tls,
+            timeout=30, fail_silently=False,
+        )
+        # One connection per process, shared by the sending threads
+        self._lock = threading.Lock()
+
+    def _send(self, message):
+        """
+        Send over the shared connection (reopened after a drop), mapping
+        SMTP replies to HTTP-like status codes: 4xx replies to 503 so the
+        limiter backs off, authentication failures to 401 and other
+        rejections to 400
+        """
+        try:
+            with self._lock:
+                if self.connection.connection is None:
+                    self._open()
+                self.connection.send_messages([message])
+        except smtplib.SMTPRecipientsRefused as e:
+            code, reply = next(iter(e.recipients.values()))
+            return TransportResponse(503 if 400 <= code < 500 else 400, reply)
+        except smtplib.SMTPAuthenticationError as e:
+            return TransportResponse(401, e.smtp_error)
+        except smtplib.SMTPResponseException as e:
+            self.connection.close()
+            return TransportResponse(503 if 400 <= e.smtp_code < 500 else 400, e.smtp_error)
+        except (smtplib.SMTPException, OSError):
+            self.connection.close()
+            raise
+        return TransportResponse(250)
+
+    def _open(self):
+        try:
+            self.connection.open()
+        except smtplib.SMTPAuthenticationError:
+            raise
+        except (smtplib.SMTPException, OSError) as e:
+            self.connection.close()
+            raise TransportUnavailable(str(e)) from e
+
+    def send(self, from_email, from_name, to_email, template_id):
+        from django.core.mail import EmailMultiAlternatives
+
+        try:
+            subject, html = get_template_content(template_id)
+        except Exception as e:
+            raise TransportUnavailable(f"Template {template_id} unavailable: {e}") from e
+        message = EmailMultiAlternatives(
+            subject, strip_tags(html), f'{from_name} <{from_email}>', [to_email]
+        )
+        message.attach_alternative(html, 'text/html')
+        return self.limiter.call(lambda: self._send(message), max_attempts=settings.PROVIDER_MAX_ATTEMPTS, idempotent=False)
+
+
+def is_success(status_code):
+    return status_code in (200, 201, 202, 250)
+
+
+class TransportRegistry:
+    """
+    Weighted routing over the configured transports, with health shared
+    between processes through Redis
+    """
+
+    def __init__(self, transports):
+        self.transports = transports
+
+    def _redis(self):
+        from core.redis import get_redis
+        return get_redis()
+
+    def _down_key(self, transport):
+        return f"email_transport:{transport.name}:down"
+
+    def _failures_key(self, transport):
+        return f"email_transport:{transport.name}:failures"
+
+    def down(self):
+        """
+        Names of the transports currently marked down
+        """
+        try:
+            marks = self._redis().mget([self._down_key(t) for t in self.transports])
+        except Exception as e:
+            logger.warning("Email transport health unavailable: %s", e)
+            return set()
+        return {t.name for t, mark in zip(self.transports, marks) if mark}
+
+    def mark_down(self, transport, reason):
+        logger.error(
+            "Email transport %s marked down for %ss: %s",
+            transport.name, settings.EMAIL_TRANSPORT_COOLDOWN, reason
+        )
+        try:
+            self._redis().set(self._down_key(transport), reason[:200], ex=settings.EMAIL_TRANSPORT_COOLDOWN)
+        except Exception as e:
+            logger.warning("Email transport health unavailable: %s", e)
+
+    def record_failure(self, transport, reason):
+        try:
+            client = self._redis()
+            failures = client.incr(self._failures_key(transport))
+            if failures == 1:
+                # Count failures within a window starting at the first one
+                client.expire(self._failures_key(transport), settings.EMAIL_TRANSPORT_COOLDOWN)
+            if failures >= settings.EMAIL_TRANSPORT_FAILURE_THRESHOLD:
+                client.delete(self._failures_key(transport))
+        except Exception as e:
+            logger.warning("Email transport health unavailable: %s", e)
+            return
+        if failures >= settings.EMAIL_TRANSPORT_FAILURE_THRESHOLD:
+            self.mark_down(transport, f"{failures} failures, last: {reason}")
+
+    def route(self):
+        """
+        Transports in the order to try them: healthy weighted transports in
+        a random order biased by weight, then standbys (weight 0), then any
+        marked down as a last resort
+        """
+        down = self.down()
+        healthy = [t for t in self.transports if t.name not in down]
+        # Weighted random permutation: sort by u ** (1 / weight)
+        weighted = sorted(
+            (t for t in healthy if t.weight > 0),
+            key=lambda t: random.random() ** (1 / t.weight),
+            reverse=True
+        )
+        standby = [t for t in healthy if t.weight <= 0]
+        return weighted + standby + [t for t in self.transports if t.name in down]
+
+    def send(self, from_email, from_name, to_email, template_id):
+        """
+        Send one message, failing over to the next transport when a
+        transport cannot be reached, stays throttled (429/5xx) or rejects
+        its credentials. Other 4xx responses are about the message itself
+        and are returned without failover. Any other error (e.g. a read
+        timeout) may come after the provider accepted the message: it is
+        counted against the transport and raised, not sent again.
+
+        Returns:
+            tuple: (transport name, response)
+
+        Raises:
+            The error of a transport that may have accepted the message, or
+            the last transport's error if none could be reached
+        """
+        last_response = None
+        last_name = None
+        last_error = None
+        for transport in self.route():
+            try:
+                response = transport.send(from_email, from_name, to_email, template_id)
+            except (TransportUnavailable, LimiterTimeout) as e:
+                last_error = e
+                self.record_failure(transport, str(e))
+                logger.warning("Email transport %s unavailable, failing over: %s", transport.name, e)
+                continue
+            except Exception as e:
+                self.record_failure(transport, str(e))
+                raise
+            if response.status_code in (401, 403):
+                self.mark_down(transport, f"HTTP {response.status_code}")
+            elif is_throttled(response.status_code):
+                self.record_failure(transport, f"HTTP {response.status_code}")
+                logger.warning(
+                    "Email transport %s returned %s, failing over", transport.name, response.status_code
+                )
+            else:
+                return transport.name, response
+            last_name, last_response, last_error = transport.name, response, None
+        if last_error is not None:
+            raise last_error
+        return last_name, last_response
+
+    def health(self):
+        """
+        Per-transport routing state for the transports endpoint
+        """
+        down = self.down()
+        return [
+            {
+                'name': t.name,
+                'backend': t.backend,
+                'weight': t.weight,
+                'healthy': t.name not in down,
+            }
+            for t in self.transports
+        ]
+
+
+def build_transports():
+    """
+    Transports configured in settings: SENDGRID_API_KEY as "sendgrid",
+    SENDGRID_EXTRA_API_KEYS as "sendgrid_2", "sendgrid_3", ... and the SMTP
+    relay as "smtp" when EMAIL_SMTP_HOST is set
+    """
+    transports = []
+    if settings.SENDGRID_API_KEY:
+        transports.append(SendGridTransport('sendgrid', settings.SENDGRID_API_KEY, settings.SENDGRID_WEIGHT))
+    for i, entry in enumerate(settings.SENDGRID_EXTRA_API_KEYS, start=2):
+        # "key" or "key:weight"
+        key, _, weight = entry.partition(':')
+        transports.append(SendGridTransport(f'sendgrid_{i}', key, int(weight or 1)))
+    if settings.EMAIL_SMTP_HOST:
+        transports.append(SmtpTransport(
+            'smtp', settings.EMAIL_SMTP_HOST, settings.EMAIL_SMTP_PORT, settings.EMAIL_SMTP_USER,
+            settings.EMAIL_SMTP_PASSWORD, settings.EMAIL_SMTP_USE_TLS, settings.EMAIL_SMTP_WEIGHT
+        ))
+    return transports
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Return the process-wide transport registry
+    """
+    global _registry
+    if _registry is None:
+        _registry = TransportRegistry(build_transports())
+    return _registry
+
+
+@receiver(setting_changed)
+def _reset_registry(setting, **kwargs):
+    # Rebuild after override_settings (e.g. the benchmark's stub settings)
+    global _registry
+    if setting.startswith(('SENDGRID_', 'EMAIL_SMTP_')):
+        _registry = None
@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EmailCampaignViewSet
+from . import async_views
+from .views import EmailAudienceViewSet, EmailCampaignViewSet
 
 router = DefaultRouter()
 router.register(r'campaigns', EmailCampaignViewSet, basename='campaign')
+router.register(r'audiences', EmailAudienceViewSet, basename='audience')
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Async (ASGI) variant of the Kickbox-bound preview action
+    path('async/preview/', async_views.preview, name='email-async-preview'),
+    # Live campaign progress (Server-Sent Events)
+    path('async/events/', async_views.events, name='email-async-events'),
 ]
 
 
@@ -1,9 +1,27 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from .models import EmailCampaign
-from .serializers import EmailCampaignSerializer, SendEmailSerializer, PreviewEmailSerializer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from core.cache import cached_response
+import json
+import logging
+from .audiences import save_audience
+from .models import EmailAudience, EmailCampaign
+from .scheduler import schedule_chunks
+from .serializers import (
+    CreateEmailAudienceSerializer, EmailAudienceSerializer, EmailCampaignDetailSerializer, EmailCampaignSerializer,
+    SendEmailSerializer, PreviewEmailSerializer, PreviewBatchEmailSerializer,
+)
 from .services import EmailService
+from .tasks import send_email_campaign_task
+from .transports import get_registry
+
+logger = logging.getLogger(__name__)
 
 
 class EmailCampaignViewSet(viewsets.ModelViewSet):
@@ -14,11 +32,22 @@ class EmailCampaignViewSet(viewsets.ModelViewSet):
     queryset = EmailCampaign.objects.all()
     serializer_class = EmailCampaignSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'logs'):
+            # Counts only; the verification lists are served by retrieve
+            queryset = queryset.defer('deliverable_blob', 'undeliverable_blob')
+        return queryset
+    
     def get_serializer_class(self):
         if self.action == 'send_email':
             return SendEmailSerializer
         if self.action == 'preview':
             return PreviewEmailSerializer
+        if self.action == 'preview_batch':
+            return PreviewBatchEmailSerializer
+        if self.action == 'retrieve':
+            return EmailCampaignDetailSerializer
         return EmailCampaignSerializer
     
     @action(detail=False, methods=['post'])
@@ -31,44 +60,69 @@ class EmailCampaignViewSet(viewsets.ModelViewSet):
             "domain_name": "example.com",
             "template_name": "Welcome Email",
             "template_id": "d-xxxxx",
-            "recipients": "email1@example.com, email2@example.com"
+            "recipients": "email1@example.com, email2@example.com",  (or "audience_id": 3)
+            "scheduled_time": "2025-01-20T10:30:00Z",   (optional)
+            "send_rate": 600,                           (optional, messages per minute)
+            "send_window_start": "09:00",               (optional, with send_window_end)
+            "send_window_end": "18:00"
         }
+        
+        The campaign is sent by the Celery workers; the response (202) only
+        carries its id. With any of the optional fields it is scheduled and
+        released to the workers by the email scheduler instead of queued now.
         """
         serializer = SendEmailSerializer(data=request.data)
         
         if serializer.is_valid():
-            # Create campaign record
-            campaign = EmailCampaign.objects.create(
-                domain_name=serializer.validated_data['domain_name'],
-                template_name=serializer.validated_data['template_name'],
-                template_id=serializer.validated_data['template_id'],
-                recipients=serializer.validated_data['recipients'],
-                status='pending'
-            )
+            shape = {
+                field: serializer.validated_data.get(field)
+                for field in ('scheduled_time', 'send_rate', 'send_window_start', 'send_window_end')
+            }
+            scheduled = any(value is not None for value in shape.values())
+            
+            # Create campaign record; a scheduled one is split into chunks
+            # now, so the scheduler only releases them
+            with transaction.atomic():
+                campaign = EmailCampaign.objects.create(
+                    domain_name=serializer.validated_data['domain_name'],
+                    template_name=serializer.validated_data['template_name'],
+                    template_id=serializer.validated_data['template_id'],
+                    recipients=serializer.validated_data.get('recipients', ''),
+                    audience=serializer.validated_data.get('audience'),
+                    status='scheduled' if scheduled else 'pending',
+                    next_release_at=(shape['scheduled_time'] or timezone.now()) if scheduled else None,
+                    **shape
+                )
+                if scheduled:
+                    schedule_chunks(campaign)
+            
+            if scheduled:
+                return Response({
+                    'success': True,
+                    'message': f'Email campaign scheduled for {campaign.next_release_at}',
+                    'data': {
+                        'campaign_id': campaign.id,
+                        'status': 'scheduled',
+                        'scheduled_time': campaign.next_release_at,
+                        'send_rate': campaign.send_rate,
+                        'total': campaign.total_emails
+                    }
+                }, status=status.HTTP_200_OK)
             
             try:
-                # Send emails synchronously (for now)
-                # In future, you can use: send_email_campaign_task.delay(campaign.id)
-                email_service = EmailService()
-                result = email_service.send_template_email(campaign.id)
+                # Sent by the Celery workers in chunks on the bulk lane; the
+                # client follows progress on the events stream or in the logs
+                transaction.on_commit(lambda: send_email_campaign_task.delay(campaign.id))
                 
-                if result['success']:
-                    return Response({
-                        'success': True,
-                        'message': 'Email campaign sent successfully',
-                        'data': {
-                            'campaign_id': result['campaign_id'],
-                            'total': result['total'],
-                            'successful': result['successful'],
-                            'failed': result['failed'],
-                            'status': result['status']
-                        }
-                    }, status=status.HTTP_200_OK)
-                else:
-                    return Response({
-                        'success': False,
-                        'error': result.get('error', 'Failed to send emails')
-                    }, status=status.HTTP_400_BAD_REQUEST)
+                return Response({
+                    'success': True,
+                    'message': 'Email campaign queued for sending',
+                    'data': {
+                        'campaign_id': campaign.id,
+                        'status': campaign.status,
+                        'total': len(campaign.get_recipients_list())
+                    }
+                }, status=status.HTTP_202_ACCEPTED)
             
             except Exception as e:
                 campaign.status = 'failed'
@@ -118,7 +172,72 @@ class EmailCampaignViewSet(viewsets.ModelViewSet):
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def preview_batch(self, request):
+        """
+        Preview many recipients at once.
+
+        POST /api/emails/campaigns/preview_batch/
+        Body: {
+            "domain_name": "example.com",
+            "template_name": "Welcome Email",
+            "template_id": "d-xxxxx",
+            "recipients": ["user1@example.com", "user2@example.com"]
+        }
+
+        Streams newline-delimited JSON: one line per recipient as soon as
+        its verification finishes (cached results first), then a summary
+        line with "done": true.
+        """
+        serializer = PreviewBatchEmailSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        from_email = f"noreply@{data['domain_name']}"
+        template = {'id': data['template_id'], 'name': data['template_name']}
+        email_service = EmailService()
+
+        def stream():
+            counts = {'deliverable': 0, 'undeliverable': 0, 'unknown': 0}
+            for recipient, result in email_service.iter_verify_emails(data['recipients']):
+                counts[result['deliverability']] += 1
+                yield json.dumps({
+                    'recipient': recipient,
+                    'deliverability': result['deliverability'],
+                    'cached': result['cached'],
+                    'error': result['error'],
+                    'from_email': from_email
+                }) + '\n'
+            yield json.dumps({
+                'done': True,
+                'success': True,
+                'total': len(data['recipients']),
+                'counts': counts,
+                'template': template,
+                'from_email': from_email
+            }) + '\n'
+
+        response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+        # Ask proxies (nginx) not to buffer, so lines reach the client as they are produced
+        response['X-Accel-Buffering'] = 'no'
+        response['Cache-Control'] = 'no-cache'
+        return response
+
     @action(detail=False, methods=['get'])
+    def transports(self, request):
+        """
+        Configured email transports with their weight and health
+
+        GET /api/emails/campaigns/transports/
+        """
+        return Response({
+            'success': True,
+            'data': get_registry().health()
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response(EmailCampaign)
     def logs(self, request):
         """
         Get all campaign logs
@@ -134,4 +253,75 @@ class EmailCampaignViewSet(viewsets.ModelViewSet):
         })
 
 
+class EmailAudienceViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet for saved audiences
+    Lists, uploads, verifies and deletes audiences; address lists are never
+    returned, only their counts
+    """
+    queryset = EmailAudience.objects.defer('emails_blob', 'undeliverable_blob', 'unknown_blob')
+    serializer_class = EmailAudienceSerializer
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def create(self, request):
+        """
+        Upload an audience
+        
+        POST /api/emails/audiences/
+        Body: {"name": "Newsletter", "recipients": "a@example.com, b@example.com"}
+        or multipart/form-data with "name" and a "file" of addresses
+        
+        Uploading a list that already exists returns the existing audience.
+        New audiences are verified with Kickbox in the background.
+        """
+        serializer = CreateEmailAudienceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        audience, created = save_audience(serializer.validated_data['name'], serializer.validated_data['emails'])
+        if created and settings.KICKBOX_API_KEY:
+            self._queue_verification(audience)
+        return Response({
+            'success': True,
+            'created': created,
+            'data': EmailAudienceSerializer(audience).data
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def destroy(self, request, pk=None):
+        try:
+            return super().destroy(request, pk=pk)
+        except ProtectedError:
+            return Response({
+                'success': False,
+                'error': 'Audience is used by campaigns and cannot be deleted'
+            }, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=True, methods=['post'])
+    def verify(self, request, pk=None):
+        """
+        Re-verify an audience with Kickbox in the background
+        
+        POST /api/emails/audiences/{id}/verify/
+        """
+        audience = self.get_object()
+        if not self._queue_verification(audience):
+            return Response({
+                'success': False,
+                'error': 'Could not queue the verification'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({
+            'success': True,
+            'message': 'Verification queued',
+            'audience_id': audience.id
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _queue_verification(self, audience):
+        from .tasks import verify_audience_task
 
+        try:
+            verify_audience_task.delay(audience.id)
+        except Exception as e:
+            logger.warning("Could not queue verification of audience %s: %s", audience.id, e)
+            return False
+        return True
@@ -0,0 +1,7 @@
+# Gunicorn settings picked up automatically from the backend directory
+
+
+def child_exit(server, worker):
+    # Let Prometheus multiprocess mode forget the exited worker's live gauges
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
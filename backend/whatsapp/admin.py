@@ -1,26 +1,121 @@
-from django.contrib import admin
-from .models import WhatsAppCampaign
+from django.contrib import admin, messages
+from django.db.models import F
+from django.utils import timezone
+from core.admin import LargeTableAdmin
+from core.events import publish
+from .models import WhatsAppCampaign, WhatsAppBroadcast, WhatsAppSequence, WhatsAppSequenceStep, WhatsAppStatusEvent
+from .phone import normalize_phone
+from .tasks import revoke_send_tasks
+import re
+
+# Search terms looking like a phone number are matched on phone_e164
+_PHONE_SEARCH = re.compile(r'\+?[\d\s().-]{7,}')
 
 
 @admin.register(WhatsAppCampaign)
-class WhatsAppCampaignAdmin(admin.ModelAdmin):
-    list_display = ['id', 'template_name', 'mobile_number', 'status', 'scheduled_time', 'sent_at', 'created_at']
+class WhatsAppCampaignAdmin(LargeTableAdmin):
+    list_display = ['id', 'template_name', 'mobile_number', 'status', 'delivery_status', 'scheduled_time', 'sent_at', 'created_at']
+    # Filters, search and sorting only use indexed columns (see Meta.indexes)
     list_filter = ['status', 'created_at']
-    search_fields = ['template_name', 'mobile_number']
+    search_fields = ['template_name']
+    sortable_by = ['id', 'created_at']
+    list_defer = ['parameters', 'error_message', 'received_message', 'cancellation_reason']
+    raw_id_fields = ['broadcast', 'sequence']
     readonly_fields = ['created_at', 'updated_at']
+    actions = ['cancel_campaigns', 'requeue_campaigns', 'resend_campaigns']
     
     fieldsets = (
         ('Campaign Details', {
-            'fields': ('template_name', 'template_id', 'mobile_number')
+            'fields': ('template_name', 'template_id', 'mobile_number', 'broadcast', 'sequence', 'stop_on_reply')
         }),
         ('Scheduling', {
             'fields': ('scheduled_time', 'sent_at')
         }),
         ('Status', {
-            'fields': ('status', 'error_message')
+            'fields': ('status', 'error_message', 'wati_message_id', 'delivery_status', 'delivery_status_at')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        if _PHONE_SEARCH.fullmatch(search_term.strip()):
+            return queryset.filter(phone_e164=normalize_phone(search_term.strip())), False
+        return super().get_search_results(request, queryset, search_term)
+
+    # The actions below are one UPDATE each over the selection (or every
+    # matching row with "select all"), limited to the campaigns they apply to
+
+    def _report(self, request, updated, done, skipped):
+        if updated:
+            # Open dashboards refetch the logs
+            publish('whatsapp', {'type': 'resync'})
+            self.message_user(request, f"{updated} campaign(s) {done}.", messages.SUCCESS)
+        else:
+            self.message_user(request, f"No campaigns {done}: {skipped}.", messages.WARNING)
+
+    @admin.action(description="Cancel selected campaigns (pending, scheduled or queued)")
+    def cancel_campaigns(self, request, queryset):
+        cancelled = queryset.transition_returning(
+            queryset.CANCELLABLE_STATUSES,
+            'cancelled',
+            returning=('task_id',),
+            cancellation_reason='Cancelled from the admin'
+        )
+        revoke_send_tasks([row['task_id'] for row in cancelled])
+        self._report(request, len(cancelled), 'cancelled', 'only unsent campaigns can be cancelled')
+
+    @admin.action(description="Requeue selected queued campaigns")
+    def requeue_campaigns(self, request, queryset):
+        # For messages whose send task was lost; the scheduler dispatches them
+        # again on its next tick (sending claims the row, so a late original
+        # task cannot send twice)
+        updated = queryset.transition(['queued'], 'scheduled', claimed_at=None, task_id=None)
+        self._report(request, updated, 'requeued', 'only queued campaigns can be requeued')
+
+    @admin.action(description="Resend selected failed or cancelled campaigns")
+    def resend_campaigns(self, request, queryset):
+        updated = queryset.transition(
+            ['failed', 'cancelled'],
+            'scheduled',
+            scheduled_time=timezone.now(),
+            error_message=None,
+            cancellation_reason=None,
+            delivery_status='',
+            delivery_status_at=None,
+            claimed_at=None,
+            task_id=None,
+            send_attempts=F('send_attempts') + 1
+        )
+        self._report(request, updated, 'queued for resending', 'only failed or cancelled campaigns can be resent')
+
+
+
+@admin.register(WhatsAppBroadcast)
+class WhatsAppBroadcastAdmin(admin.ModelAdmin):
+    list_display = ['id', 'template_name', 'total_recipients', 'scheduled_time', 'created_at']
+    search_fields = ['template_name']
+    readonly_fields = ['id', 'created_at']
+
+
+class WhatsAppSequenceStepInline(admin.TabularInline):
+    model = WhatsAppSequenceStep
+    extra = 1
+
+
+@admin.register(WhatsAppSequence)
+class WhatsAppSequenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'trigger_template_name', 'stop_on_reply', 'is_active', 'updated_at']
+    list_filter = ['is_active', 'stop_on_reply']
+    search_fields = ['name', 'trigger_template_name']
+    inlines = [WhatsAppSequenceStepInline]
+
+
+@admin.register(WhatsAppStatusEvent)
+class WhatsAppStatusEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'phone_e164', 'wati_message_id', 'campaign', 'occurred_at']
+    list_filter = ['status']
+    search_fields = ['=phone_e164', '=wati_message_id']
+    raw_id_fields = ['campaign']
+    readonly_fields = ['campaign', 'wati_message_id', 'phone_e164', 'status', 'event_type', 'occurred_at', 'payload', 'created_at']
@@ -0,0 +1,169 @@
+"""
+Async variants of the WATI-bound WhatsApp endpoints.
+
+DRF 3.14 views are sync only, so these are plain Django async views with
+the same request and response bodies as the matching viewset actions.
+Under an ASGI server (uvicorn workers) a request waiting on WATI holds no
+thread, so one process can serve hundreds of them at once.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+
+from core.events import sse_response
+from .models import WhatsAppCampaign
+from .sequences import get_followup_step
+from .services import WatiService, SENDABLE_STATUSES
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except (TypeError, ValueError):
+        return {}
+
+
+@require_GET
+async def templates(request):
+    """
+    Get all approved WhatsApp templates from WATI
+
+    GET /api/whatsapp/async/templates/
+    """
+    try:
+        result = await WatiService().aget_templates()
+        if result['success']:
+            return JsonResponse({
+                'success': True,
+                'count': len(result['templates']),
+                'data': result['templates']
+            }, status=status.HTTP_200_OK)
+        return JsonResponse({
+            'success': False,
+            'error': result.get('error', 'Failed to fetch templates')
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def contacts(request):
+    """
+    Get all contacts from WATI
+
+    GET /api/whatsapp/async/contacts/
+    """
+    try:
+        result = await WatiService().aget_contacts()
+        if result['success']:
+            return JsonResponse({
+                'success': True,
+                'count': len(result['contacts']),
+                'data': result['contacts']
+            }, status=status.HTTP_200_OK)
+        return JsonResponse({
+            'success': False,
+            'error': result.get('error', 'Failed to fetch contacts')
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def send_now(request, pk):
+    """
+    Force-send a scheduled campaign immediately.
+    POST /api/whatsapp/async/campaigns/{id}/send_now/
+    """
+    try:
+        campaign = await WhatsAppCampaign.objects.aget(id=pk)
+        # Failed campaigns may be resent by hand; sent, cancelled and
+        # in-flight ones are refused by the compare-and-set claim
+        result = await WatiService().asend_template_message(
+            campaign.id,
+            from_statuses=SENDABLE_STATUSES + ('failed',)
+        )
+        if result.get('success'):
+            return JsonResponse({
+                'success': True,
+                'message': 'WhatsApp message sent successfully',
+                'data': result
+            })
+        return JsonResponse({
+            'success': False,
+            'error': result.get('error', 'Failed to send message')
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except WhatsAppCampaign.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Campaign not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def send_followup(request, pk):
+    """
+    Send a follow-up (second/third) immediately for a given base campaign id.
+    The template is the matching step of the sequence the base template triggers.
+    POST /api/whatsapp/async/campaigns/{id}/send_followup/
+    Body: { "which": "second" | "third" }
+    """
+    which = _json_body(request).get('which')
+    if which not in ['second', 'third']:
+        return JsonResponse({'success': False, 'error': 'which must be "second" or "third"'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        base = await WhatsAppCampaign.objects.aget(id=pk)
+        step = await sync_to_async(get_followup_step)(base.template_name, which)
+        if step is None:
+            return JsonResponse({'success': False, 'error': f'No {which} follow-up in the sequence triggered by {base.template_name}'}, status=status.HTTP_400_BAD_REQUEST)
+        wati_service = WatiService()
+        template_name = step.template_name
+        template_id = await wati_service.aget_template_id_by_name(template_name)
+        if not template_id:
+            return JsonResponse({'success': False, 'error': f'Template id not found for {template_name}'}, status=status.HTTP_400_BAD_REQUEST)
+        # Create new campaign and send now
+        c = await sync_to_async(WhatsAppCampaign.objects.create)(
+            template_name=template_name,
+            template_id=template_id,
+            mobile_number=base.mobile_number,
+            scheduled_time=timezone.now(),
+            status='pending'
+        )
+        result = await wati_service.asend_template_message(c.id)
+        if result.get('success'):
+            return JsonResponse({'success': True, 'data': result})
+        return JsonResponse({'success': False, 'error': result.get('error', 'Failed to send')}, status=status.HTTP_400_BAD_REQUEST)
+    except WhatsAppCampaign.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Campaign not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def events(request):
+    """
+    Server-Sent Events stream of WhatsApp campaign changes: 'status'
+    events (campaign_ids, status) and 'delivery' events (campaign_ids,
+    delivery_status)
+
+    GET /api/whatsapp/async/events/
+    """
+    return sse_response(['whatsapp'])
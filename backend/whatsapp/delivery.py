@@ -0,0 +1,175 @@
+"""
+Ingestion of WATI delivery status webhooks.
+
+Status events (sent, delivered, read, failed) arrive for every message we
+send, several times our send volume. A batch of events is stored with one
+bulk insert into WhatsAppStatusEvent, and the latest status of each
+campaign is denormalized onto WhatsAppCampaign with one conditional UPDATE
+per status, which never moves a campaign backwards (e.g. read -> delivered
+when webhooks arrive out of order).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import WhatsAppCampaign, WhatsAppStatusEvent, publish_delivery
+from .phone import normalize_phone
+
+# WATI eventType (without the _v2 suffix) -> delivery status
+STATUS_EVENT_TYPES = {
+    'templateMessageSent': 'sent',
+    'sentMessageSENT': 'sent',
+    'sentMessageDELIVERED': 'delivered',
+    'sentMessageREAD': 'read',
+    'templateMessageFailed': 'failed',
+    'sentMessageFAILED': 'failed',
+}
+
+# A campaign may move to a status only from the statuses listed here
+ALLOWED_PREVIOUS = {
+    'sent': [''],
+    'delivered': ['', 'sent'],
+    'read': ['', 'sent', 'delivered'],
+    'failed': ['', 'sent'],
+}
+STATUS_RANK = {'sent': 1, 'failed': 2, 'delivered': 2, 'read': 3}
+
+
+def event_status(event):
+    """
+    Return the delivery status of a webhook event, or None if it is not a
+    status event
+    """
+    event_type = (event.get('eventType') or '').removesuffix('_v2')
+    return STATUS_EVENT_TYPES.get(event_type)
+
+
+def extract_message_id(data):
+    """
+    Return the WATI message id from a send response or a status webhook
+    """
+    model = data.get('model') if isinstance(data.get('model'), dict) else {}
+    ids = model.get('ids') or []
+    return (
+        data.get('whatsappMessageId')
+        or data.get('localMessageId')
+        or model.get('id')
+        or (ids[0] if ids else None)
+        or data.get('id')
+        or ''
+    )
+
+
+def _occurred_at(event):
+    timestamp = event.get('timestamp') or event.get('created')
+    if timestamp:
+        try:
+            return datetime.fromtimestamp(int(timestamp), tz=dt_timezone.utc)
+        except (TypeError, ValueError):
+            parsed = parse_datetime(str(timestamp))
+            if parsed:
+                return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+    return timezone.now()
+
+
+def record_status_events(events):
+    """
+    Store a batch of status webhook events and update the campaigns' latest
+    delivery status.
+
+    Events are matched to campaigns by WATI message id; events without a
+    known id fall back to the most recently sent campaign for the same
+    number and template, among those sent within
+    WHATSAPP_STATUS_MATCH_WINDOW seconds.
+
+    Returns:
+        int: Number of events recorded
+    """
+    parsed = []
+    for event in events:
+        status = event_status(event)
+        if status is None:
+            continue
+        parsed.append({
+            'status': status,
+            'event_type': event.get('eventType'),
+            'message_id': extract_message_id(event),
+            'phone': normalize_phone(event.get('waId') or '', international=True),
+            'template_name': event.get('templateName') or '',
+            'occurred_at': _occurred_at(event),
+            'payload': event,
+        })
+    if not parsed:
+        return 0
+
+    # One query to map message ids to campaigns
+    message_ids = {p['message_id'] for p in parsed if p['message_id']}
+    campaign_by_message = dict(
+        WhatsAppCampaign.objects.filter(wati_message_id__in=message_ids).values_list('wati_message_id', 'id')
+    ) if message_ids else {}
+
+    # One query for the fallback: latest sent campaign per (number, template)
+    unmatched_phones = {
+        p['phone'] for p in parsed
+        if p['phone'] and p['message_id'] not in campaign_by_message
+    }
+    campaign_by_phone = {}
+    if unmatched_phones:
+        rows = (
+            WhatsAppCampaign.objects
+            .filter(
+                phone_e164__in=unmatched_phones,
+                status='success',
+                sent_at__gte=timezone.now() - timedelta(seconds=settings.WHATSAPP_STATUS_MATCH_WINDOW)
+            )
+            .order_by('sent_at')
+            .values_list('phone_e164', 'template_name', 'id')
+        )
+        for phone, template_name, campaign_id in rows:
+            campaign_by_phone[(phone, template_name)] = campaign_id
+            campaign_by_phone[(phone, '')] = campaign_id
+
+    events_to_create = []
+    latest = {}
+    for p in parsed:
+        campaign_id = (
+            campaign_by_message.get(p['message_id'])
+            or campaign_by_phone.get((p['phone'], p['template_name']))
+        )
+        events_to_create.append(WhatsAppStatusEvent(
+            campaign_id=campaign_id,
+            wati_message_id=p['message_id'],
+            phone_e164=p['phone'],
+            status=p['status'],
+            event_type=p['event_type'],
+            occurred_at=p['occurred_at'],
+            payload=p['payload'],
+        ))
+        if campaign_id:
+            current = latest.get(campaign_id)
+            if current is None or STATUS_RANK[p['status']] >= STATUS_RANK[current[0]]:
+                latest[campaign_id] = (p['status'], p['occurred_at'])
+
+    WhatsAppStatusEvent.objects.bulk_create(events_to_create, batch_size=1000)
+
+    # One conditional UPDATE per target status
+    by_status = {}
+    for campaign_id, (status, occurred_at) in latest.items():
+        by_status.setdefault(status, []).append((campaign_id, occurred_at))
+    for status, items in by_status.items():
+        WhatsAppCampaign.objects.filter(
+            id__in=[campaign_id for campaign_id, _ in items],
+            delivery_status__in=ALLOWED_PREVIOUS[status]
+        ).update(
+            delivery_status=status,
+            delivery_status_at=Case(
+                *[When(id=campaign_id, then=Value(occurred_at)) for campaign_id, occurred_at in items],
+                output_field=DateTimeField()
+            )
+        )
+        publish_delivery([campaign_id for campaign_id, _ in items], status)
+
+    return len(events_to_create)
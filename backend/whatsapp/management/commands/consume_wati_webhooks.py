@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.redis import get_redis, node_id
+from whatsapp.webhooks import consume_stream_batch, ensure_consumer_group
+
+
+class Command(BaseCommand):
+    help = 'Drain buffered WATI webhook events from the Redis stream in batches (WATI_WEBHOOK_MODE=stream)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default=None, help='Consumer name within the group (default: host:pid)')
+        parser.add_argument('--batch-size', type=int, default=settings.WATI_WEBHOOK_BATCH_SIZE)
+        parser.add_argument('--block-ms', type=int, default=5000, help='How long to wait for new events per read')
+        parser.add_argument('--once', action='store_true', help='Process a single batch and exit')
+
+    def handle(self, *args, **options):
+        consumer = options['consumer'] or node_id()
+        ensure_consumer_group(get_redis())
+        self.stdout.write(f"Consuming {settings.WATI_WEBHOOK_STREAM} as {consumer}")
+
+        while True:
+            processed = consume_stream_batch(consumer, options['batch_size'], options['block_ms'])
+            if processed:
+                self.stdout.write(f"Processed {processed} webhook event(s)")
+            if options['once']:
+                break
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:42
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0003_add_cancellation_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppBroadcast',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('template_name', models.CharField(max_length=255)),
+                ('template_id', models.CharField(max_length=255)),
+                ('scheduled_time', models.DateTimeField(help_text='When to send the messages')),
+                ('total_recipients', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'WhatsApp Broadcast',
+                'verbose_name_plural': 'WhatsApp Broadcasts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='whatsappcampaign',
+            name='parameters',
+            field=models.JSONField(blank=True, default=list, help_text='Template parameters for dynamic content'),
+        ),
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='broadcast',
+            field=models.ForeignKey(blank=True, help_text='Bulk broadcast this campaign belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaigns', to='whatsapp.whatsappbroadcast'),
+        ),
+    ]
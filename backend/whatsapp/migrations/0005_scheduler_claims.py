@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0004_whatsappbroadcast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When the scheduler handed the message to a worker', null=True),
+        ),
+        migrations.AlterField(
+            model_name='whatsappcampaign',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('scheduled', 'Scheduled'), ('queued', 'Queued'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappcampaign',
+            index=models.Index(fields=['status', 'scheduled_time'], name='whatsapp_status_due_idx'),
+        ),
+    ]
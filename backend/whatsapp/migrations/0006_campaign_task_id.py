@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0005_scheduler_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='task_id',
+            field=models.CharField(blank=True, help_text='Celery task id of the queued send, used for revocation', max_length=255, null=True),
+        ),
+    ]
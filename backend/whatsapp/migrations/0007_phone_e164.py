@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0006_campaign_task_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='phone_e164',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Canonical E.164 form of mobile_number used for lookups', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappcampaign',
+            index=models.Index(fields=['phone_e164', 'status'], name='whatsapp_phone_status_idx'),
+        ),
+    ]
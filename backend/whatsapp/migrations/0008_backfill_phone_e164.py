@@ -0,0 +1,71 @@
+# Backfill WhatsAppCampaign.phone_e164 in chunks
+
+import re
+
+from django.conf import settings
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 2000
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_international(value):
+    # Frozen copy of whatsapp.phone.normalize_phone(value, international=True)
+    # as of this migration
+    if not value:
+        return ''
+    value = value.strip()
+    if value[:1] == '+' and value[1:].isdigit():
+        return value
+    digits = _NON_DIGITS.sub('', value)
+    if not digits:
+        return ''
+    if digits.startswith('00') and not value.startswith('+'):
+        return f"+{digits[2:]}"
+    return f"+{digits}"
+
+
+def normalize_phone(value):
+    # Numbers written before phone_e164 existed were stored as typed, often
+    # without the country code even behind a "+", and the webhook matched
+    # them with and without it. Keep matching them: national-length numbers
+    # get WHATSAPP_DEFAULT_COUNTRY_CODE whatever their prefix.
+    phone = normalize_international(value)
+    if len(phone) - 1 == settings.WHATSAPP_NATIONAL_NUMBER_LENGTH:
+        return f"+{settings.WHATSAPP_DEFAULT_COUNTRY_CODE}{phone[1:]}"
+    return phone
+
+
+def backfill_phone_e164(apps, schema_editor):
+    WhatsAppCampaign = apps.get_model('whatsapp', 'WhatsAppCampaign')
+    db_alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        # Each chunk commits on its own so a large table never holds one long transaction
+        with transaction.atomic(using=db_alias):
+            rows = list(
+                WhatsAppCampaign.objects.using(db_alias)
+                .filter(id__gt=last_id, phone_e164='')
+                .order_by('id')
+                .only('id', 'mobile_number')[:CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            for row in rows:
+                row.phone_e164 = normalize_phone(row.mobile_number)
+            WhatsAppCampaign.objects.using(db_alias).bulk_update(rows, ['phone_e164'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('whatsapp', '0007_phone_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
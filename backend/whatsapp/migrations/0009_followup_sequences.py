@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0008_backfill_phone_e164'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('trigger_template_name', models.CharField(help_text='Numbers are enrolled when a campaign with this template is sent or scheduled', max_length=255, unique=True)),
+                ('stop_on_reply', models.BooleanField(default=True, help_text='Cancel remaining steps when the user replies')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'WhatsApp Sequence',
+                'verbose_name_plural': 'WhatsApp Sequences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='stop_on_reply',
+            field=models.BooleanField(default=True, help_text='Cancel this campaign if the user replies before it is sent'),
+        ),
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='sequence',
+            field=models.ForeignKey(blank=True, help_text='Follow-up sequence this campaign is a step of', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='campaigns', to='whatsapp.whatsappsequence'),
+        ),
+        migrations.CreateModel(
+            name='WhatsAppSequenceStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('template_name', models.CharField(max_length=255)),
+                ('offset', models.DurationField(help_text="Delay after the trigger campaign's send time, e.g. '4 days'")),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='whatsapp.whatsappsequence')),
+            ],
+            options={
+                'verbose_name': 'WhatsApp Sequence Step',
+                'verbose_name_plural': 'WhatsApp Sequence Steps',
+                'ordering': ['sequence', 'position'],
+                'unique_together': {('sequence', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Seed the payment reminder follow-ups that used to be hardcoded in the view
+
+from datetime import timedelta
+
+from django.db import migrations
+
+
+def create_payment_reminder_sequence(apps, schema_editor):
+    WhatsAppSequence = apps.get_model('whatsapp', 'WhatsAppSequence')
+    WhatsAppSequenceStep = apps.get_model('whatsapp', 'WhatsAppSequenceStep')
+    sequence, created = WhatsAppSequence.objects.get_or_create(
+        name='payment_reminder',
+        defaults={'trigger_template_name': 'payment_reminder_first', 'stop_on_reply': True}
+    )
+    if created:
+        WhatsAppSequenceStep.objects.bulk_create([
+            WhatsAppSequenceStep(sequence=sequence, position=1, template_name='payment_reminder_second', offset=timedelta(days=4)),
+            WhatsAppSequenceStep(sequence=sequence, position=2, template_name='payment_reminder_third', offset=timedelta(days=10)),
+        ])
+
+
+def delete_payment_reminder_sequence(apps, schema_editor):
+    WhatsAppSequence = apps.get_model('whatsapp', 'WhatsAppSequence')
+    WhatsAppSequence.objects.filter(name='payment_reminder').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0009_followup_sequences'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_payment_reminder_sequence, delete_payment_reminder_sequence),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0010_seed_payment_reminder_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='delivery_status',
+            field=models.CharField(blank=True, choices=[('sent', 'Sent'), ('delivered', 'Delivered'), ('read', 'Read'), ('failed', 'Failed')], default='', help_text='Latest delivery status reported by WATI', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='delivery_status_at',
+            field=models.DateTimeField(blank=True, help_text='When the latest delivery status was reported', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='wati_message_id',
+            field=models.CharField(blank=True, db_index=True, help_text='Message id returned by WATI, used to match status webhooks', max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='WhatsAppStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wati_message_id', models.CharField(blank=True, default='', max_length=255)),
+                ('phone_e164', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('delivered', 'Delivered'), ('read', 'Read'), ('failed', 'Failed')], max_length=20)),
+                ('event_type', models.CharField(max_length=100)),
+                ('occurred_at', models.DateTimeField()),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('campaign', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_events', to='whatsapp.whatsappcampaign')),
+            ],
+            options={
+                'verbose_name': 'WhatsApp Status Event',
+                'verbose_name_plural': 'WhatsApp Status Events',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['campaign', 'occurred_at'], name='whatsapp_event_campaign_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+from core.operations import AddIndexOnline, AddTrigramIndex
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on PostgreSQL (see core.operations)
+    atomic = False
+
+    dependencies = [
+        ('whatsapp', '0011_delivery_status_events'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='whatsappcampaign',
+            index=models.Index(fields=['status', 'created_at'], name='whatsapp_status_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='whatsappcampaign',
+            index=models.Index(fields=['created_at'], name='whatsapp_created_idx'),
+        ),
+        AddTrigramIndex(
+            model_name='whatsappcampaign',
+            field_name='template_name',
+            name='whatsapp_template_trgm_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0012_whatsapp_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcampaign',
+            name='send_attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Times the message was sent again after failing or being cancelled; part of the WATI idempotency key'),
+        ),
+    ]
@@ -1,6 +1,213 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.cache import InvalidatingQuerySet, invalidate, invalidate_on_change
+from core.events import publish
+from .phone import normalize_phone
+import datetime
 import json
+import uuid
+
+
+DELIVERY_STATUS_CHOICES = [
+    ('sent', 'Sent'),
+    ('delivered', 'Delivered'),
+    ('read', 'Read'),
+    ('failed', 'Failed'),
+]
+
+
+class WhatsAppBroadcast(models.Model):
+    """
+    Model to group WhatsApp campaigns created by a single bulk request
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    template_name = models.CharField(max_length=255)
+    template_id = models.CharField(max_length=255)
+    scheduled_time = models.DateTimeField(help_text="When to send the messages")
+    total_recipients = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'WhatsApp Broadcast'
+        verbose_name_plural = 'WhatsApp Broadcasts'
+
+    def __str__(self):
+        return f"{self.template_name} - {self.total_recipients} recipients - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class WhatsAppSequence(models.Model):
+    """
+    Model to store a follow-up sequence: ordered template steps that are
+    scheduled when a campaign with the trigger template is sent
+    """
+    name = models.CharField(max_length=255, unique=True)
+    trigger_template_name = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Numbers are enrolled when a campaign with this template is sent or scheduled"
+    )
+    stop_on_reply = models.BooleanField(default=True, help_text="Cancel remaining steps when the user replies")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'WhatsApp Sequence'
+        verbose_name_plural = 'WhatsApp Sequences'
+
+    def __str__(self):
+        return self.name
+
+
+class WhatsAppSequenceStep(models.Model):
+    """
+    Model to store one step of a follow-up sequence
+    """
+    sequence = models.ForeignKey(WhatsAppSequence, on_delete=models.CASCADE, related_name='steps')
+    position = models.PositiveIntegerField(default=0)
+    template_name = models.CharField(max_length=255)
+    offset = models.DurationField(help_text="Delay after the trigger campaign's send time, e.g. '4 days'")
+
+    class Meta:
+        ordering = ['sequence', 'position']
+        unique_together = [('sequence', 'position')]
+        verbose_name = 'WhatsApp Sequence Step'
+        verbose_name_plural = 'WhatsApp Sequence Steps'
+
+    def __str__(self):
+        return f"{self.sequence.name} #{self.position} - {self.template_name} (+{self.offset})"
+
+
+class WhatsAppCampaignQuerySet(InvalidatingQuerySet):
+    """
+    Set-based operations on WhatsApp campaigns.
+
+    Status changes are compare-and-set: a row only moves if it is still in
+    one of the expected statuses, so the scheduler, workers, the webhook,
+    send_now and cancel can race on the same row without locks and without
+    sending a cancelled or already-sent message.
+
+    transition() and transition_returning() do not publish events; the
+    operation that moves the rows publishes the change (publish_status)
+    once, with the ids that actually moved.
+    """
+    SENDABLE_STATUSES = ('pending', 'scheduled', 'queued')
+    CANCELLABLE_STATUSES = ('pending', 'scheduled', 'queued')
+
+    def transition(self, from_statuses, to_status, **fields):
+        """
+        Move rows that are still in from_statuses to to_status with one
+        conditional UPDATE ... WHERE status IN (...).
+
+        Returns:
+            int: Number of rows that transitioned
+        """
+        return self.filter(status__in=from_statuses).update(
+            status=to_status,
+            updated_at=timezone.now(),
+            **fields
+        )
+
+    def transition_returning(self, from_statuses, to_status, returning=('id',), **fields):
+        """
+        Like transition(), but returns the transitioned rows from the same
+        UPDATE ... RETURNING statement.
+
+        Field values may be plain values or RawSQL expressions.
+
+        Returns:
+            list: dicts with the `returning` columns of the transitioned rows
+        """
+        model = self.model
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        subquery, subquery_params = self.order_by().values('id').query.sql_with_params()
+
+        assignments = []
+        params = []
+        for name, value in {'status': to_status, 'updated_at': timezone.now(), **fields}.items():
+            if isinstance(value, RawSQL):
+                assignments.append(f"{quote(name)} = {value.sql}")
+                params.extend(value.params)
+            else:
+                assignments.append(f"{quote(name)} = %s")
+                params.append(value)
+
+        sql = (
+            f"UPDATE {table} SET {', '.join(assignments)} "
+            f"WHERE {quote('id')} IN ({subquery}) "
+            f"AND {quote('status')} IN ({', '.join(['%s'] * len(from_statuses))}) "
+            f"RETURNING {', '.join(quote(column) for column in returning)}"
+        )
+        params.extend(subquery_params)
+        params.extend(from_statuses)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if rows:
+            invalidate(model)
+
+        datetime_columns = [
+            column for column in returning
+            if isinstance(model._meta.get_field(column), models.DateTimeField)
+        ]
+        results = []
+        for row in rows:
+            result = dict(zip(returning, row))
+            for column in datetime_columns:
+                value = result[column]
+                # Backends without native datetimes (SQLite) return strings
+                if isinstance(value, str):
+                    value = parse_datetime(value)
+                if value and timezone.is_naive(value):
+                    value = timezone.make_aware(value, datetime.timezone.utc)
+                result[column] = value
+            results.append(result)
+        return results
+
+    def cancel_returning(self, reason, received_message=None):
+        """
+        Cancel every cancellable campaign matched by this queryset with a
+        single conditional UPDATE ... RETURNING statement.
+
+        Args:
+            reason: Cancellation reason stored on every cancelled row
+            received_message: Message to store on the rows; either a string
+                for all rows or a dict mapping phone_e164 to message
+
+        Returns:
+            list: dicts with id, template_name, mobile_number, scheduled_time
+                  and task_id of the campaigns that were cancelled
+        """
+        if received_message == {}:
+            received_message = None
+        if isinstance(received_message, dict):
+            # One CASE branch per number keeps a batch of inbound messages to one statement
+            received_sql = RawSQL(
+                'CASE "phone_e164" {} ELSE "received_message" END'.format(
+                    ' '.join(['WHEN %s THEN %s'] * len(received_message))
+                ),
+                [value for item in received_message.items() for value in item]
+            )
+        else:
+            received_sql = RawSQL('COALESCE(%s, "received_message")', [received_message])
+
+        cancelled = self.transition_returning(
+            self.CANCELLABLE_STATUSES,
+            'cancelled',
+            returning=('id', 'template_name', 'mobile_number', 'scheduled_time', 'task_id'),
+            cancellation_reason=reason,
+            received_message=received_sql
+        )
+        publish_status([campaign['id'] for campaign in cancelled], 'cancelled')
+        return cancelled
 
 
 class WhatsAppCampaign(models.Model):
@@ -10,6 +217,7 @@ class WhatsAppCampaign(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('scheduled', 'Scheduled'),
+        ('queued', 'Queued'),
         ('processing', 'Processing'),
         ('success', 'Success'),
         ('failed', 'Failed'),
@@ -19,6 +227,7 @@ class WhatsAppCampaign(models.Model):
     template_name = models.CharField(max_length=255)
     template_id = models.CharField(max_length=255)
     mobile_number = models.CharField(max_length=20, help_text="WhatsApp mobile number with country code")
+    phone_e164 = models.CharField(max_length=20, blank=True, default='', editable=False, help_text="Canonical E.164 form of mobile_number used for lookups")
     scheduled_time = models.DateTimeField(help_text="When to send the message")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     parameters = models.JSONField(default=list, blank=True, help_text="Template parameters for dynamic content")
@@ -26,14 +235,117 @@ class WhatsAppCampaign(models.Model):
     cancellation_reason = models.TextField(blank=True, null=True, help_text="Reason for cancellation")
     received_message = models.TextField(blank=True, null=True, help_text="Last message received from user")
     sent_at = models.DateTimeField(blank=True, null=True, help_text="Actual time when message was sent")
+    claimed_at = models.DateTimeField(blank=True, null=True, help_text="When the scheduler handed the message to a worker")
+    task_id = models.CharField(max_length=255, blank=True, null=True, help_text="Celery task id of the queued send, used for revocation")
+    send_attempts = models.PositiveIntegerField(default=0, help_text="Times the message was sent again after failing or being cancelled; part of the WATI idempotency key")
+    sequence = models.ForeignKey(
+        WhatsAppSequence,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='campaigns',
+        help_text="Follow-up sequence this campaign is a step of"
+    )
+    stop_on_reply = models.BooleanField(default=True, help_text="Cancel this campaign if the user replies before it is sent")
+    wati_message_id = models.CharField(max_length=255, blank=True, null=True, db_index=True, help_text="Message id returned by WATI, used to match status webhooks")
+    delivery_status = models.CharField(max_length=20, choices=DELIVERY_STATUS_CHOICES, blank=True, default='', help_text="Latest delivery status reported by WATI")
+    delivery_status_at = models.DateTimeField(blank=True, null=True, help_text="When the latest delivery status was reported")
+    broadcast = models.ForeignKey(
+        WhatsAppBroadcast,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='campaigns',
+        help_text="Bulk broadcast this campaign belongs to"
+    )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = WhatsAppCampaignQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'WhatsApp Campaign'
         verbose_name_plural = 'WhatsApp Campaigns'
+        indexes = [
+            # Used by the scheduler to find due rows: status = 'scheduled' AND scheduled_time <= now
+            models.Index(fields=['status', 'scheduled_time'], name='whatsapp_status_due_idx'),
+            # Used by the webhook: phone_e164 = '+91...' AND status IN (...)
+            models.Index(fields=['phone_e164', 'status'], name='whatsapp_phone_status_idx'),
+            # Used by the logs and the admin changelist: newest first, optionally by status
+            models.Index(fields=['status', 'created_at'], name='whatsapp_status_created_idx'),
+            models.Index(fields=['created_at'], name='whatsapp_created_idx'),
+            # Admin search also has a trigram index on template_name on PostgreSQL
+            # (migration 0012_whatsapp_admin_indexes)
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone(self.mobile_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'mobile_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.template_name} - {self.mobile_number} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+
+class WhatsAppStatusEvent(models.Model):
+    """
+    Append-only log of WATI delivery status webhooks (sent/delivered/read/failed).
+    Rows are only ever bulk inserted; the latest status is denormalized onto
+    WhatsAppCampaign.delivery_status.
+    """
+    campaign = models.ForeignKey(
+        WhatsAppCampaign,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='status_events'
+    )
+    wati_message_id = models.CharField(max_length=255, blank=True, default='')
+    phone_e164 = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, choices=DELIVERY_STATUS_CHOICES)
+    event_type = models.CharField(max_length=100)
+    occurred_at = models.DateTimeField()
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'WhatsApp Status Event'
+        verbose_name_plural = 'WhatsApp Status Events'
+        indexes = [
+            models.Index(fields=['campaign', 'occurred_at'], name='whatsapp_event_campaign_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} - {self.phone_e164 or self.wati_message_id} - {self.occurred_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+def publish_status(campaign_ids, status):
+    """
+    Publish a 'status' event of the whatsapp stream (core.events) for
+    campaigns moved to `status`
+    """
+    if campaign_ids:
+        publish('whatsapp', {'type': 'status', 'campaign_ids': list(campaign_ids), 'status': status})
+
+
+def publish_delivery(campaign_ids, delivery_status):
+    """
+    Publish a 'delivery' event of the whatsapp stream for campaigns whose
+    delivery status WATI reported
+    """
+    if campaign_ids:
+        publish('whatsapp', {'type': 'delivery', 'campaign_ids': list(campaign_ids), 'delivery_status': delivery_status})
+
+
+def _publish_saved_status(sender, instance, **kwargs):
+    publish_status([instance.id], instance.status)
+
+
+# Cached dashboard responses (core.cache) read campaigns
+post_save.connect(invalidate_on_change, sender=WhatsAppCampaign)
+post_delete.connect(invalidate_on_change, sender=WhatsAppCampaign)
+post_save.connect(_publish_saved_status, sender=WhatsAppCampaign)
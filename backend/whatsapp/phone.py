@@ -0,0 +1,44 @@
+"""
+Canonical phone number format shared by serializers, services and webhooks.
+
+Numbers are stored and compared in E.164 form ("+919866855857") so lookups
+are a single equality probe on WhatsAppCampaign.phone_e164.
+"""
+from django.conf import settings
+import re
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(value, international=False):
+    """
+    Convert a mobile number or WATI waId to E.164.
+
+    "+919866855857", "919866855857", "0091 98668-55857" and the national
+    number "9866855857" all become "+919866855857". Numbers without a "+"
+    or "00" prefix are national when they have exactly
+    WHATSAPP_NATIONAL_NUMBER_LENGTH digits and get
+    WHATSAPP_DEFAULT_COUNTRY_CODE; a prefixed number ("+6591234567") is
+    never given one. Pass international=True for values that always carry
+    a country code, such as WATI waIds ("6591234567").
+
+    Returns:
+        str: E.164 number, or '' if value contains no digits
+    """
+    if not value:
+        return ''
+    value = value.strip()
+    # Fast path: already canonical
+    if value[:1] == '+' and value[1:].isdigit():
+        return value
+
+    digits = _NON_DIGITS.sub('', value)
+    if not digits:
+        return ''
+    if value.startswith('+'):
+        return f"+{digits}"
+    if digits.startswith('00'):
+        return f"+{digits[2:]}"
+    if not international and len(digits) == settings.WHATSAPP_NATIONAL_NUMBER_LENGTH:
+        digits = f"{settings.WHATSAPP_DEFAULT_COUNTRY_CODE}{digits}"
+    return f"+{digits}"
@@ -0,0 +1,163 @@
+"""
+Database-backed dispatcher for scheduled WhatsApp campaigns.
+
+WhatsAppCampaign.scheduled_time is the source of truth for when a message
+goes out. Instead of parking multi-day ETA tasks in the broker, a periodic
+task claims due 'scheduled' rows in batches with SELECT ... FOR UPDATE SKIP
+LOCKED, moves them to 'queued' and hands them to workers.
+"""
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import WhatsAppCampaign, publish_status
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'whatsapp-scheduler'
+
+
+def claim_due_campaigns(batch_size, now=None):
+    """
+    Claim up to batch_size due campaigns and mark them 'queued'.
+
+    Concurrent schedulers skip rows another transaction has locked, so each
+    due row is claimed exactly once.
+
+    Returns:
+        list: (id, broadcast_id) tuples of the claimed campaigns
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            WhatsAppCampaign.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='scheduled', scheduled_time__lte=now)
+            .order_by('scheduled_time')
+            .values_list('id', 'broadcast_id')[:batch_size]
+        )
+        if rows:
+            WhatsAppCampaign.objects.filter(id__in=[row[0] for row in rows]).transition(
+                ['scheduled'],
+                'queued',
+                claimed_at=now
+            )
+            publish_status([row[0] for row in rows], 'queued')
+    return rows
+
+
+def release_stale_claims(now=None):
+    """
+    Put campaigns whose task never ran back to 'scheduled' so they are
+    dispatched again: 'queued' rows whose task was lost (e.g. the broker
+    was flushed), and 'pending' rows handed straight to a worker (immediate
+    sends, batches put back after a network failure) that no task picked up.
+
+    Returns:
+        int: Number of campaigns released
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.WHATSAPP_SCHEDULER_CLAIM_TIMEOUT)
+    released = WhatsAppCampaign.objects.filter(claimed_at__lt=cutoff).transition(
+        ['queued'],
+        'scheduled',
+        claimed_at=None
+    )
+    released += WhatsAppCampaign.objects.filter(updated_at__lt=cutoff).transition(
+        ['pending'],
+        'scheduled',
+        claimed_at=None
+    )
+    return released
+
+
+def fail_stale_sends(now=None):
+    """
+    Mark campaigns left in 'processing' by a worker that died mid-send as
+    failed. WATI may have accepted them, so they are reported rather than
+    sent again.
+
+    Returns:
+        int: Number of campaigns failed
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.WHATSAPP_SEND_TIMEOUT)
+    failed = WhatsAppCampaign.objects.filter(claimed_at__lt=cutoff).transition_returning(
+        ['processing'],
+        'failed',
+        error_message='Send did not complete (worker lost); the message may or may not have been delivered'
+    )
+    if failed:
+        publish_status([row['id'] for row in failed], 'failed')
+        logger.warning("Marked %d WhatsApp campaign(s) stuck in processing as failed", len(failed))
+    return len(failed)
+
+
+def dispatch(rows):
+    """
+    Send claimed campaigns to workers: broadcast members go out through the
+    multi-receiver batch task, everything else one task per campaign.
+    """
+    from .tasks import send_scheduled_whatsapp_task, send_whatsapp_broadcast_batch_task, send_task_id
+
+    by_broadcast = defaultdict(list)
+    single_ids = []
+    for campaign_id, broadcast_id in rows:
+        if broadcast_id:
+            by_broadcast[broadcast_id].append(campaign_id)
+        else:
+            single_ids.append(campaign_id)
+
+    # Record the task id of every single send in one statement so a later
+    # cancellation can revoke the queued message. Batch members need no id:
+    # the batch task skips cancelled rows itself.
+    if single_ids:
+        WhatsAppCampaign.objects.filter(id__in=single_ids).update(
+            task_id=Concat(Value(send_task_id('')), Cast('id', output_field=CharField()))
+        )
+        for campaign_id in single_ids:
+            send_scheduled_whatsapp_task.apply_async(args=[campaign_id], task_id=send_task_id(campaign_id))
+
+    batch_size = settings.WATI_BROADCAST_BATCH_SIZE
+    for campaign_ids in by_broadcast.values():
+        for start in range(0, len(campaign_ids), batch_size):
+            send_whatsapp_broadcast_batch_task.delay(campaign_ids[start:start + batch_size])
+
+
+def dispatch_due_campaigns():
+    """
+    Claim and dispatch due campaigns in batches until none are left or the
+    per-tick batch limit is reached.
+
+    Beat hands each tick to whichever worker is free. A short lock keeps
+    overlapping ticks (several beat nodes, a slow run) from competing for
+    the same rows; it expires before the next tick, so every tick runs.
+    SKIP LOCKED and the compare-and-set transitions keep runs correct
+    without it.
+
+    Returns:
+        dict: { 'skipped': bool, 'dispatched': int, 'released': int, 'stale': int }
+    """
+    from core.redis import run_exclusively
+
+    with run_exclusively(LOCK_NAME, max(settings.WHATSAPP_SCHEDULER_INTERVAL - 1, 1)) as acquired:
+        if not acquired:
+            return {'skipped': True, 'dispatched': 0, 'released': 0, 'stale': 0}
+
+        released = release_stale_claims()
+        stale = fail_stale_sends()
+        dispatched = 0
+        for _ in range(settings.WHATSAPP_SCHEDULER_MAX_BATCHES):
+            rows = claim_due_campaigns(settings.WHATSAPP_SCHEDULER_BATCH_SIZE)
+            if not rows:
+                break
+            dispatch(rows)
+            dispatched += len(rows)
+
+    return {'skipped': False, 'dispatched': dispatched, 'released': released, 'stale': stale}
@@ -0,0 +1,118 @@
+"""
+Follow-up sequence engine.
+
+A WhatsAppSequence is data: ordered steps, each a template and an offset
+from the moment the trigger campaign goes out. Enrolling numbers resolves
+the step template ids once (from the cached WATI template list) and
+creates every step of every number with one bulk_create. The rows are
+'scheduled' and dispatched by the scheduler; steps of a stop_on_reply
+sequence are cancelled by the webhook when the user replies.
+"""
+import logging
+
+from .models import WhatsAppCampaign, WhatsAppSequence
+from .services import WatiService
+
+logger = logging.getLogger(__name__)
+
+# Follow-ups that can be sent by hand, in step order
+FOLLOWUPS = ('second', 'third')
+
+
+def get_trigger_sequence(template_name):
+    """
+    Return the active sequence triggered by template_name, or None
+    """
+    return (
+        WhatsAppSequence.objects
+        .filter(trigger_template_name=template_name, is_active=True)
+        .prefetch_related('steps')
+        .first()
+    )
+
+
+def get_followup_step(template_name, which):
+    """
+    Return the step of the sequence triggered by template_name that goes out
+    as the `which` ('second' or 'third') message, or None
+    """
+    sequence = get_trigger_sequence(template_name)
+    if sequence is None:
+        return None
+    steps = list(sequence.steps.all())
+    index = FOLLOWUPS.index(which)
+    return steps[index] if index < len(steps) else None
+
+
+def enroll(sequence, mobile_numbers, base_time, wati_service=None):
+    """
+    Schedule every step of `sequence` for every number.
+
+    Steps whose template is not approved in WATI are skipped.
+
+    Args:
+        sequence: WhatsAppSequence instance
+        mobile_numbers: Canonical (E.164) mobile numbers to enroll
+        base_time: Time the trigger campaign is sent; step offsets are relative to it
+        wati_service: WatiService used to resolve template ids (optional)
+
+    Returns:
+        list: Created WhatsAppCampaign instances
+    """
+    if wati_service is None:
+        wati_service = WatiService()
+    template_ids = wati_service.get_template_ids()
+    steps = [
+        (step, template_ids[step.template_name])
+        for step in sequence.steps.all()
+        if template_ids.get(step.template_name)
+    ]
+    if not steps:
+        return []
+
+    return WhatsAppCampaign.objects.bulk_create([
+        WhatsAppCampaign(
+            template_name=step.template_name,
+            template_id=template_id,
+            mobile_number=mobile_number,
+            # bulk_create bypasses save(); numbers are already canonical
+            phone_e164=mobile_number,
+            scheduled_time=base_time + step.offset,
+            status='scheduled',
+            sequence=sequence,
+            stop_on_reply=sequence.stop_on_reply
+        )
+        for mobile_number in mobile_numbers
+        for step, template_id in steps
+    ], batch_size=1000)
+
+
+def enroll_triggered(template_name, mobile_numbers, base_time, wati_service=None):
+    """
+    Enroll numbers in the sequence triggered by template_name, if any.
+
+    Returns:
+        list: Created WhatsAppCampaign instances
+    """
+    sequence = get_trigger_sequence(template_name)
+    if sequence is None:
+        return []
+    return enroll(sequence, mobile_numbers, base_time, wati_service)
+
+
+def enroll_sent(template_name, mobile_numbers, base_time, wati_service=None):
+    """
+    Enroll the numbers of broadcast messages that were just sent. The
+    messages are already out, so a failure is logged instead of raised
+    (raising would retry the send task).
+
+    Returns:
+        list: Created WhatsAppCampaign instances
+    """
+    if not mobile_numbers:
+        return []
+    try:
+        return enroll_triggered(template_name, mobile_numbers, base_time, wati_service)
+    except Exception as e:
+        logger.warning("Could not enroll %d number(s) in the %s follow-up sequence: %s", len(mobile_numbers), template_name, e)
+        return []
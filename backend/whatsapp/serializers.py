@@ -1,5 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import WhatsAppCampaign
+from .phone import normalize_phone
+import re
+
+
+MOBILE_NUMBER_RE = re.compile(r'^\+?[1-9]\d{1,14}$')
 
 
 class WhatsAppCampaignSerializer(serializers.ModelSerializer):
@@ -20,10 +26,15 @@ class WhatsAppCampaignSerializer(serializers.ModelSerializer):
             'cancellation_reason',
             'received_message',
             'sent_at',
+            'delivery_status',
+            'delivery_status_at',
+            'sequence',
+            'stop_on_reply',
+            'broadcast',
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'status', 'error_message', 'cancellation_reason', 'received_message', 'sent_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'error_message', 'cancellation_reason', 'received_message', 'sent_at', 'delivery_status', 'delivery_status_at', 'sequence', 'stop_on_reply', 'broadcast', 'created_at', 'updated_at']
 
 
 class SendWhatsAppSerializer(serializers.Serializer):
@@ -46,12 +57,68 @@ class SendWhatsAppSerializer(serializers.Serializer):
         Validate mobile number format
         """
         # Basic validation - should contain only digits and optional +
-        import re
-        if not re.match(r'^\+?[1-9]\d{1,14}$', value):
+        if not MOBILE_NUMBER_RE.match(value):
             raise serializers.ValidationError(
                 "Mobile number must be in international format (e.g., +919876543210)"
             )
-        return value
+        return normalize_phone(value)
+
+
+class SendWhatsAppBroadcastSerializer(serializers.Serializer):
+    """
+    Serializer for sending one WhatsApp template to many numbers
+    """
+    template_name = serializers.CharField(max_length=255, required=True)
+    template_id = serializers.CharField(max_length=255, required=True)
+    scheduled_time = serializers.DateTimeField(required=False)
+    recipients = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        help_text="Recipients array, e.g., [{'mobile_number': '+919876543210', 'parameters': [{'name': 'param1', 'value': 'value1'}]}]"
+    )
+
+    def validate_recipients(self, value):
+        """
+        Validate and normalize all recipients in a single pass and drop
+        duplicate numbers.
+
+        Nested serializers would run the full field machinery per item, which
+        is far too slow for lists with tens of thousands of entries.
+        """
+        max_recipients = settings.WHATSAPP_BROADCAST_MAX_RECIPIENTS
+        if len(value) > max_recipients:
+            raise serializers.ValidationError(
+                f"A broadcast may contain at most {max_recipients} recipients"
+            )
+
+        errors = {}
+        seen = set()
+        recipients = []
+        for index, item in enumerate(value):
+            mobile_number = str(item.get('mobile_number') or '').strip()
+            if not MOBILE_NUMBER_RE.match(mobile_number):
+                errors[index] = "Mobile number must be in international format (e.g., +919876543210)"
+                continue
+
+            parameters = item.get('parameters') or []
+            if not isinstance(parameters, list) or not all(
+                isinstance(p, dict) and 'name' in p and 'value' in p for p in parameters
+            ):
+                errors[index] = "parameters must be a list of {'name': ..., 'value': ...} objects"
+                continue
+
+            mobile_number = normalize_phone(mobile_number)
+            if mobile_number in seen:
+                continue
+            seen.add(mobile_number)
+            recipients.append({
+                'mobile_number': mobile_number,
+                'parameters': [{'name': str(p['name']), 'value': str(p['value'])} for p in parameters]
+            })
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return recipients
 
 
 class WatiTemplateSerializer(serializers.Serializer):
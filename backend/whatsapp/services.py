@@ -1,9 +1,33 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
 from django.utils import timezone
-from .models import WhatsAppCampaign
+from core.http import get_async_client
+from core.metrics import count_messages, observe_provider_call
+from core.ratelimit import get_limiter
+from .delivery import extract_message_id
+from .models import WhatsAppCampaign, WhatsAppCampaignQuerySet, publish_status
+from .phone import normalize_phone
+import hashlib
 import requests
 import json
 import re
+import time
+
+
+SENDABLE_STATUSES = WhatsAppCampaignQuerySet.SENDABLE_STATUSES
+
+
+def idempotency_key(kind, *campaigns):
+    """
+    Deterministic key for an outbound WATI call: every retry of the same
+    send carries the same key, so a provider that deduplicates on it never
+    delivers the message twice. A deliberate resend of a failed or
+    cancelled campaign (send_attempts) gets a new key.
+    """
+    payload = f"{kind}:{','.join(f'{campaign.id}.{campaign.send_attempts}' for campaign in campaigns)}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
 
 
 class WatiService:
@@ -27,6 +51,15 @@ class WatiService:
             'Content-Type': 'application/json'
         }
     
+    def get_channel_number(self):
+        """
+        Normalize channel_number: digits only, ensure starts with '91'
+        """
+        digits_only = re.sub(r"\D", "", str(self.channel_number))
+        if not digits_only.startswith('91'):
+            digits_only = f"91{digits_only}"
+        return int(digits_only)
+
     def get_templates(self):
         """
         Fetch all approved WhatsApp templates from WATI
@@ -36,31 +69,11 @@ class WatiService:
         """
         try:
             url = f"{self.api_base_url}/api/v1/getMessageTemplates"
+            started = time.monotonic()
             response = requests.get(url, headers=self.headers, timeout=10)
+            observe_provider_call('wati', time.monotonic() - started, response.status_code)
             
-            if response.status_code == 200:
-                data = response.json()
-                # WATI returns templates in a specific format
-                templates = data.get('messageTemplates', [])
-                
-                # Filter only approved templates and extract name/id
-                approved_templates = []
-                for template in templates:
-                    if template.get('status') == 'APPROVED':
-                        approved_templates.append({
-                            'name': template.get('elementName'),  # WATI uses 'elementName' for template name
-                            'id': template.get('id')
-                        })
-                
-                return {
-                    'success': True,
-                    'templates': approved_templates
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'WATI API error: {response.status_code} - {response.text}'
-                }
+            return self._templates_result(response)
         
         except Exception as e:
             return {
@@ -68,17 +81,89 @@ class WatiService:
                 'error': str(e)
             }
 
+    async def aget_templates(self):
+        """
+        Async version of get_templates() using the shared async HTTP client
+        """
+        try:
+            started = time.monotonic()
+            response = await get_async_client().get(
+                f"{self.api_base_url}/api/v1/getMessageTemplates",
+                headers=self.headers,
+                timeout=10
+            )
+            observe_provider_call('wati', time.monotonic() - started, response.status_code)
+            return self._templates_result(response)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _templates_result(self, response):
+        if response.status_code == 200:
+            data = response.json()
+            # WATI returns templates in a specific format
+            templates = data.get('messageTemplates', [])
+            
+            # Filter only approved templates and extract name/id
+            approved_templates = []
+            for template in templates:
+                if template.get('status') == 'APPROVED':
+                    approved_templates.append({
+                        'name': template.get('elementName'),  # WATI uses 'elementName' for template name
+                        'id': template.get('id')
+                    })
+            
+            return {
+                'success': True,
+                'templates': approved_templates
+            }
+        return {
+            'success': False,
+            'error': f'WATI API error: {response.status_code} - {response.text}'
+        }
+
+    def get_template_ids(self):
+        """
+        Return a mapping of approved template name to id.
+
+        The mapping is cached for WATI_TEMPLATE_CACHE_TTL seconds so follow-up
+        scheduling does not call WATI on every request. Failed lookups are
+        not cached.
+        """
+        cache_key = 'wati:template_ids'
+        template_ids = cache.get(cache_key)
+        if template_ids is None:
+            res = self.get_templates()
+            if not res.get('success'):
+                return {}
+            template_ids = {t.get('name'): t.get('id') for t in res.get('templates', [])}
+            cache.set(cache_key, template_ids, settings.WATI_TEMPLATE_CACHE_TTL)
+        return template_ids
+
+    async def aget_template_ids(self):
+        """
+        Async version of get_template_ids(), sharing the same cache entry
+        """
+        cache_key = 'wati:template_ids'
+        template_ids = await cache.aget(cache_key)
+        if template_ids is None:
+            res = await self.aget_templates()
+            if not res.get('success'):
+                return {}
+            template_ids = {t.get('name'): t.get('id') for t in res.get('templates', [])}
+            await cache.aset(cache_key, template_ids, settings.WATI_TEMPLATE_CACHE_TTL)
+        return template_ids
+
     def get_template_id_by_name(self, template_name: str):
         """
         Return template id by its elementName (template name) if approved.
         """
-        res = self.get_templates()
-        if not res.get('success'):
-            return None
-        for t in res.get('templates', []):
-            if t.get('name') == template_name:
-                return t.get('id')
-        return None
+        return self.get_template_ids().get(template_name)
+
+    async def aget_template_id_by_name(self, template_name: str):
+        return (await self.aget_template_ids()).get(template_name)
     
     def get_contacts(self):
         """
@@ -89,121 +174,150 @@ class WatiService:
         """
         try:
             url = f"{self.api_base_url}/api/v1/getContacts"
+            started = time.monotonic()
             response = requests.get(url, headers=self.headers, timeout=10)
+            observe_provider_call('wati', time.monotonic() - started, response.status_code)
             
-            if response.status_code == 200:
-                data = response.json()
-                # WATI returns contacts in contact_list format
-                contacts = data.get('contact_list', [])
-                
-                # Extract contact information
-                formatted_contacts = []
-                for contact in contacts:
-                    whatsapp_id = contact.get('wAId', '') or contact.get('phone', '')  # WhatsApp ID (phone number)
-                    full_name = contact.get('fullName', '')
-                    first_name = contact.get('firstName', '')
-                    name = full_name or first_name or whatsapp_id  # Prefer fullName, then firstName, then phone
-                    
-                    # Ensure phone number has + prefix for WhatsApp
-                    phone = whatsapp_id if whatsapp_id.startswith('+') else f'+{whatsapp_id}'
-                    
-                    formatted_contacts.append({
-                        'name': name,
-                        'phone': phone,
-                        'whatsapp_id': whatsapp_id
-                    })
-                
-                return {
-                    'success': True,
-                    'contacts': formatted_contacts
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'WATI API error: {response.status_code} - {response.text}'
-                }
+            return self._contacts_result(response)
         
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
+
+    async def aget_contacts(self):
+        """
+        Async version of get_contacts() using the shared async HTTP client
+        """
+        try:
+            started = time.monotonic()
+            response = await get_async_client().get(
+                f"{self.api_base_url}/api/v1/getContacts",
+                headers=self.headers,
+                timeout=10
+            )
+            observe_provider_call('wati', time.monotonic() - started, response.status_code)
+            return self._contacts_result(response)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _contacts_result(self, response):
+        if response.status_code == 200:
+            data = response.json()
+            # WATI returns contacts in contact_list format
+            contacts = data.get('contact_list', [])
+            
+            # Extract contact information
+            formatted_contacts = []
+            for contact in contacts:
+                whatsapp_id = contact.get('wAId', '') or contact.get('phone', '')  # WhatsApp ID (phone number)
+                full_name = contact.get('fullName', '')
+                first_name = contact.get('firstName', '')
+                name = full_name or first_name or whatsapp_id  # Prefer fullName, then firstName, then phone
+                
+                # Ensure phone number has + prefix for WhatsApp
+                phone = normalize_phone(whatsapp_id) or whatsapp_id
+                
+                formatted_contacts.append({
+                    'name': name,
+                    'phone': phone,
+                    'whatsapp_id': whatsapp_id
+                })
+            
+            return {
+                'success': True,
+                'contacts': formatted_contacts
+            }
+        return {
+            'success': False,
+            'error': f'WATI API error: {response.status_code} - {response.text}'
+        }
     
-    def send_template_message(self, campaign_id):
+    def send_template_message(self, campaign_id, from_statuses=SENDABLE_STATUSES):
         """
         Send WhatsApp message using WATI template
         
+        The campaign is claimed with a compare-and-set transition to
+        'processing' first; if another worker, the webhook or a cancel got
+        there before us, nothing is sent.
+        
         Args:
             campaign_id: ID of the WhatsAppCampaign instance
+            from_statuses: Statuses the campaign may be sent from
         
         Returns:
             dict: Result with success status and message
         """
+        campaigns = WhatsAppCampaign.objects.filter(id=campaign_id)
         try:
-            campaign = WhatsAppCampaign.objects.get(id=campaign_id)
-            campaign.status = 'processing'
-            campaign.save()
-            
-            # Send the message
-            # WhatsApp number goes in query parameter, channel_number in body
-            mobile_number = campaign.mobile_number.replace('+', '') if campaign.mobile_number.startswith('+') else campaign.mobile_number
+            refused = self._claim(campaigns, from_statuses)
+            if refused:
+                return refused
+            campaign = campaigns.get()
+            url, headers, message_data = self._template_message_request(campaign)
             
-            url = f"{self.api_base_url}/api/v2/sendTemplateMessage?whatsappNumber={mobile_number}"
-            
-            # Prepare message data for WATI sendTemplateMessage API
-            # Normalize channel_number: digits only, ensure starts with '91'
-            raw_channel = str(self.channel_number)
-            digits_only = re.sub(r"\D", "", raw_channel)
-            if not digits_only.startswith('91'):
-                digits_only = f"91{digits_only}"
-
-            message_data = {
-                "template_name": campaign.template_name,
-                "broadcast_name": f"Campaign_{campaign.id}_{campaign.template_name}",
-                "channel_number": int(digits_only)
-            }
-            
-            # Add template parameters array if available
-            if campaign.parameters:
-                message_data["parameters"] = campaign.parameters
-            else:
-                message_data["parameters"] = []
-            
-            # Make API request
-            response = requests.post(
-                url,
-                headers=self.headers,
-                data=json.dumps(message_data),
-                timeout=10
+            # Make API request through the shared adaptive limiter, which
+            # retries 429 responses after backing off; a 5xx may have been
+            # sent, so it is not repeated. The idempotency key is the same on
+            # every attempt for this campaign.
+            response = get_limiter('wati').call(
+                lambda: requests.post(
+                    url,
+                    headers=headers,
+                    data=json.dumps(message_data),
+                    timeout=10
+                ),
+                max_attempts=settings.PROVIDER_MAX_ATTEMPTS,
+                idempotent=False
             )
-            
-            # Update campaign based on response
-            if response.status_code in [200, 201, 202]:
-                data = response.json()
-                if data.get('result') == True or data.get('result') == 'success':
-                    campaign.status = 'success'
-                    campaign.sent_at = timezone.now()
-                else:
-                    campaign.status = 'failed'
-                    # Store detailed error from WATI response
-                    error_msg = data.get('message', 'Unknown error')
-                    if not error_msg or error_msg == 'Unknown error':
-                        # Fallback to full response for debugging
-                        campaign.error_message = f"WATI API error: {json.dumps(data)}"
-                    else:
-                        campaign.error_message = error_msg
-            else:
-                campaign.status = 'failed'
-                campaign.error_message = f'WATI API HTTP error: {response.status_code} - {response.text[:500]}'
-            
-            campaign.save()
+            return self._record_send_response(campaigns, campaign, response)
+        
+        except WhatsAppCampaign.DoesNotExist:
+            return {
+                'success': False,
+                'error': 'Campaign not found'
+            }
+        except Exception as e:
+            # Update campaign status to failed
+            try:
+                if campaigns.transition(['processing'], 'failed', error_message=str(e)):
+                    publish_status([campaign_id], 'failed')
+            except Exception:
+                pass
             
             return {
-                'success': campaign.status == 'success',
-                'campaign_id': campaign.id,
-                'status': campaign.status,
-                'error': campaign.error_message if campaign.status == 'failed' else None
+                'success': False,
+                'error': str(e)
             }
+
+    async def asend_template_message(self, campaign_id, from_statuses=SENDABLE_STATUSES):
+        """
+        Async version of send_template_message(): the WATI call runs on the
+        shared async HTTP client, database writes run in Django's sync thread
+        """
+        campaigns = WhatsAppCampaign.objects.filter(id=campaign_id)
+        try:
+            refused = await sync_to_async(self._claim)(campaigns, from_statuses)
+            if refused:
+                return refused
+            campaign = await campaigns.aget()
+            url, headers, message_data = self._template_message_request(campaign)
+            client = get_async_client()
+            response = await get_limiter('wati').acall(
+                lambda: client.post(
+                    url,
+                    headers=headers,
+                    content=json.dumps(message_data),
+                    timeout=10
+                ),
+                max_attempts=settings.PROVIDER_MAX_ATTEMPTS,
+                idempotent=False
+            )
+            return await sync_to_async(self._record_send_response)(campaigns, campaign, response)
         
         except WhatsAppCampaign.DoesNotExist:
             return {
@@ -211,12 +325,10 @@ class WatiService:
                 'error': 'Campaign not found'
             }
         except Exception as e:
-            # Update campaign status to failed
             try:
-                campaign.status = 'failed'
-                campaign.error_message = str(e)
-                campaign.save()
-            except:
+                if await sync_to_async(campaigns.transition)(['processing'], 'failed', error_message=str(e)):
+                    await sync_to_async(publish_status)([campaign_id], 'failed')
+            except Exception:
                 pass
             
             return {
@@ -224,3 +336,246 @@ class WatiService:
                 'error': str(e)
             }
 
+    def _claim(self, campaigns, from_statuses):
+        """
+        Move the campaign to 'processing'. Returns None when claimed, or the
+        refusal result when it is no longer in one of from_statuses.
+        """
+        # claimed_at lets the scheduler fail sends whose worker died (see
+        # scheduler.fail_stale_sends)
+        if campaigns.transition(
+            from_statuses,
+            'processing',
+            claimed_at=timezone.now(),
+            # Sending a failed campaign again is a new attempt (see idempotency_key)
+            send_attempts=Case(
+                When(status__in=SENDABLE_STATUSES, then=F('send_attempts')),
+                default=F('send_attempts') + 1
+            )
+        ):
+            return None
+        campaign = campaigns.get()
+        return {
+            'success': False,
+            'campaign_id': campaign.id,
+            'status': campaign.status,
+            'error': f'Campaign is {campaign.status}, not sending'
+        }
+
+    def _template_message_request(self, campaign):
+        """
+        Build (url, headers, body) of the sendTemplateMessage call for a campaign
+        """
+        # WhatsApp number goes in query parameter, channel_number in body
+        mobile_number = (campaign.phone_e164 or normalize_phone(campaign.mobile_number))[1:]
+        
+        url = f"{self.api_base_url}/api/v2/sendTemplateMessage?whatsappNumber={mobile_number}"
+        
+        # Prepare message data for WATI sendTemplateMessage API
+        message_data = {
+            "template_name": campaign.template_name,
+            "broadcast_name": f"Campaign_{campaign.id}_{campaign.template_name}",
+            "channel_number": self.get_channel_number()
+        }
+        
+        # Add template parameters array if available
+        if campaign.parameters:
+            message_data["parameters"] = campaign.parameters
+        else:
+            message_data["parameters"] = []
+        
+        headers = {**self.headers, 'Idempotency-Key': idempotency_key('campaign', campaign)}
+        return url, headers, message_data
+
+    def _record_send_response(self, campaigns, campaign, response):
+        """
+        Move a claimed campaign to success/failed from the WATI response
+        """
+        # Update campaign based on response
+        error_message = None
+        wati_message_id = None
+        if response.status_code in [200, 201, 202]:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                error_message = f'WATI API returned an unreadable response: {response.text[:500]}'
+            elif not (data.get('result') == True or data.get('result') == 'success'):
+                # Store detailed error from WATI response
+                error_msg = data.get('message', 'Unknown error')
+                if not error_msg or error_msg == 'Unknown error':
+                    # Fallback to full response for debugging
+                    error_message = f"WATI API error: {json.dumps(data)}"
+                else:
+                    error_message = error_msg
+            else:
+                wati_message_id = extract_message_id(data) or None
+        else:
+            error_message = f'WATI API HTTP error: {response.status_code} - {response.text[:500]}'
+        
+        if error_message is None:
+            moved = campaigns.transition(
+                ['processing'],
+                'success',
+                sent_at=timezone.now(),
+                wati_message_id=wati_message_id
+            )
+            final_status = 'success'
+        else:
+            moved = campaigns.transition(['processing'], 'failed', error_message=error_message)
+            final_status = 'failed'
+        if moved:
+            publish_status([campaign.id], final_status)
+        count_messages('whatsapp', campaign.template_name, 'sent' if final_status == 'success' else 'failed')
+        
+        return {
+            'success': final_status == 'success',
+            'campaign_id': campaign.id,
+            'status': final_status,
+            'error': error_message
+        }
+
+    def send_template_messages(self, campaign_ids):
+        """
+        Send one WATI template to many receivers with a single API call
+
+        All campaigns must share the same template. Campaigns that are no
+        longer pending/scheduled/queued (e.g. cancelled by the webhook) are
+        skipped.
+
+        Args:
+            campaign_ids: IDs of WhatsAppCampaign instances
+
+        Returns:
+            dict: { 'success': bool, 'sent': int, 'failed': int, 'skipped': int, 'error': '...' }
+        """
+        # Claim the batch with one compare-and-set UPDATE; rows another
+        # worker or the webhook already moved are not returned
+        claimed = WhatsAppCampaign.objects.filter(id__in=campaign_ids).transition_returning(
+            SENDABLE_STATUSES, 'processing', claimed_at=timezone.now()
+        )
+        ids = sorted(row['id'] for row in claimed)
+        skipped = len(campaign_ids) - len(ids)
+        if not ids:
+            return {'success': True, 'sent': 0, 'failed': 0, 'skipped': skipped}
+        publish_status(ids, 'processing')
+
+        campaigns = list(WhatsAppCampaign.objects.filter(id__in=ids))
+        processing = WhatsAppCampaign.objects.filter(id__in=ids)
+
+        template_name = campaigns[0].template_name
+        receivers = []
+        campaign_by_number = {}
+        for campaign in campaigns:
+            mobile_number = (campaign.phone_e164 or normalize_phone(campaign.mobile_number))[1:]
+            campaign_by_number[mobile_number] = campaign.id
+            receivers.append({
+                "whatsappNumber": mobile_number,
+                "customParams": campaign.parameters or []
+            })
+
+        message_data = {
+            "template_name": template_name,
+            "broadcast_name": f"Broadcast_{campaigns[0].broadcast_id or ids[0]}_{template_name}",
+            "channel_number": self.get_channel_number(),
+            "receivers": receivers
+        }
+
+        headers = {**self.headers, 'Idempotency-Key': idempotency_key('batch', *sorted(campaigns, key=lambda campaign: campaign.id))}
+        try:
+            response = get_limiter('wati').call(
+                lambda: requests.post(
+                    f"{self.api_base_url}/api/v1/sendTemplateMessages",
+                    headers=headers,
+                    data=json.dumps(message_data),
+                    timeout=30
+                ),
+                max_attempts=settings.PROVIDER_MAX_ATTEMPTS,
+                idempotent=False
+            )
+        except Exception:
+            # Network failure: put the rows back so a retry can pick them up
+            processing.transition(['processing'], 'pending')
+            publish_status(ids, 'pending')
+            raise
+
+        if response.status_code not in [200, 201, 202]:
+            error = f'WATI API HTTP error: {response.status_code} - {response.text[:500]}'
+            processing.transition(['processing'], 'failed', error_message=error)
+            publish_status(ids, 'failed')
+            count_messages('whatsapp', template_name, 'failed', len(ids))
+            return {'success': False, 'sent': 0, 'failed': len(ids), 'skipped': skipped, 'error': error}
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            # WATI may have accepted the batch, so the rows are failed rather
+            # than released for a retry that could send them twice
+            error = f'WATI API returned an unreadable response: {response.text[:500]}'
+            processing.transition(['processing'], 'failed', error_message=error)
+            publish_status(ids, 'failed')
+            count_messages('whatsapp', template_name, 'failed', len(ids))
+            return {'success': False, 'sent': 0, 'failed': len(ids), 'skipped': skipped, 'error': error}
+
+        if not (data.get('result') == True or data.get('result') == 'success'):
+            error = data.get('message') or f"WATI API error: {json.dumps(data)}"
+            processing.transition(['processing'], 'failed', error_message=error)
+            publish_status(ids, 'failed')
+            count_messages('whatsapp', template_name, 'failed', len(ids))
+            return {'success': False, 'sent': 0, 'failed': len(ids), 'skipped': skipped, 'error': error}
+
+        # WATI reports receivers it rejected; everything else was accepted
+        errors = data.get('errors') or {}
+        rejected_numbers = [normalize_phone(number, international=True)[1:] for number in errors.get('invalidWhatsappNumbers') or []]
+        failed_ids = [
+            campaign_by_number[number]
+            for number in rejected_numbers
+            if number in campaign_by_number
+        ]
+        if failed_ids:
+            WhatsAppCampaign.objects.filter(id__in=failed_ids).transition(
+                ['processing'],
+                'failed',
+                error_message='WATI rejected number as invalid WhatsApp number'
+            )
+            publish_status(failed_ids, 'failed')
+        failed_set = set(failed_ids)
+        sent_ids = [i for i in ids if i not in failed_set]
+        # Message ids of the accepted receivers, so delivery webhooks match
+        # the campaign by id rather than by number
+        message_ids = {}
+        for receiver in data.get('receivers') or []:
+            if not isinstance(receiver, dict):
+                continue
+            number = normalize_phone(str(receiver.get('waId') or receiver.get('whatsappNumber') or ''), international=True)[1:]
+            message_id = extract_message_id(receiver)
+            if number in campaign_by_number and message_id:
+                message_ids[campaign_by_number[number]] = message_id
+        sent_at = timezone.now()
+        fields = {'sent_at': sent_at}
+        if message_ids:
+            fields['wati_message_id'] = Case(
+                *[When(id=campaign_id, then=Value(message_id)) for campaign_id, message_id in message_ids.items()],
+                default=F('wati_message_id')
+            )
+        WhatsAppCampaign.objects.filter(id__in=sent_ids).transition(['processing'], 'success', **fields)
+        publish_status(sent_ids, 'success')
+
+        # Follow-ups start once the trigger message is out, as for single sends
+        from .sequences import enroll_sent
+        enroll_sent(template_name, [
+            campaign.phone_e164 for campaign in campaigns
+            if campaign.id not in failed_set and campaign.sequence_id is None
+        ], sent_at, self)
+        count_messages('whatsapp', template_name, 'sent', len(sent_ids))
+        count_messages('whatsapp', template_name, 'failed', len(failed_ids))
+
+        return {
+            'success': True,
+            'sent': len(sent_ids),
+            'failed': len(failed_ids),
+            'skipped': skipped
+        }
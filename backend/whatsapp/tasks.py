@@ -1,5 +1,31 @@
-from celery import shared_task
+from celery import shared_task, current_app
+from django.utils import timezone
 from .services import WatiService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def send_task_id(campaign_id):
+    """
+    Deterministic Celery task id for the send of a single campaign
+    """
+    return f"whatsapp-send-{campaign_id}"
+
+
+def revoke_send_tasks(task_ids):
+    """
+    Revoke queued send tasks in one broadcast to the workers so cancelled
+    campaigns never occupy a worker. Failure is not fatal: the task re-checks
+    the campaign status before sending.
+    """
+    task_ids = [task_id for task_id in task_ids if task_id]
+    if not task_ids:
+        return
+    try:
+        current_app.control.revoke(task_ids)
+    except Exception as e:
+        logger.warning("Could not revoke %d WhatsApp send task(s): %s", len(task_ids), e)
 
 
 @shared_task(bind=True, max_retries=3)
@@ -51,4 +77,56 @@ def send_scheduled_whatsapp_task(self, campaign_id):
         raise self.retry(exc=exc, countdown=60)
 
 
+@shared_task(bind=True, max_retries=3)
+def send_whatsapp_broadcast_batch_task(self, campaign_ids):
+    """
+    Celery task to send one batch of a WhatsApp broadcast
+    
+    Args:
+        campaign_ids: IDs of WhatsAppCampaign instances sharing a template
+    
+    Returns:
+        dict: Result of the batch sending operation
+    """
+    try:
+        from django.conf import settings
+        from .models import WhatsAppCampaign
+        
+        wati_service = WatiService()
+        if settings.WATI_BULK_SEND_ENABLED:
+            return wati_service.send_template_messages(campaign_ids)
+        
+        # Fall back to one sendTemplateMessage call per campaign
+        from .sequences import enroll_sent
+
+        sent = failed = 0
+        sendable = WhatsAppCampaign.objects.filter(
+            id__in=campaign_ids,
+            status__in=['pending', 'scheduled', 'queued']
+        ).values_list('id', 'template_name', 'phone_e164', 'sequence_id')
+        for campaign_id, template_name, phone_e164, sequence_id in sendable:
+            result = wati_service.send_template_message(campaign_id)
+            if result.get('success'):
+                sent += 1
+                if sequence_id is None:
+                    enroll_sent(template_name, [phone_e164], timezone.now(), wati_service)
+            else:
+                failed += 1
+        return {'success': True, 'sent': sent, 'failed': failed}
+    except Exception as exc:
+        # Retry the task in case of failure
+        raise self.retry(exc=exc, countdown=60)
+
 
+@shared_task(ignore_result=True)
+def dispatch_due_whatsapp_campaigns_task():
+    """
+    Periodic task (Celery beat) that dispatches scheduled WhatsApp campaigns
+    whose scheduled_time has passed
+    
+    Returns:
+        dict: Summary of the dispatch run
+    """
+    from .scheduler import dispatch_due_campaigns
+    
+    return dispatch_due_campaigns()
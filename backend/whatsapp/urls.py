@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import WhatsAppCampaignViewSet, receive_wati_webhook
 
 router = DefaultRouter()
@@ -8,5 +9,12 @@ router.register(r'campaigns', WhatsAppCampaignViewSet, basename='whatsapp-campai
 urlpatterns = [
     path('', include(router.urls)),
     path('webhook/receive-message/', receive_wati_webhook, name='wati-webhook'),
+    # Async (ASGI) variants of the WATI-bound actions
+    path('async/templates/', async_views.templates, name='whatsapp-async-templates'),
+    path('async/contacts/', async_views.contacts, name='whatsapp-async-contacts'),
+    path('async/campaigns/<int:pk>/send_now/', async_views.send_now, name='whatsapp-async-send-now'),
+    path('async/campaigns/<int:pk>/send_followup/', async_views.send_followup, name='whatsapp-async-send-followup'),
+    # Live campaign status changes (Server-Sent Events)
+    path('async/events/', async_views.events, name='whatsapp-async-events'),
 ]
 
@@ -2,16 +2,26 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from core.cache import cached_response
+from core.metrics import WEBHOOK_PROCESSING
 import json
+import logging
 import re
-from .models import WhatsAppCampaign
-from .serializers import WhatsAppCampaignSerializer, SendWhatsAppSerializer
-from .services import WatiService
-from .tasks import send_scheduled_whatsapp_task
+from .models import WhatsAppCampaign, WhatsAppBroadcast
+from .serializers import WhatsAppCampaignSerializer, SendWhatsAppSerializer, SendWhatsAppBroadcastSerializer
+from .services import WatiService, SENDABLE_STATUSES
+from .tasks import send_whatsapp_broadcast_batch_task, revoke_send_tasks
+from .delivery import event_status, record_status_events
+from .phone import normalize_phone
+from .sequences import enroll_triggered, get_followup_step
+from .webhooks import cancel_for_inbound_messages, enqueue_event
+
+logger = logging.getLogger(__name__)
 
 
 class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
@@ -25,6 +35,8 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'send_message':
             return SendWhatsAppSerializer
+        if self.action == 'broadcast':
+            return SendWhatsAppBroadcastSerializer
         return WhatsAppCampaignSerializer
     
     @action(detail=False, methods=['post'])
@@ -44,52 +56,29 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
         
         if serializer.is_valid():
             try:
-                # Create campaign record
+                # Check if message should be sent now or scheduled
+                now = timezone.now()
+                scheduled_time = serializer.validated_data['scheduled_time']
+                
+                # Create campaign record; future sends are picked up by the
+                # scheduler at scheduled_time
                 campaign = WhatsAppCampaign.objects.create(
                     template_name=serializer.validated_data['template_name'],
                     template_id=serializer.validated_data['template_id'],
                     mobile_number=serializer.validated_data['mobile_number'],
-                    scheduled_time=serializer.validated_data['scheduled_time'],
+                    scheduled_time=scheduled_time,
                     parameters=serializer.validated_data.get('parameters', []),
-                    status='pending'
+                    status='pending' if scheduled_time <= now else 'scheduled'
                 )
                 
-                # Check if message should be sent now or scheduled
-                now = timezone.now()
-                scheduled_time = serializer.validated_data['scheduled_time']
-                
                 if scheduled_time <= now:
                     # Send immediately
                     wati_service = WatiService()
                     result = wati_service.send_template_message(campaign.id)
                     
                     if result['success']:
-                        # Chain follow-ups if first reminder
-                        if campaign.template_name == 'payment_reminder_first':
-                            base_time = now
-                            await_seconds_4d = 4 * 24 * 60 * 60
-                            await_seconds_10d = 10 * 24 * 60 * 60
-                            # Resolve template ids
-                            second_id = wati_service.get_template_id_by_name('payment_reminder_second')
-                            third_id = wati_service.get_template_id_by_name('payment_reminder_third')
-                            if second_id:
-                                c2 = WhatsAppCampaign.objects.create(
-                                    template_name='payment_reminder_second',
-                                    template_id=second_id,
-                                    mobile_number=campaign.mobile_number,
-                                    scheduled_time=base_time + timedelta(days=4),
-                                    status='scheduled'
-                                )
-                                send_scheduled_whatsapp_task.apply_async(args=[c2.id], countdown=await_seconds_4d)
-                            if third_id:
-                                c3 = WhatsAppCampaign.objects.create(
-                                    template_name='payment_reminder_third',
-                                    template_id=third_id,
-                                    mobile_number=campaign.mobile_number,
-                                    scheduled_time=base_time + timedelta(days=10),
-                                    status='scheduled'
-                                )
-                                send_scheduled_whatsapp_task.apply_async(args=[c3.id], countdown=await_seconds_10d)
+                        # Enroll in the follow-up sequence triggered by this template
+                        enroll_triggered(campaign.template_name, [campaign.phone_e164], now, wati_service)
                         return Response({
                             'success': True,
                             'message': 'WhatsApp message sent successfully',
@@ -104,47 +93,8 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
                             'error': result.get('error', 'Failed to send message')
                         }, status=status.HTTP_400_BAD_REQUEST)
                 else:
-                    # Schedule for later using Celery task
-                    campaign.status = 'scheduled'
-                    campaign.save()
-                    
-                    # Calculate delay in seconds
-                    delay_seconds = (scheduled_time - now).total_seconds()
-                    
-                    # Schedule the task
-                    send_scheduled_whatsapp_task.apply_async(
-                        args=[campaign.id],
-                        countdown=delay_seconds
-                    )
-                    # Chain follow-ups if first reminder (relative to scheduled_time)
-                    if campaign.template_name == 'payment_reminder_first':
-                        wati_service = WatiService()
-                        second_id = wati_service.get_template_id_by_name('payment_reminder_second')
-                        third_id = wati_service.get_template_id_by_name('payment_reminder_third')
-                        if second_id:
-                            c2 = WhatsAppCampaign.objects.create(
-                                template_name='payment_reminder_second',
-                                template_id=second_id,
-                                mobile_number=campaign.mobile_number,
-                                scheduled_time=scheduled_time + timedelta(days=4),
-                                status='scheduled'
-                            )
-                            send_scheduled_whatsapp_task.apply_async(
-                                args=[c2.id],
-                                countdown=delay_seconds + 4 * 24 * 60 * 60
-                            )
-                        if third_id:
-                            c3 = WhatsAppCampaign.objects.create(
-                                template_name='payment_reminder_third',
-                                template_id=third_id,
-                                mobile_number=campaign.mobile_number,
-                                scheduled_time=scheduled_time + timedelta(days=10),
-                                status='scheduled'
-                            )
-                            send_scheduled_whatsapp_task.apply_async(
-                                args=[c3.id],
-                                countdown=delay_seconds + 10 * 24 * 60 * 60
-                            )
+                    # Enroll in the follow-up sequence (relative to scheduled_time)
+                    enroll_triggered(campaign.template_name, [campaign.phone_e164], scheduled_time)
                     
                     return Response({
                         'success': True,
@@ -164,7 +114,119 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def broadcast(self, request):
+        """
+        Send or schedule one template to many numbers in a single request
+        
+        POST /api/whatsapp/campaigns/broadcast/
+        Body: {
+            "template_name": "Welcome Message",
+            "template_id": "template_123",
+            "scheduled_time": "2025-01-20T10:30:00Z",  (optional, defaults to now)
+            "recipients": [
+                {"mobile_number": "+919876543210", "parameters": [{"name": "name", "value": "Asha"}]},
+                {"mobile_number": "+919876543211"}
+            ]
+        }
+        """
+        serializer = SendWhatsAppBroadcastSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            now = timezone.now()
+            data = serializer.validated_data
+            scheduled_time = data.get('scheduled_time') or now
+            recipients = data['recipients']
+            initial_status = 'pending' if scheduled_time <= now else 'scheduled'
+            
+            broadcast = WhatsAppBroadcast.objects.create(
+                template_name=data['template_name'],
+                template_id=data['template_id'],
+                scheduled_time=scheduled_time,
+                total_recipients=len(recipients)
+            )
+            campaigns = WhatsAppCampaign.objects.bulk_create([
+                WhatsAppCampaign(
+                    template_name=data['template_name'],
+                    template_id=data['template_id'],
+                    mobile_number=recipient['mobile_number'],
+                    # bulk_create bypasses save(); numbers are already canonical
+                    phone_e164=recipient['mobile_number'],
+                    scheduled_time=scheduled_time,
+                    parameters=recipient['parameters'],
+                    status=initial_status,
+                    broadcast=broadcast
+                )
+                for recipient in recipients
+            ], batch_size=1000)
+            
+            # Recipients are enrolled in the follow-up sequence by the batch
+            # task, once their message has been sent
+            # Dispatch due sends now in batches of WATI_BROADCAST_BATCH_SIZE
+            # receivers; future sends are dispatched by the scheduler
+            batches = 0
+            if initial_status == 'pending':
+                campaign_ids = [c.id for c in campaigns]
+                batch_size = settings.WATI_BROADCAST_BATCH_SIZE
+                for start in range(0, len(campaign_ids), batch_size):
+                    send_whatsapp_broadcast_batch_task.delay(campaign_ids[start:start + batch_size])
+                    batches += 1
+            
+            return Response({
+                'success': True,
+                'message': f'WhatsApp broadcast queued for {len(recipients)} recipient(s)',
+                'data': {
+                    'broadcast_id': str(broadcast.id),
+                    'total': len(recipients),
+                    'batches': batches,
+                    'status': initial_status,
+                    'scheduled_time': scheduled_time
+                }
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['get'], url_path=r'broadcasts/(?P<broadcast_id>[0-9a-f-]+)')
+    def broadcast_progress(self, request, broadcast_id=None):
+        """
+        Get delivery progress of a bulk broadcast
+        
+        GET /api/whatsapp/campaigns/broadcasts/{broadcast_id}/
+        """
+        try:
+            broadcast = WhatsAppBroadcast.objects.get(id=broadcast_id)
+        except (WhatsAppBroadcast.DoesNotExist, ValueError):
+            return Response({
+                'success': False,
+                'error': 'Broadcast not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        counts = {key: 0 for key, _ in WhatsAppCampaign.STATUS_CHOICES}
+        for row in broadcast.campaigns.values('status').annotate(count=Count('id')):
+            counts[row['status']] = row['count']
+        done = counts['success'] + counts['failed'] + counts['cancelled']
+        
+        return Response({
+            'success': True,
+            'data': {
+                'broadcast_id': str(broadcast.id),
+                'template_name': broadcast.template_name,
+                'scheduled_time': broadcast.scheduled_time,
+                'total': broadcast.total_recipients,
+                'completed': done,
+                'counts': counts
+            }
+        })
+    
     @action(detail=False, methods=['get'])
+    @cached_response(timeout_setting='WATI_TEMPLATE_CACHE_TTL')
     def templates(self, request):
         """
         Get all approved WhatsApp templates from WATI
@@ -194,6 +256,7 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['get'])
+    @cached_response(WhatsAppCampaign)
     def logs(self, request):
         """
         Get all WhatsApp campaign logs
@@ -217,7 +280,12 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
         try:
             campaign = WhatsAppCampaign.objects.get(id=pk)
             wati_service = WatiService()
-            result = wati_service.send_template_message(campaign.id)
+            # Failed campaigns may be resent by hand; sent, cancelled and
+            # in-flight ones are refused by the compare-and-set claim
+            result = wati_service.send_template_message(
+                campaign.id,
+                from_statuses=SENDABLE_STATUSES + ('failed',)
+            )
             if result.get('success'):
                 return Response({
                     'success': True,
@@ -242,29 +310,28 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """
-        Cancel a pending/scheduled campaign so it will not be sent by the worker.
+        Cancel a pending/scheduled/queued campaign so it will not be sent by the worker.
         POST /api/whatsapp/campaigns/{id}/cancel/
         Body (optional): { "reason": "string" }
         """
         try:
-            campaign = WhatsAppCampaign.objects.get(id=pk)
-            if campaign.status not in ['pending', 'scheduled']:
+            reason = request.data.get('reason') or 'Cancelled by user'
+            cancelled = WhatsAppCampaign.objects.filter(id=pk).cancel_returning(reason)
+            if not cancelled:
+                campaign = WhatsAppCampaign.objects.get(id=pk)
                 return Response({
                     'success': False,
                     'error': f'Cannot cancel campaign with status: {campaign.status}'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            reason = request.data.get('reason') or 'Cancelled by user'
-            campaign.status = 'cancelled'
-            campaign.cancellation_reason = reason
-            campaign.save()
+            revoke_send_tasks([cancelled[0]['task_id']])
 
             return Response({
                 'success': True,
                 'message': 'Campaign cancelled successfully',
                 'data': {
-                    'campaign_id': campaign.id,
-                    'status': campaign.status
+                    'campaign_id': cancelled[0]['id'],
+                    'status': 'cancelled'
                 }
             })
         except WhatsAppCampaign.DoesNotExist:
@@ -282,6 +349,7 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
     def send_followup(self, request, pk=None):
         """
         Send a follow-up (second/third) immediately for a given base campaign id.
+        The template is the matching step of the sequence the base template triggers.
         Body: { "which": "second" | "third" }
         """
         which = request.data.get('which')
@@ -289,12 +357,11 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
             return Response({'success': False, 'error': 'which must be "second" or "third"'}, status=status.HTTP_400_BAD_REQUEST)
         try:
             base = WhatsAppCampaign.objects.get(id=pk)
+            step = get_followup_step(base.template_name, which)
+            if step is None:
+                return Response({'success': False, 'error': f'No {which} follow-up in the sequence triggered by {base.template_name}'}, status=status.HTTP_400_BAD_REQUEST)
             wati_service = WatiService()
-            template_map = {
-                'second': 'payment_reminder_second',
-                'third': 'payment_reminder_third'
-            }
-            template_name = template_map[which]
+            template_name = step.template_name
             template_id = wati_service.get_template_id_by_name(template_name)
             if not template_id:
                 return Response({'success': False, 'error': f'Template id not found for {template_name}'}, status=status.HTTP_400_BAD_REQUEST)
@@ -316,6 +383,7 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
             return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['get'])
+    @cached_response()
     def contacts(self, request):
         """
         Get all contacts from WATI
@@ -349,6 +417,7 @@ class WhatsAppCampaignViewSet(viewsets.ModelViewSet):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @csrf_exempt
+@WEBHOOK_PROCESSING.labels(stage='request').time()
 def receive_wati_webhook(request):
     """
     Webhook endpoint to receive messages from Wati
@@ -359,9 +428,27 @@ def receive_wati_webhook(request):
     This endpoint:
     1. Receives message data from Wati
     2. Extracts waId (WhatsApp ID) and text message
-    3. Finds scheduled/pending campaigns for that number
-    4. Cancels those campaigns and stores the received message
+    3. Records delivery status events (sent/delivered/read/failed), or
+       cancels scheduled/pending/queued campaigns for that number and stores
+       the received message, in a single UPDATE
+    4. Revokes the queued send tasks of the cancelled campaigns
+    
+    With WATI_WEBHOOK_MODE=stream the raw body is appended to a Redis stream
+    and acknowledged immediately; consume_wati_webhooks applies it later.
     """
+    if settings.WATI_WEBHOOK_MODE == 'stream':
+        # Fast ack: buffer the raw body for the stream consumers; fall back to
+        # inline processing if Redis is unavailable
+        try:
+            entry_id = enqueue_event(request.body)
+            return Response({
+                'success': True,
+                'message': 'Event queued',
+                'entry_id': entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            }, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            logger.warning("WATI webhook stream unavailable, processing inline: %s", e)
+    
     try:
         # Parse JSON data
         try:
@@ -374,6 +461,16 @@ def receive_wati_webhook(request):
         text_message = data.get('text', '')
         event_type = data.get('eventType', '')
         
+        # Delivery status events (sent/delivered/read/failed) go to the event log
+        if event_status(data):
+            recorded = record_status_events([data])
+            return Response({
+                'success': True,
+                'message': 'Status event recorded',
+                'event_type': event_type,
+                'recorded': recorded
+            }, status=status.HTTP_200_OK)
+        
         # Only process message events
         if event_type != 'message':
             return Response({
@@ -388,44 +485,23 @@ def receive_wati_webhook(request):
                 'error': 'waId is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Normalize phone number: remove +91, ensure format consistency
         # Wati sends waId as "919866855857" (without +)
-        # Our database may have "+919866855857" or "919866855857"
-        normalized_wa_id = wa_id.replace('+', '').strip()
-        
-        # Try multiple formats to find matching campaigns
-        phone_variants = [
-            normalized_wa_id,  # "919866855857"
-            f"+{normalized_wa_id}",  # "+919866855857"
-        ]
-        # If starts with 91, also try without 91 prefix
-        if normalized_wa_id.startswith('91') and len(normalized_wa_id) > 2:
-            phone_variants.append(normalized_wa_id[2:])  # "9866855857"
-            phone_variants.append(f"+{normalized_wa_id[2:]}")  # "+9866855857"
+        normalized_wa_id = normalize_phone(wa_id, international=True).lstrip('+')
         
-        # Find all scheduled/pending campaigns for this number
-        cancelled_campaigns = []
-        cancelled_count = 0
+        # Cancel all pending/scheduled/queued campaigns for this number in one
+        # statement, then revoke their queued send tasks in one broadcast
+        cancelled = cancel_for_inbound_messages({wa_id: text_message})
         
-        # Query campaigns with matching mobile number that are scheduled or pending
-        campaigns = WhatsAppCampaign.objects.filter(
-            mobile_number__in=phone_variants,
-            status__in=['pending', 'scheduled']
-        )
-        
-        for campaign in campaigns:
-            # Update campaign status to cancelled
-            campaign.status = 'cancelled'
-            campaign.cancellation_reason = 'Response received from user - webhook triggered'
-            campaign.received_message = text_message
-            campaign.save()
-            cancelled_count += 1
-            cancelled_campaigns.append({
-                'id': campaign.id,
-                'template_name': campaign.template_name,
-                'scheduled_time': campaign.scheduled_time.isoformat(),
-                'mobile_number': campaign.mobile_number
-            })
+        cancelled_count = len(cancelled)
+        cancelled_campaigns = [
+            {
+                'id': campaign['id'],
+                'template_name': campaign['template_name'],
+                'scheduled_time': campaign['scheduled_time'].isoformat(),
+                'mobile_number': campaign['mobile_number']
+            }
+            for campaign in cancelled
+        ]
         
         return Response({
             'success': True,
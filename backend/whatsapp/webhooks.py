@@ -0,0 +1,215 @@
+"""
+Processing of inbound WATI webhook events.
+
+Events are either applied inline by the webhook view or, in 'stream' mode,
+appended raw to a Redis stream by the view and applied in batches by
+consumers (see the consume_wati_webhooks management command). Both paths
+share process_events(), which cancels pending campaigns for every number
+that replied with a single UPDATE keyed on the canonical phone_e164 column.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from core.metrics import WEBHOOK_PROCESSING
+
+from .delivery import event_status, record_status_events
+from .models import WhatsAppCampaign
+from .phone import normalize_phone
+from .tasks import revoke_send_tasks
+
+logger = logging.getLogger(__name__)
+
+CANCELLATION_REASON = 'Response received from user - webhook triggered'
+
+
+def cancel_for_inbound_messages(messages):
+    """
+    Cancel pending campaigns of every number that sent us a message.
+    Steps of sequences without stop-on-reply are left alone.
+
+    Args:
+        messages: dict mapping waId to the last text received from it
+
+    Returns:
+        list: Cancelled campaigns as returned by cancel_returning()
+    """
+    received_by_phone = {}
+    for wa_id, text in messages.items():
+        phone = normalize_phone(wa_id, international=True)
+        if phone:
+            received_by_phone[phone] = text
+    if not received_by_phone:
+        return []
+
+    cancelled = WhatsAppCampaign.objects.filter(
+        phone_e164__in=list(received_by_phone),
+        stop_on_reply=True
+    ).cancel_returning(CANCELLATION_REASON, received_message=received_by_phone)
+    # Revoke once the cancellation is committed: a batch applied in a
+    # transaction may still roll back, and the rows would send again
+    task_ids = [campaign['task_id'] for campaign in cancelled]
+    transaction.on_commit(lambda: revoke_send_tasks(task_ids))
+    return cancelled
+
+
+def process_events(events):
+    """
+    Apply a batch of parsed webhook events.
+
+    'message' events with a waId cancel campaigns; when one number sent
+    several messages in the batch the last one is stored. Delivery status
+    events are recorded with one bulk insert.
+
+    Returns:
+        list: Cancelled campaigns
+    """
+    messages = {}
+    status_events = []
+    for event in events:
+        if event_status(event):
+            status_events.append(event)
+            continue
+        if event.get('eventType') != 'message' or not event.get('waId'):
+            continue
+        messages[event['waId']] = event.get('text', '')
+    if status_events:
+        record_status_events(status_events)
+    return cancel_for_inbound_messages(messages)
+
+
+def enqueue_event(raw_body):
+    """
+    Append a raw webhook body to the Redis stream without parsing it.
+
+    Returns:
+        str: Stream entry id
+    """
+    from core.redis import get_redis
+
+    return get_redis().xadd(
+        settings.WATI_WEBHOOK_STREAM,
+        {'body': raw_body},
+        maxlen=settings.WATI_WEBHOOK_STREAM_MAXLEN,
+        approximate=True
+    )
+
+
+def ensure_consumer_group(client):
+    """
+    Create the consumer group (and the stream) if they do not exist yet
+    """
+    import redis
+
+    try:
+        client.xgroup_create(
+            settings.WATI_WEBHOOK_STREAM,
+            settings.WATI_WEBHOOK_CONSUMER_GROUP,
+            id='0',
+            mkstream=True
+        )
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def _dead_letter(client, entries):
+    """
+    Move entries that cannot be applied to the dead-letter stream, where
+    they are kept for inspection instead of blocking the consumers
+    """
+    for entry_id, fields, error in entries:
+        logger.warning("Dead-lettering WATI webhook entry %s: %s", entry_id, error)
+        client.xadd(
+            settings.WATI_WEBHOOK_DEAD_LETTER_STREAM,
+            {'entry_id': entry_id, 'body': fields.get(b'body', b''), 'error': error[:500]},
+            maxlen=settings.WATI_WEBHOOK_STREAM_MAXLEN,
+            approximate=True
+        )
+
+
+def _times_delivered(client, entry_id):
+    pending = client.xpending_range(
+        settings.WATI_WEBHOOK_STREAM, settings.WATI_WEBHOOK_CONSUMER_GROUP,
+        min=entry_id, max=entry_id, count=1
+    )
+    return pending[0]['times_delivered'] if pending else 0
+
+
+def _apply(events):
+    # All or nothing, so a batch that fails can be applied again entry by entry
+    with transaction.atomic():
+        process_events(events)
+
+
+def consume_stream_batch(consumer, batch_size, block_ms=5000):
+    """
+    Read one batch of webhook events as `consumer`, apply it and acknowledge.
+
+    Entries left unacknowledged by a crashed consumer are reclaimed after
+    WATI_WEBHOOK_CLAIM_IDLE_MS, so every event is applied at least once.
+    Cancellation is idempotent, so redelivery is harmless.
+
+    Entries that are not a JSON object are dead-lettered (see
+    WATI_WEBHOOK_DEAD_LETTER_STREAM). When a batch fails, its entries are
+    applied one by one; an entry that still fails is left pending for a
+    later retry, and dead-lettered once it has been delivered
+    WATI_WEBHOOK_MAX_DELIVERIES times, so one bad event cannot stall the
+    stream.
+
+    Returns:
+        int: Number of stream entries processed
+    """
+    from core.redis import get_redis
+
+    client = get_redis()
+    stream = settings.WATI_WEBHOOK_STREAM
+    group = settings.WATI_WEBHOOK_CONSUMER_GROUP
+
+    claimed = client.xautoclaim(
+        stream, group, consumer,
+        min_idle_time=settings.WATI_WEBHOOK_CLAIM_IDLE_MS,
+        start_id='0-0',
+        count=batch_size
+    )
+    entries = [entry for entry in claimed[1] if entry and entry[1]]
+    if not entries:
+        response = client.xreadgroup(group, consumer, {stream: '>'}, count=batch_size, block=block_ms)
+        entries = response[0][1] if response else []
+    if not entries:
+        return 0
+
+    parsed = []
+    dead = []
+    for entry_id, fields in entries:
+        try:
+            event = json.loads(fields[b'body'])
+        except (KeyError, ValueError):
+            event = None
+        if isinstance(event, dict):
+            parsed.append((entry_id, fields, event))
+        else:
+            dead.append((entry_id, fields, 'Not a JSON object'))
+
+    acked = [entry_id for entry_id, _, _ in dead]
+    with WEBHOOK_PROCESSING.labels(stage='consumer_batch').time():
+        try:
+            _apply([event for _, _, event in parsed])
+            acked.extend(entry_id for entry_id, _, _ in parsed)
+        except Exception as e:
+            logger.warning("WATI webhook batch failed, applying its %d entries one by one: %s", len(parsed), e)
+            for entry_id, fields, event in parsed:
+                try:
+                    _apply([event])
+                except Exception as exc:
+                    if _times_delivered(client, entry_id) < settings.WATI_WEBHOOK_MAX_DELIVERIES:
+                        continue
+                    dead.append((entry_id, fields, f"{type(exc).__name__}: {exc}"))
+                acked.append(entry_id)
+
+    if dead:
+        _dead_letter(client, dead)
+    if acked:
+        client.xack(stream, group, *acked)
+    return len(entries)
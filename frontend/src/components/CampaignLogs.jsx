@@ -1,9 +1,12 @@
 import { MdRefresh, MdCheckCircle, MdError, MdPending, MdWarning, MdExpandMore, MdExpandLess } from 'react-icons/md'
 import { useState } from 'react'
 import React from 'react'
+import { getCampaign } from '../services/api'
 
 const CampaignLogs = ({ logs, loading, onRefresh }) => {
   const [expandedRows, setExpandedRows] = useState(new Set())
+  // Address lists by campaign id, fetched each time a row is expanded
+  const [details, setDetails] = useState({})
   const getStatusIcon = (status) => {
     switch (status) {
       case 'success':
@@ -47,12 +50,29 @@ const CampaignLogs = ({ logs, loading, onRefresh }) => {
     })
   }
 
+  const loadDetails = async (logId) => {
+    setDetails(prev => ({ ...prev, [logId]: { loading: true } }))
+    try {
+      const campaign = await getCampaign(logId)
+      setDetails(prev => ({
+        ...prev,
+        [logId]: {
+          deliverable: getEmailList(campaign.deliverable_emails),
+          undeliverable: getEmailList(campaign.undeliverable_emails)
+        }
+      }))
+    } catch (error) {
+      setDetails(prev => ({ ...prev, [logId]: { error: true } }))
+    }
+  }
+
   const toggleRow = (logId) => {
     const newExpanded = new Set(expandedRows)
     if (newExpanded.has(logId)) {
       newExpanded.delete(logId)
     } else {
       newExpanded.add(logId)
+      loadDetails(logId)
     }
     setExpandedRows(newExpanded)
   }
@@ -111,8 +131,9 @@ const CampaignLogs = ({ logs, loading, onRefresh }) => {
             <tbody className="divide-y divide-gray-200">
               {logs.map((log) => {
                 const isExpanded = expandedRows.has(log.id)
-                const deliverableEmails = getEmailList(log.deliverable_emails)
-                const undeliverableEmails = getEmailList(log.undeliverable_emails)
+                const detail = details[log.id] || {}
+                const deliverableEmails = detail.deliverable || []
+                const undeliverableEmails = detail.undeliverable || []
                 
                 return (
                   <React.Fragment key={log.id}>
@@ -144,10 +165,16 @@ const CampaignLogs = ({ logs, loading, onRefresh }) => {
                       <tr className="bg-gray-50">
                         <td colSpan="9" className="px-4 py-3">
                           <div className="flex flex-wrap gap-2">
+                            {detail.loading && (
+                              <span className="text-xs text-gray-500">Loading email details...</span>
+                            )}
+                            {detail.error && (
+                              <span className="text-xs text-red-500">Could not load email details</span>
+                            )}
                             {deliverableEmails.length > 0 && (
                               <div className="flex flex-wrap gap-1">
                                 <span className="text-xs font-medium text-green-700 bg-green-100 px-2 py-1 rounded-full">
-                                  ✓ Deliverable ({deliverableEmails.length})
+                                  ✓ Deliverable ({log.deliverable_count})
                                 </span>
                                 {deliverableEmails.map((email, index) => (
                                   <span key={index} className="text-xs text-green-600 bg-green-50 px-2 py-1 rounded border">
@@ -159,7 +186,7 @@ const CampaignLogs = ({ logs, loading, onRefresh }) => {
                             {undeliverableEmails.length > 0 && (
                               <div className="flex flex-wrap gap-1">
                                 <span className="text-xs font-medium text-red-700 bg-red-100 px-2 py-1 rounded-full">
-                                  ✗ Non-Deliverable ({undeliverableEmails.length})
+                                  ✗ Non-Deliverable ({log.undeliverable_count})
                                 </span>
                                 {undeliverableEmails.map((email, index) => (
                                   <span key={index} className="text-xs text-red-600 bg-red-50 px-2 py-1 rounded border">
@@ -168,7 +195,7 @@ const CampaignLogs = ({ logs, loading, onRefresh }) => {
                                 ))}
                               </div>
                             )}
-                            {deliverableEmails.length === 0 && undeliverableEmails.length === 0 && (
+                            {!detail.loading && !detail.error && deliverableEmails.length === 0 && undeliverableEmails.length === 0 && (
                               <span className="text-xs text-gray-500">
                                 No email details available
                               </span>
@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { toast } from 'react-toastify'
 import { MdSend, MdRefresh } from 'react-icons/md'
 import { sendEmailCampaign, getCampaignLogs } from '../services/api'
 import CampaignLogs from './CampaignLogs'
+import { useEventStream } from '../services/useEventStream'
 
 const EmailMarketing = () => {
   const [formData, setFormData] = useState({
@@ -20,6 +21,27 @@ const EmailMarketing = () => {
     fetchLogs()
   }, [])
 
+  // Progress of listed campaigns is applied in place; a campaign not listed
+  // yet (just created) refetches the logs
+  const logsRef = useRef(logs)
+  logsRef.current = logs
+  const streaming = useEventStream('emails', {
+    progress: (event) => {
+      if (!logsRef.current.some(log => log.id === event.campaign_id)) {
+        fetchLogs()
+        return
+      }
+      setLogs(prev => prev.map(log => log.id === event.campaign_id ? {
+        ...log,
+        status: event.status,
+        total_emails: event.total,
+        successful_emails: event.successful,
+        failed_emails: event.failed,
+        released_emails: event.released
+      } : log))
+    }
+  }, () => fetchLogs())
+
   const fetchLogs = async () => {
     setLogsLoading(true)
     try {
@@ -58,9 +80,8 @@ const EmailMarketing = () => {
       const response = await sendEmailCampaign(formData)
 
       if (response.success) {
-        toast.success(
-          `Campaign sent! ${response.data.successful}/${response.data.total} emails delivered successfully`
-        )
+        // Sent in the background; progress shows up in the logs below
+        toast.success(`Campaign queued for ${response.data.total} recipient(s)`)
         
         // Reset form
         setFormData({
@@ -70,8 +91,10 @@ const EmailMarketing = () => {
           recipients: ''
         })
 
-        // Refresh logs
-        fetchLogs()
+        // The new campaign arrives on the event stream when it is connected
+        if (!streaming) {
+          fetchLogs()
+        }
       } else {
         toast.error(response.error || 'Failed to send campaign')
       }
@@ -4,7 +4,7 @@ import { sendWhatsAppNow, sendWhatsAppFollowup, cancelWhatsAppCampaign } from '.
 import { useState } from 'react'
 import React from 'react'
 
-const WhatsAppCampaignLogs = ({ logs, loading, onRefresh }) => {
+const WhatsAppCampaignLogs = ({ logs, loading, onRefresh, onChange }) => {
   const [expandedRows, setExpandedRows] = useState(new Set())
   
   const getStatusIcon = (status) => {
@@ -160,7 +160,7 @@ const WhatsAppCampaignLogs = ({ logs, loading, onRefresh }) => {
                                       const res = await sendWhatsAppNow(log.id)
                                       if (res.success) {
                                         toast.success('Message sent')
-                                        onRefresh && onRefresh()
+                                        onChange && onChange()
                                       } else {
                                         toast.error(res.error || 'Failed to send')
                                       }
@@ -181,7 +181,7 @@ const WhatsAppCampaignLogs = ({ logs, loading, onRefresh }) => {
                                       const res = await cancelWhatsAppCampaign(log.id)
                                       if (res.success) {
                                         toast.success('Removed from schedule')
-                                        onRefresh && onRefresh()
+                                        onChange && onChange()
                                       } else {
                                         toast.error(res.error || 'Failed to remove')
                                       }
@@ -205,7 +205,7 @@ const WhatsAppCampaignLogs = ({ logs, loading, onRefresh }) => {
                                         const res = await sendWhatsAppFollowup(log.id, 'second')
                                         if (res.success) {
                                           toast.success('Second reminder sent')
-                                          onRefresh && onRefresh()
+                                          onChange && onChange()
                                         } else {
                                           toast.error(res.error || 'Failed to send second')
                                         }
@@ -223,7 +223,7 @@ const WhatsAppCampaignLogs = ({ logs, loading, onRefresh }) => {
                                         const res = await sendWhatsAppFollowup(log.id, 'third')
                                         if (res.success) {
                                           toast.success('Third reminder sent')
-                                          onRefresh && onRefresh()
+                                          onChange && onChange()
                                         } else {
                                           toast.error(res.error || 'Failed to send third')
                                         }
@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { toast } from 'react-toastify'
 import { MdSend, MdRefresh } from 'react-icons/md'
 import { sendWhatsAppCampaign, getWhatsAppTemplates, getWhatsAppCampaignLogs, getWhatsAppContacts } from '../services/api'
 import WhatsAppCampaignLogs from './WhatsAppCampaignLogs'
+import { useEventStream } from '../services/useEventStream'
 
 const WhatsAppMarketing = () => {
   const [formData, setFormData] = useState({
@@ -69,6 +70,31 @@ const WhatsAppMarketing = () => {
     }
   }
 
+  // Status and delivery changes of listed campaigns are applied in place;
+  // campaigns not listed yet (just created) refetch the logs
+  const logsRef = useRef(logs)
+  logsRef.current = logs
+  const applyToLogs = (ids, changes) => {
+    const listed = new Set(logsRef.current.map(log => log.id))
+    if (ids.some(id => !listed.has(id))) {
+      fetchLogs()
+      return
+    }
+    const changed = new Set(ids)
+    setLogs(prev => prev.map(log => changed.has(log.id) ? { ...log, ...changes } : log))
+  }
+  const streaming = useEventStream('whatsapp', {
+    status: (event) => applyToLogs(event.campaign_ids, { status: event.status }),
+    delivery: (event) => applyToLogs(event.campaign_ids, { delivery_status: event.delivery_status })
+  }, () => fetchLogs())
+
+  // After an action: the change arrives on the event stream when it is connected
+  const refreshUnlessStreaming = () => {
+    if (!streaming) {
+      fetchLogs()
+    }
+  }
+
   const fetchLogs = async () => {
     setLogsLoading(true)
     try {
@@ -242,8 +268,7 @@ const WhatsAppMarketing = () => {
       setParam1('https://flashfirejobs.com/pricing')
       setParam2('https://flashfirejobs.com/pricing')
 
-      // Refresh logs
-      fetchLogs()
+      refreshUnlessStreaming()
     } catch (error) {
       console.error('Error sending campaign:', error)
       toast.error(error.response?.data?.error || 'Failed to send campaign. Please check your WATI configuration.')
@@ -463,6 +488,7 @@ const WhatsAppMarketing = () => {
         logs={logs} 
         loading={logsLoading} 
         onRefresh={fetchLogs}
+        onChange={refreshUnlessStreaming}
       />
     </div>
   )
@@ -24,6 +24,11 @@ export const getCampaignLogs = async () => {
   return response.data
 }
 
+export const getCampaign = async (campaignId) => {
+  const response = await api.get(`/emails/campaigns/${campaignId}/`)
+  return response.data
+}
+
 // WhatsApp Campaign APIs
 export const sendWhatsAppCampaign = async (data) => {
   const response = await api.post('/whatsapp/campaigns/send_message/', data)
@@ -60,6 +65,21 @@ export const cancelWhatsAppCampaign = async (campaignId, reason) => {
   return response.data
 }
 
+// Live campaign events (Server-Sent Events) of one channel ('emails' or
+// 'whatsapp'). `handlers` maps event types ('progress', 'status',
+// 'delivery', 'resync') to callbacks taking the parsed event; onConnection
+// is told whether the stream is open. Returns a function closing the stream.
+export const subscribeToEvents = (channel, handlers, onConnection) => {
+  const source = new EventSource(`${API_BASE_URL}/${channel}/async/events/`)
+  Object.entries(handlers).forEach(([type, handler]) => {
+    source.addEventListener(type, (event) => handler(JSON.parse(event.data)))
+  })
+  source.onopen = () => onConnection(true)
+  // EventSource reconnects by itself after an error
+  source.onerror = () => onConnection(false)
+  return () => source.close()
+}
+
 export default api
 
 
@@ -0,0 +1,45 @@
+import { useEffect, useRef, useState } from 'react'
+import { subscribeToEvents } from './api'
+
+// How often the logs are refetched while the event stream is down
+const POLL_INTERVAL_MS = 15000
+
+// Keeps a logs view current from the channel's event stream. While the
+// stream is connected nothing is polled: events are applied by `handlers`
+// and the logs are only refetched on 'resync' or after a reconnect (events
+// may have been missed). While it is down, `refetch` runs every
+// POLL_INTERVAL_MS instead. Returns whether the stream is connected.
+export const useEventStream = (channel, handlers, refetch) => {
+  const [connected, setConnected] = useState(false)
+  // Latest callbacks, so the stream is opened once per channel
+  const handlersRef = useRef(handlers)
+  const refetchRef = useRef(refetch)
+  handlersRef.current = handlers
+  refetchRef.current = refetch
+
+  useEffect(() => {
+    let opened = false
+    const types = [...Object.keys(handlersRef.current), 'resync']
+    const dispatch = Object.fromEntries(types.map((type) => [
+      type,
+      (event) => (type === 'resync' ? refetchRef.current() : handlersRef.current[type](event))
+    ]))
+    return subscribeToEvents(channel, dispatch, (open) => {
+      if (open && opened) {
+        refetchRef.current()
+      }
+      opened = opened || open
+      setConnected(open)
+    })
+  }, [channel])
+
+  useEffect(() => {
+    if (connected) {
+      return undefined
+    }
+    const timer = setInterval(() => refetchRef.current(), POLL_INTERVAL_MS)
+    return () => clearInterval(timer)
+  }, [connected])
+
+  return connected
+}